@@ -1,42 +1,71 @@
 import pygame
-import random
 import sys
 import os
-import cv2
-from hand_control import HandController
-try:
-    from openpyxl import Workbook, load_workbook
-    OPENPYXL = True
-except Exception:
-    OPENPYXL = False
-
-from datetime import datetime
+import random
+import time
+import atexit
+from hand_control import HandController, MultiHandController
+from hand_worker import HandTrackingWorker
+from simulation import FixedTimestep, GameSimulation
+from board import grid_layout
+from assets import AssetManager, Layout
+from telemetry import RoundStats, TelemetryWriter, build_event_rows, migrate_legacy_xlsx
+from persistence import OPENPYXL, PersistenceWorker
+from renderer import GameRenderer, LatencyOverlay
+from preview import CameraPreview
+from replay import SessionRecorder
+from inference_server import InferenceClient
+from quality import AdaptiveQuality
+from latency import NULL_PROFILER, LatencyProfiler
+from usage import UsageMeter
+from landmark_feed import FeedWriter
+from metrics import GameMetrics, MetricsServer
 
 pygame.init()
 
 # --- KÍCH THƯỚC MÀN HÌNH ---
+# mọi tọa độ trong file (bàn chơi, nút, chữ, vị trí tay) là tọa độ thiết kế SCREEN_WIDTH x SCREEN_HEIGHT;
+# cửa sổ kích thước khác được co giãn đều qua `layout`, logic game không đổi
 SCREEN_WIDTH = 900
 SCREEN_HEIGHT = 800
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+WINDOW_SIZE = (900, 800)  # kích thước cửa sổ lúc mở (kéo giãn được), F11 = bật / tắt toàn màn hình
+FULLSCREEN = False
+THEMES = []               # thư mục ảnh thay thế, vd. ["assets/themes/forest"]; file thiếu lấy từ assets/
 pygame.display.set_caption("Game Đập Chuột")
 
 clock = pygame.time.Clock()
-FPS = 120
+FPS = 120                 # tốc độ render tối đa; giảm để tiết kiệm CPU, lối chơi không đổi
+SIM_HZ = 60               # số bước mô phỏng cố định mỗi giây
+SIM_SEED = None           # đặt số nguyên để tái lập lượt chơi (mỗi lượt dùng SIM_SEED + số lượt)
+CAMERA_SOURCE = 0         # chỉ số webcam, file video hoặc thư mục / mẫu ảnh ("frames/*.png") thay cho camera
+PLAYERS = 1               # 2 = hai người chơi chung một camera, mỗi người một nửa bàn chơi
+HAND_ROI = True           # chỉ nhận diện trong vùng quanh bàn tay đang bám (nhẹ hơn cho CPU yếu)
+INFER_BUDGET_MS = 20      # ngân sách inference mỗi frame camera; chậm hơn -> chạy MediaPipe thưa hơn
+AUTO_QUALITY = True       # tự hạ / nâng model và kích thước ảnh nhận diện theo INFER_BUDGET_MS
+INFERENCE_SERVER = None   # vd. ("127.0.0.1", 6150): dùng inference_server.py chung cho nhiều máy game
+INFERENCE_BUDGET_MS = 50  # ngân sách độ trễ của máy này trên inference server; frame trễ hơn bị bỏ
+PREVIEW_FPS = 15          # số lần cập nhật ảnh camera góc màn hình mỗi giây, 0 = tắt
+RECORD_FILE = None        # vd. "session.jsonl": ghi lại luồng nhận diện tay để phát lại (bench.py --replay)
+RECORD_VIDEO = None       # vd. "session.avi": ghi kèm frame camera (cần RECORD_FILE)
+METRICS_PORT = None       # vd. 9464: phục vụ số đo Prometheus tại http://127.0.0.1:9464/metrics
+STATION_NAME = None       # nhãn station trong số đo (None = tên máy)
+LANDMARK_FEED = False     # True: ghi landmarks / góc / clench speed mỗi frame vào ring buffer chia sẻ (landmark_feed.py)
+LATENCY_STATS = True      # đo độ trễ từng stage, ghi p50/p95/p99 vào telemetry/latency.csv cuối mỗi lượt
+LATENCY_OVERLAY = False   # hiện bảng độ trễ trên màn chơi (bật/tắt bằng F3)
+IDLE_AFTER_S = 20         # không thấy tay lâu hơn (ngoài lượt chơi) -> chỉ kiểm tra có tay IDLE_CHECK_HZ lần/giây
+IDLE_CHECK_HZ = 4
+MENU_WAIT_MS = 1000       # màn hình chờ (menu, hết lượt) chỉ vẽ lại khi có event hoặc sau khoảng này
 
 # --- DIFFICULTY / ADAPTIVE SETTINGS (tùy chỉnh để giảm độ khó) ---
+# spawn_rate: số chuột xuất hiện trung bình mỗi giây (không phụ thuộc FPS)
 DIFFICULTY_PRESETS = {
-    "easy":   {"spawn_den": 240, "min_up": 2000, "max_up": 3500, "max_simultaneous": 2},
-    "normal": {"spawn_den": 120, "min_up": 1000, "max_up": 2500, "max_simultaneous": 3},
-    "hard":   {"spawn_den": 60,  "min_up": 700,  "max_up": 1800, "max_simultaneous": 4},
+    "easy":   {"spawn_rate": 0.5, "min_up": 2000, "max_up": 3500, "max_simultaneous": 2},
+    "normal": {"spawn_rate": 1.0, "min_up": 1000, "max_up": 2500, "max_simultaneous": 3},
+    "hard":   {"spawn_rate": 2.0, "min_up": 700,  "max_up": 1800, "max_simultaneous": 4},
 }
 
 # Mặc định cho người mới phục hồi: easy
 DIFFICULTY = "easy"
-_spawn_cfg = DIFFICULTY_PRESETS[DIFFICULTY]
-SPAWN_DENOM = _spawn_cfg["spawn_den"]         # spawn chance: 1 / SPAWN_DENOM (per frame)
-MOLE_UP_MIN_MS = _spawn_cfg["min_up"]
-MOLE_UP_MAX_MS = _spawn_cfg["max_up"]
-MAX_SIMULTANEOUS_MOLES = _spawn_cfg["max_simultaneous"]
 
 # --- MÀU ---
 WHITE = (255, 255, 255)
@@ -44,207 +73,153 @@ BLACK = (0, 0, 0)
 GREEN = (0, 150, 0)
 RED = (255, 0, 0)
 
-# --- PHÔNG CHỮ ---
-font = pygame.font.SysFont("arial", 64)
-small_font = pygame.font.SysFont("arial", 32)
-
-# --- HÀM LOAD ẢNH ---
-def load_image(file_name, size=None):
-    path = os.path.join('assets', file_name)
-    image = pygame.image.load(path).convert_alpha()
-    if size:
-        image = pygame.transform.scale(image, size)
-    return image
-
-BACKGROUND_IMAGE = load_image('background.png', (SCREEN_WIDTH, SCREEN_HEIGHT))
-HOLE_IMAGE = load_image('hole.png', (150, 100))
-MOLE_IMAGE_UP = load_image('mole.png', (100, 100))
-MOLE_IMAGE_DOWN = load_image('hit_mole.png', (100, 100))
-HAMMER_IMAGE = load_image('hammer.png', (80, 80))
-
-ANGLES_XLSX = os.path.join(os.path.dirname(__file__), "game_angles.xlsx")
-ANGLES_SUMMARY_XLSX = os.path.join(os.path.dirname(__file__), "game_angles_summary.xlsx")
-
-def ensure_angles_xlsx():
-    if not OPENPYXL:
-        return
-    if not os.path.exists(ANGLES_XLSX):
-        wb = Workbook()
-        ws = wb.active
-        # THÊM cột clench_speed
-        ws.append(["timestamp","thumb","index","middle","ring","pinky","clench_speed"])
-        wb.save(ANGLES_XLSX)
-
-def save_angles_xlsx(angles, clench_speed=0.0):
-    if not OPENPYXL:
-        return
-    ensure_angles_xlsx()
-    wb = load_workbook(ANGLES_XLSX)
-    ws = wb.active
-    ts = datetime.now().isoformat()
-    ws.append([
-        ts,
-        angles.get("thumb",0),
-        angles.get("index",0),
-        angles.get("middle",0),
-        angles.get("ring",0),
-        angles.get("pinky",0),
-        clench_speed
-    ])
-    wb.save(ANGLES_XLSX)
-
-# --- summary (per round) functions ---
-def ensure_angles_summary_xlsx():
-    if not OPENPYXL:
-        return
-    if not os.path.exists(ANGLES_SUMMARY_XLSX):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Summary"
-        header = [
-            "timestamp", "player", "round",
-            "frames_recorded"
-        ]
-        # add per-finger avg/max/min
-        fingers = ["thumb","index","middle","ring","pinky"]
-        for f in fingers:
-            header += [f + "_avg", f + "_max", f + "_min"]
-        # THÊM clench summary
-        header += ["clench_avg", "clench_max", "clench_min"]
-        ws.append(header)
-        wb.save(ANGLES_SUMMARY_XLSX)
-
-def save_angles_summary_xlsx(player, round_no, stats, clench_stats):
-    """
-    stats: dict finger -> {'count':int,'sum':float,'max':float,'min':float}
-    clench_stats: {'count':int,'sum':float,'max':float,'min':float}
-    """
-    if not OPENPYXL:
-        return
-    ensure_angles_summary_xlsx()
-    wb = load_workbook(ANGLES_SUMMARY_XLSX)
-    ws = wb.active
-    ts = datetime.now().isoformat()
-    fingers = ["thumb","index","middle","ring","pinky"]
-    frames = 0
-    row = [ts, player, round_no]
-    # frames recorded = count for any finger (they should be same)
-    for f in fingers:
-        frames = max(frames, stats.get(f, {}).get("count", 0))
-    row[3:3] = [frames]  # ensure frames at correct index
-
-    # append avg/max/min per finger
-    for f in fingers:
-        s = stats.get(f, {"count":0,"sum":0.0,"max":0.0,"min":0.0})
-        cnt = s.get("count", 0)
-        avg = (s.get("sum",0.0)/cnt) if cnt>0 else 0.0
-        mx = s.get("max", 0.0) if cnt>0 else 0.0
-        mn = s.get("min", 0.0) if cnt>0 else 0.0
-        row += [round(avg,1), round(mx,1), round(mn,1)]
-
-    # THÊM clench stats
-    c = clench_stats or {"count":0,"sum":0.0,"max":0.0,"min":0.0}
-    cnt = c.get("count",0)
-    cavg = (c.get("sum",0.0)/cnt) if cnt>0 else 0.0
-    cmx = c.get("max",0.0) if cnt>0 else 0.0
-    cmn = c.get("min",0.0) if cnt>0 else 0.0
-    row += [round(cavg,1), round(cmx,1), round(cmn,1)]
-
-    ws.append(row)
-    wb.save(ANGLES_SUMMARY_XLSX)
+# --- ẢNH (kích thước thiết kế) ---
+# mỗi file được nạp một lần; bản co giãn theo cửa sổ được dựng lại trong set_display()
+assets = AssetManager(themes=THEMES)
+HOLE_SIZE = (150, 100)
+MOLE_SIZE = (100, 100)
+HAMMER_SIZE = (80, 80)
 
 # --- CLASS MOLE ---
 class Mole(pygame.sprite.Sprite):
+    # trạng thái -> ảnh ở kích thước cửa sổ hiện tại (set_display()); rect vẫn theo tọa độ thiết kế
+    images = {}
+
     def __init__(self, x, y):
         super().__init__()
-        self.image_up = MOLE_IMAGE_UP
-        self.image_down_hit = MOLE_IMAGE_DOWN
-        self.hole_image = HOLE_IMAGE
+        self.rect = pygame.Rect((x, y), HOLE_SIZE)
+        self.hit_display_time = 300
+        self.reset()
+
+    @property
+    def image(self):
+        return Mole.images[self.state]
 
-        self.image = self.hole_image
-        self.rect = self.image.get_rect(topleft=(x, y))
+    # mọi mốc thời gian là sim time (ms) do GameSimulation truyền vào
+    def reset(self):
+        self.state = "hole"
         self.is_up = False
         self.hit = False
         self.time_up = 0
-        # default up_duration will be set each time show() is called
-        self.up_duration = random.randint(MOLE_UP_MIN_MS, MOLE_UP_MAX_MS)
-        self.hit_display_time = 300
+        self.up_duration = 0
         self.time_hit = 0
 
-    def show(self):
+    def show(self, now, up_duration):
         if not self.is_up:
             self.is_up = True
             self.hit = False
-            self.time_up = pygame.time.get_ticks()
-            # set up duration according to current difficulty config
-            self.up_duration = random.randint(MOLE_UP_MIN_MS, MOLE_UP_MAX_MS)
-            self.image = self.image_up
+            self.time_up = now
+            self.up_duration = up_duration
+            self.state = "up"
 
-    def update(self):
-        now = pygame.time.get_ticks()
+    def update(self, now):
         if self.is_up:
             if self.hit:
                 if now - self.time_hit > self.hit_display_time:
                     self.is_up = False
-                    self.image = self.hole_image
+                    self.state = "hole"
             elif now - self.time_up > self.up_duration:
                 self.is_up = False
-                self.image = self.hole_image
+                self.state = "hole"
 
-    def was_hit(self):
-        global score, hit_count
+    def was_hit(self, now):
         if self.is_up and not self.hit:
             self.hit = True
-            self.image = self.image_down_hit
-            self.time_hit = pygame.time.get_ticks()
-            score += 10
-            hit_count += 1
+            self.state = "hit"
+            self.time_hit = now
             return True
         return False
 
-# --- HÀM LƯU LỊCH SỬ ---
-def save_score_to_excel(player_name, score, hit_count, accuracy, filename="game_history.xlsx"):
-    if not os.path.exists(filename):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "LichSu"
-        ws.append(["Thời gian", "Tên người chơi", "Điểm", "Số lần trúng", "Tỉ lệ phản ứng (%)"])
-        wb.save(filename)
-
-    wb = load_workbook(filename)
-    ws = wb.active
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ws.append([now, player_name, score, hit_count, round(accuracy, 1)])
-    wb.save(filename)
-    print(f"✅ Đã lưu kết quả của {player_name} vào {filename}")
-
-# --- HÀM VẼ NÚT ---
+# --- HÀM VẼ NÚT / CHỮ (rect, y theo tọa độ thiết kế) ---
 def draw_button(surface, rect, text, font, bg_color, text_color):
-    pygame.draw.rect(surface, bg_color, rect, border_radius=10)
+    rect = layout.rect(rect)
+    pygame.draw.rect(surface, bg_color, rect, border_radius=layout.length(10))
     label = font.render(text, True, text_color)
     surface.blit(label, (rect.x + (rect.width - label.get_width()) // 2,
                          rect.y + (rect.height - label.get_height()) // 2))
 
+
+def blit_centered(surface, label, y):
+    x, y = layout.pos((SCREEN_WIDTH // 2, y))
+    surface.blit(label, (x - label.get_width() // 2, y))
+
 # --- HÀM NHẬP TÊN + SỐ LẦN CHƠI ---
-def get_player_info():
+# trạng thái khởi động của HandTrackingWorker -> (chữ, màu) hiển thị ở màn nhập tên
+HAND_STATUS_TEXT = {
+    "loading": ("Dang tai nhan dien tay...", WHITE),
+    "camera": ("Dang mo camera...", WHITE),
+    "warmup": ("Dang khoi dong nhan dien...", WHITE),
+    "ready": ("Camera san sang", GREEN),
+    "error": ("Loi camera / nhan dien tay", RED),
+}
+
+
+def draw_player_info(names, player_name, num_games, stage, players, status_key):
+    screen.blit(BACKGROUND_IMAGE, (0, 0))
+    if stage == "name":
+        title = "NHAP TEN NGUOI CHOI:" if players == 1 else f"TEN NGUOI CHOI {len(names) + 1}:"
+        current = player_name
+    else:
+        title = "NHAP SO LAN CHOI:"
+        current = num_games
+
+    blit_centered(screen, font.render(title, True, WHITE), 180)
+    blit_centered(screen, small_font.render(current + "|", True, GREEN), 300)
+
+    start_button = pygame.Rect(SCREEN_WIDTH // 2 - 100, 400, 200, 60)
+    draw_button(screen, start_button, "TIEP TUC", small_font, GREEN, WHITE)
+
+    # model + camera được nạp trên thread nền trong lúc nhập tên
+    status = HAND_STATUS_TEXT.get(status_key)
+    if status:
+        blit_centered(screen, tiny_font.render(status[0], True, status[1]), 480)
+
+    pygame.display.flip()
+
+
+def wait_events(timeout_ms):
+    """Block until an event arrives or timeout_ms passes (CPU nghỉ). Returns the pending events."""
+    event = pygame.event.wait(timeout_ms)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+
+def get_player_info(hand_source=None, players=1):
+    """Nhập tên từng người chơi rồi số lần chơi. Returns (list tên, số lượt)."""
     # bật hiển thị chuột và text input (hỗ trợ IME)
     pygame.mouse.set_visible(True)
     pygame.key.start_text_input()
 
+    names = []
     player_name = ""
     num_games = ""
     stage = "name"
     input_active = True
+    events, drawn_status = [None], None
 
     while input_active:
-        for event in pygame.event.get():
+        status_key = getattr(hand_source, "status", None)
+        usage.enter("menu", getattr(hand_source, "mode", None))
+        if events or status_key != drawn_status:
+            drawn_status = status_key
+            draw_player_info(names, player_name, num_games, stage, players, status_key)
+        # chờ event thay vì vẽ lại liên tục; lúc đang nạp model thì thức dậy thường hơn để cập nhật trạng thái
+        loading = status_key in ("loading", "camera", "warmup")
+        events = wait_events(200 if loading else MENU_WAIT_MS)
+        for event in events:
+            if handle_display_event(event):
+                continue
             if event.type == pygame.QUIT:
                 pygame.key.stop_text_input()
                 pygame.quit(); sys.exit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN:
                     if stage == "name" and player_name.strip():
-                        stage = "num"
+                        names.append(player_name)
+                        player_name = ""
+                        if len(names) == players:
+                            stage = "num"
                     elif stage == "num" and num_games.strip().isdigit():
                         input_active = False
                 elif event.key == pygame.K_BACKSPACE:
@@ -264,208 +239,429 @@ def get_player_info():
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # xử lý click nút TIẾP TỤC
                 start_button = pygame.Rect(SCREEN_WIDTH // 2 - 100, 400, 200, 60)
-                if start_button.collidepoint(event.pos):
+                if start_button.collidepoint(layout.to_design(event.pos)):
                     if stage == "name" and player_name.strip():
-                        stage = "num"
+                        names.append(player_name)
+                        player_name = ""
+                        if len(names) == players:
+                            stage = "num"
                     elif stage == "num" and num_games.strip().isdigit():
                         input_active = False
 
-        screen.blit(BACKGROUND_IMAGE, (0, 0))
-        if stage == "name":
-            title = "NHAP TEN NGUOI CHOI:"
-            current = player_name
-        else:
-            title = "NHAP SO LAN CHOI:"
-            current = num_games
-
-        text = font.render(title, True, WHITE)
-        screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2, 180))
-
-        name_text = small_font.render(current + "|", True, GREEN)
-        screen.blit(name_text, (SCREEN_WIDTH // 2 - name_text.get_width() // 2, 300))
-
-        start_button = pygame.Rect(SCREEN_WIDTH // 2 - 100, 400, 200, 60)
-        draw_button(screen, start_button, "TIEP TUC", small_font, GREEN, WHITE)
-
-        pygame.display.flip()
-        clock.tick(30)
-
     pygame.key.stop_text_input()
     pygame.mouse.set_visible(False)
-    return player_name, int(num_games)
+    return names, int(num_games)
 
 # --- KHỞI TẠO ---
-base_x, base_y = 220, 250
-x_spacing, y_spacing = 170, 120
-mole_positions = [(base_x + i * x_spacing, base_y + j * y_spacing) for j in range(3) for i in range(3)]
-moles = [Mole(x, y) for x, y in mole_positions]
-
-hand_controller = HandController()
-hand_controller.start_detection()
-
-# --- VÒNG LẶP TOÀN GAME ---
-while True:
-    player_name, total_rounds = get_player_info()
-    round_count = 0
-
-    while round_count < total_rounds:
-        score = 0
-        hit_count = 0
-        total_moles_shown = 0
-        game_time = 30
-        game_over = False
-        start_time = pygame.time.get_ticks()
-
-        # --- INIT ANGLE STATS FOR THIS ROUND ---
-        fingers = ["thumb","index","middle","ring","pinky"]
-        angle_stats = {f: {"count":0, "sum":0.0, "max":-9999.0, "min":9999.0} for f in fingers}
-        # --- MỚI: clench stats ---
-        clench_stats = {"count":0, "sum":0.0, "max":-9999.0, "min":9999.0}
-
-        running = True
-        while running:
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    hand_controller.stop_detection()
-                    pygame.quit(); sys.exit()
-                if event.type == pygame.MOUSEBUTTONDOWN and game_over:
-                    if play_again_rect.collidepoint(pygame.mouse.get_pos()):
-                        running = False  # chuyển sang lượt chơi tiếp theo
-
-                # --- Thay đổi độ khó bằng phím 1/2/3 (tùy ý) ---
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_1:
-                        DIFFICULTY = "easy"
-                    elif event.key == pygame.K_2:
-                        DIFFICULTY = "normal"
-                    elif event.key == pygame.K_3:
-                        DIFFICULTY = "hard"
-                    # cập nhật cấu hình sau khi đổi
-                    _spawn_cfg = DIFFICULTY_PRESETS[DIFFICULTY]
-                    SPAWN_DENOM = _spawn_cfg["spawn_den"]
-                    MOLE_UP_MIN_MS = _spawn_cfg["min_up"]
-                    MOLE_UP_MAX_MS = _spawn_cfg["max_up"]
-                    MAX_SIMULTANEOUS_MOLES = _spawn_cfg["max_simultaneous"]
-
-            hand_position, gesture, cam_frame = hand_controller.get_hand_position()
-
-            # --- update angle stats each frame ---
-            angles = hand_controller.last_angles or {}
-            # clench speed từ hand_controller
-            clench_speed = getattr(hand_controller, "last_clench_speed", 0.0)
-
-            if angles:
-                for f in fingers:
-                    val = float(angles.get(f, 0.0))
-                    s = angle_stats[f]
-                    s["count"] += 1
-                    s["sum"] += val
-                    if val > s["max"]:
-                        s["max"] = val
-                    if val < s["min"]:
-                        s["min"] = val
-
-            # cập nhật clench_stats mỗi frame (nếu có reading)
-            if clench_speed is not None:
-                c = clench_stats
-                c["count"] += 1
-                c["sum"] += float(clench_speed)
-                if clench_speed > c["max"]:
-                    c["max"] = clench_speed
-                if clench_speed < c["min"]:
-                    c["min"] = clench_speed
-
-            if not game_over:
-                elapsed = (pygame.time.get_ticks() - start_time) // 1000
-                time_left = game_time - elapsed
-                if time_left <= 0:
-                    game_over = True
-                    acc = (hit_count / total_moles_shown * 100) if total_moles_shown > 0 else 0
-                    save_score_to_excel(player_name, score, hit_count, acc)
-
-                for mole in moles:
-                    mole.update()
-
-                # giới hạn số moles cùng lúc và dùng SPAWN_DENOM để điều khiển tần suất
-                up_count = sum(1 for m in moles if m.is_up)
-                if up_count < MAX_SIMULTANEOUS_MOLES and random.randint(1, SPAWN_DENOM) == 1:
-                    available = [m for m in moles if not m.is_up]
-                    if available:
-                        random.choice(available).show()
-                        total_moles_shown += 1
-
-                if hand_position and gesture:
-                    for mole in moles:
-                        if mole.rect.collidepoint(hand_position):
-                            mole.was_hit()
-
-            screen.blit(BACKGROUND_IMAGE, (0, 0))
-            for mole in moles:
-                screen.blit(mole.hole_image, mole.rect)
-            for mole in moles:
-                if mole.is_up:
-                    screen.blit(mole.image, mole.rect)
-
-            score_text = small_font.render(f"Score: {score}", True, BLACK)
-            time_text = small_font.render(f"Time: {max(0, game_time - (pygame.time.get_ticks() - start_time)//1000)}s", True, BLACK)
-            screen.blit(score_text, (10, 10))
-            screen.blit(time_text, (SCREEN_WIDTH - time_text.get_width() - 10, 10))
-
-            if hand_position:
-                screen.blit(HAMMER_IMAGE, (hand_position[0]-30, hand_position[1]-30))
-
-            if game_over:
-                # save per-round summary
-                save_angles_summary_xlsx(player_name, round_count + 1, angle_stats, clench_stats)
-                # also optionally save last frame angles + clench speed as row
-                if angles:
-                    save_angles_xlsx(angles, clench_speed)
+# bàn chơi: lưới BOARD_ROWS x BOARD_COLUMNS lỗ, góc trên trái BOARD_ORIGIN, khoảng cách BOARD_SPACING (px)
+BOARD_ROWS, BOARD_COLUMNS = 3, 3
+BOARD_ORIGIN = (220, 250)
+BOARD_SPACING = (170, 120)
+
+
+def board_renderer(board_moles):
+    """GameRenderer for the holes of board_moles at the current window size."""
+    board = GameRenderer(screen, BACKGROUND_IMAGE, Mole.images["hole"],
+                         [layout.pos(m.rect.topleft) for m in board_moles])
+    board.profiler = profiler
+    return board
+
+
+def make_board(columns, base_x, rows=BOARD_ROWS):
+    """Lưới rows hàng x columns cột: (moles, renderer). Thứ tự: từng hàng, trái sang phải."""
+    positions = grid_layout(rows, columns, (base_x, BOARD_ORIGIN[1]), BOARD_SPACING)
+    board_moles = [Mole(x, y) for x, y in positions]
+    return board_moles, board_renderer(board_moles)
+
+
+play_again_rect = pygame.Rect(SCREEN_WIDTH//2 - 100, 600, 200, 60)
+
+# --- NHIỀU NGƯỜI CHƠI: lưới 4 cột, mỗi người 2 cột (người chơi 0 bên trái) ---
+PLAYER_COLUMNS = 2
+PLAYER_COLORS = [(255, 90, 90), (90, 160, 255)]
+_multi_board = None
+
+
+def multi_board():
+    """(moles, renderer, moles của từng người chơi) cho chế độ hai người, dựng khi cần."""
+    global _multi_board
+    if _multi_board is None:
+        board_moles, board = make_board(2 * PLAYER_COLUMNS, 120)
+        columns = 2 * PLAYER_COLUMNS
+        per_player = [[m for k, m in enumerate(board_moles) if (k % columns) // PLAYER_COLUMNS == p]
+                      for p in range(2)]
+        _multi_board = (board_moles, board, per_player)
+    return _multi_board
+
+
+def current_board(multi):
+    """(moles, renderer, moles của từng người chơi) của bàn chơi đang dùng."""
+    return multi_board() if multi else (moles, renderer, [moles])
+
+
+def hud_sprites(board, sims, names):
+    time_text = board.text.render(small_font, f"Time: {sims[0].time_left_s}s", BLACK)
+    left = layout.pos((10, 10))
+    right_x, _ = layout.pos((SCREEN_WIDTH - 10, 10))
+    if len(sims) == 1:
+        score_text = board.text.render(small_font, f"Score: {sims[0].score}", BLACK)
+        return [(score_text, left), (time_text, (right_x - time_text.get_width(), left[1]))]
+    p1 = board.text.render(small_font, f"{names[0]}: {sims[0].score}", PLAYER_COLORS[0])
+    p2 = board.text.render(small_font, f"{names[1]}: {sims[1].score}", PLAYER_COLORS[1])
+    center_x, _ = layout.pos((SCREEN_WIDTH // 2, 10))
+    return [(p1, left), (p2, (right_x - p2.get_width(), left[1])),
+            (time_text, (center_x - time_text.get_width() // 2, left[1]))]
+
+
+def build_game_over_layer(board, board_moles, sims, names):
+    """Ghép sẵn bàn chơi + lớp phủ + kết quả thành một surface, vẽ một lần cho cả màn GAME OVER."""
+    layer = board.static.copy()
+    for mole in board_moles:
+        if mole.is_up:
+            layer.blit(mole.image, layout.pos(mole.rect.topleft))
+    for surf, pos in hud_sprites(board, sims, names):
+        layer.blit(surf, pos)
+    layer.blit(GAME_OVER_OVERLAY, (0, 0))
+
+    texts = [font.render("GAME OVER", True, RED)]
+    if len(sims) == 1:
+        sim = sims[0]
+        texts += [
+            small_font.render(f"Ten: {names[0]}", True, WHITE),
+            small_font.render(f"Diem: {sim.score}", True, WHITE),
+            small_font.render(f"So lan nam tay: {sim.hit_count}", True, WHITE),
+            small_font.render(f"Ti le phan ung: {sim.accuracy:.1f}%", True, WHITE)
+        ]
+    else:
+        for name, sim, color in zip(names, sims, PLAYER_COLORS):
+            texts.append(small_font.render(f"{name}: {sim.score} diem, {sim.hit_count} lan, "
+                                           f"{sim.accuracy:.1f}%", True, color))
+    for i, t in enumerate(texts):
+        blit_centered(layer, t, 200 + i*60)
+
+    draw_button(layer, play_again_rect, "LUOT TIEP", small_font, GREEN, WHITE)
+    return layer
+
+# độ trễ từng stage: camera/MediaPipe (thread nhận diện), update/render/display (game loop)
+profiler = LatencyProfiler() if LATENCY_STATS else NULL_PROFILER
+latency_overlay = LatencyOverlay(profiler, None)
+# bộ đếm cho giám sát (chỉ phục vụ qua HTTP khi đặt METRICS_PORT)
+metrics = GameMetrics(STATION_NAME)
+# CPU / điện năng theo trạng thái (menu, chơi, nghỉ), in ra và ghi telemetry/usage.csv khi thoát
+usage = UsageMeter()
+latency_overlay.visible = LATENCY_OVERLAY and profiler.enabled
+renderer = None
+cam_preview = cam_preview_pos = None
+window_size, fullscreen = WINDOW_SIZE, FULLSCREEN
+
+
+def set_display(size, full):
+    """
+    Mở cửa sổ (hoặc toàn màn hình) rồi dựng lại mọi thứ phụ thuộc độ phân giải:
+    layout, phông chữ, ảnh co giãn, lớp nền các bàn chơi, preview camera.
+    Ảnh gốc không phải nạp lại; chi phí chỉ gồm các ảnh đang dùng.
+    """
+    global screen, layout, font, small_font, tiny_font, mono_font, BACKGROUND_IMAGE, HAMMER_IMAGE
+    global PLAYER_HAMMERS, GAME_OVER_OVERLAY, renderer, _multi_board, cam_preview, cam_preview_pos
+    global window_size, fullscreen
+    if full:
+        screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    else:
+        screen = pygame.display.set_mode(size, pygame.RESIZABLE)
+        window_size = size
+    fullscreen = full
+    layout = Layout((SCREEN_WIDTH, SCREEN_HEIGHT), screen.get_size())
+
+    font = layout.font(64)
+    small_font = layout.font(32)
+    tiny_font = layout.font(18)
+    mono_font = layout.font(14, "consolas,couriernew,monospace")
+    latency_overlay.font = mono_font
+
+    assets.drop_scaled()
+    BACKGROUND_IMAGE = assets.get("background.png", screen.get_size())
+    Mole.images = {"hole": assets.get("hole.png", layout.size(HOLE_SIZE)),
+                   "up": assets.get("mole.png", layout.size(MOLE_SIZE)),
+                   "hit": assets.get("hit_mole.png", layout.size(MOLE_SIZE))}
+    HAMMER_IMAGE = assets.get("hammer.png", layout.size(HAMMER_SIZE))
+    PLAYER_HAMMERS = [assets.get("hammer.png", layout.size(HAMMER_SIZE), tint=c) for c in PLAYER_COLORS]
+    # lớp phủ màn GAME OVER, tạo một lần cho mỗi kích thước cửa sổ
+    GAME_OVER_OVERLAY = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+    GAME_OVER_OVERLAY.fill((0, 0, 0, 180))
+
+    if renderer is not None:
+        renderer = board_renderer(moles)
+    if _multi_board is not None:
+        _multi_board = (_multi_board[0], board_renderer(_multi_board[0]), _multi_board[2])
+    cam_preview = CameraPreview(layout.size((180, 150)), fps=PREVIEW_FPS)
+    cam_preview_pos = layout.pos((SCREEN_WIDTH - 180 - 10, SCREEN_HEIGHT - 150 - 10))
+
+
+def handle_display_event(event):
+    """Kéo giãn cửa sổ / F11. Returns True nếu event đã được xử lý (layout có thể đã đổi)."""
+    if event.type == pygame.VIDEORESIZE and not fullscreen:
+        if event.size != screen.get_size():
+            set_display(event.size, False)
+        return True
+    if event.type == pygame.KEYDOWN and event.key == pygame.K_F11:
+        set_display(window_size, not fullscreen)
+        return True
+    return False
+
+
+set_display(WINDOW_SIZE, FULLSCREEN)
+moles, renderer = make_board(BOARD_COLUMNS, BOARD_ORIGIN[0])
+
+
+def report_usage(path):
+    print(usage.report())
+    usage.save(path)
+
+
+def shutdown(hand_source, persistence):
+    hand_source.stop()
+    persistence.close()
+    pygame.quit(); sys.exit()
+
+
+def play_round(player_name, round_count, session_no, hand_source, telemetry, persistence,
+               seed=None, time_fn=time.perf_counter, fps=FPS, on_frame=None):
+    """
+    Chơi một lượt (round_count tính từ 0) tới khi bấm LUOT TIEP ở màn GAME OVER.
 
-                pygame.mouse.set_visible(True)
-                overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-                overlay.fill((0, 0, 0, 180))
-                screen.blit(overlay, (0, 0))
-
-                acc = (hit_count / total_moles_shown * 100) if total_moles_shown > 0 else 0
-                texts = [
-                    font.render("GAME OVER", True, RED),
-                    small_font.render(f"Ten: {player_name}", True, WHITE),
-                    small_font.render(f"Diem: {score}", True, WHITE),
-                    small_font.render(f"So lan nam tay: {hit_count}", True, WHITE),
-                    small_font.render(f"Ti le phan ung: {acc:.1f}%", True, WHITE)
-                ]
-                for i, t in enumerate(texts):
-                    screen.blit(t, (SCREEN_WIDTH//2 - t.get_width()//2, 200 + i*60))
-
-                play_again_rect = pygame.Rect(SCREEN_WIDTH//2 - 100, 600, 200, 60)
-                draw_button(screen, play_again_rect, "LUOT TIEP", small_font, GREEN, WHITE)
-
-            if cam_frame is not None:
-                cam_h, cam_w = 150, 180
-                cam_frame = cv2.resize(cam_frame, (cam_w, cam_h))
-                cam_frame = cv2.cvtColor(cam_frame, cv2.COLOR_BGR2RGB)
-                cam_surface = pygame.surfarray.make_surface(cam_frame.swapaxes(0, 1))
-                screen.blit(cam_surface, (SCREEN_WIDTH - cam_w - 10, SCREEN_HEIGHT - cam_h - 10))
-
-            pygame.display.flip()
-            clock.tick(FPS)
-
-        round_count += 1
-
-    # --- Hết số lần chơi ---
-    screen.fill(BLACK)
-    msg = font.render("DA HET LUOT!", True, RED)
-    msg2 = small_font.render("An phim bat ky ", True, WHITE)
-    screen.blit(msg, (SCREEN_WIDTH//2 - msg.get_width()//2, 300))
-    screen.blit(msg2, (SCREEN_WIDTH//2 - msg2.get_width()//2, 400))
-    pygame.display.flip()
+    hand_source là HandTrackingWorker hoặc object bất kỳ có poll()/stop()
+    (vd. replay.ScriptedHandSource). time_fn, fps (0 = không giới hạn) và
+    on_frame(sim, game_over), gọi sau mỗi frame, cho phép chạy headless với
+    đồng hồ ảo như trong bench.py.
 
-    waiting = True
-    while waiting:
+    player_name là list tên -> chế độ nhiều người chơi: hand_source cần
+    poll_players(), mỗi người chơi có búa, điểm, thống kê góc / clench và nửa
+    bàn chơi riêng (cùng seed nên hai bên ra chuột giống nhau; seed=None thì
+    mỗi lượt bốc một seed ngẫu nhiên dùng chung cho mọi người chơi).
+    """
+    global DIFFICULTY
+    names = [player_name] if isinstance(player_name, str) else list(player_name)
+    multi = len(names) > 1
+    board_moles, board, player_moles = current_board(multi)
+    hammers = PLAYER_HAMMERS if multi else [HAMMER_IMAGE]
+
+    game_time = 30
+    game_over = False
+    if seed is None:
+        seed = random.randrange(2 ** 32)      # một seed cho cả lượt: mọi người chơi cùng dãy chuột
+    sims = [GameSimulation(pm, DIFFICULTY_PRESETS[DIFFICULTY], game_time,
+                           seed=seed, step_ms=1000.0 / SIM_HZ) for pm in player_moles]
+    stepper = FixedTimestep(sims[0].step_ms, time_fn=time_fn)
+    # đồng hồ của HandResult.capture_time: time.monotonic() với camera, đồng hồ ảo với ScriptedHandSource
+    capture_clock = getattr(hand_source, "time_fn", time.monotonic)
+    stepper.reset()
+
+    # --- thống kê góc + clench speed từng người chơi trong lượt ---
+    stats = [RoundStats(game_time) for _ in names]
+
+    last_seq = 0
+    prev_pos = {}        # player_id -> vị trí tay ở lần nhận diện trước (đập theo đường quét)
+    telemetry.begin_round(names[0] if not multi else names, round_count + 1)
+    board.set_base(None)
+    profiler.reset()
+
+    running = True
+    while running:
         for event in pygame.event.get():
+            if handle_display_event(event):
+                # cửa sổ đổi kích thước: lấy lại lớp nền / ảnh đã co giãn theo kích thước mới
+                board_moles, board, _ = current_board(multi)
+                hammers = PLAYER_HAMMERS if multi else [HAMMER_IMAGE]
+                if game_over:
+                    board.set_base(build_game_over_layer(board, board_moles, sims, names))
+                continue
             if event.type == pygame.QUIT:
-                hand_controller.stop_detection()
-                pygame.quit(); sys.exit()
-            elif event.type == pygame.KEYDOWN:
-                waiting = False
+                shutdown(hand_source, persistence)
+            if event.type == pygame.MOUSEBUTTONDOWN and game_over:
+                if play_again_rect.collidepoint(layout.to_design(event.pos)):
+                    running = False  # chuyển sang lượt chơi tiếp theo
+
+            # --- Thay đổi độ khó bằng phím 1/2/3 (tùy ý) ---
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_1:
+                    DIFFICULTY = "easy"
+                elif event.key == pygame.K_2:
+                    DIFFICULTY = "normal"
+                elif event.key == pygame.K_3:
+                    DIFFICULTY = "hard"
+                elif event.key == pygame.K_F3:
+                    latency_overlay.visible = not latency_overlay.visible and profiler.enabled
+                # cập nhật cấu hình sau khi đổi
+                for sim in sims:
+                    sim.set_difficulty(DIFFICULTY_PRESETS[DIFFICULTY])
+
+        usage.enter("game over" if game_over else "play", getattr(hand_source, "mode", None))
+        hand_result = hand_source.poll()
+        # {player_id: HandResult}; một người chơi: chính kết quả của poll()
+        hands = hand_source.poll_players() if multi else {0: hand_result}
+        t_stage = profiler.now()
+
+        # --- update angle stats once per captured frame (không đếm lặp khi render nhanh hơn camera) ---
+        new_reading = hand_result.seq != last_seq
+        last_seq = hand_result.seq
+        if new_reading and not game_over:
+            for pid, r in hands.items():
+                # r.seq cũ hơn = cú nắm tay báo muộn của tay vừa mất, số đo đã được tính
+                if pid < len(stats) and r.seq >= hand_result.seq:
+                    stats[pid].add(r.angles, r.clench_speed, r.capture_time)
+
+        if not game_over:
+            # chạy mô phỏng theo bước cố định, độc lập với tốc độ render
+            for _ in range(stepper.advance()):
+                for sim in sims:
+                    sim.step()
+
+            # mỗi người chơi chỉ đập được chuột trong phần bàn chơi của mình
+            for pid, r in hands.items():
+                if pid < len(sims) and r.hand_pos and r.gesture and \
+                        sims[pid].hit_at(r.hand_pos, r.capture_time, prev_pos.get(pid)):
+                    # capture -> hit: từ lúc đọc frame có cú nắm tay tới lúc game tính trúng
+                    profiler.add("capture_to_hit", (capture_clock() - r.capture_time) * 1000.0)
+            if new_reading:
+                for pid, r in hands.items():
+                    prev_pos[pid] = r.hand_pos
+
+            if sims[0].game_over:
+                game_over = True
+                metrics.rounds_played += 1
+                # giao kết quả lượt cho thread ghi đúng một lần, không ghi đĩa ở đây
+                telemetry.end_round()
+                latency_rows = profiler.summary_rows(" & ".join(names), round_count + 1)
+                for pid, (name, sim) in enumerate(zip(names, sims)):
+                    round_id = (session_no, round_count, pid) if multi else (session_no, round_count)
+                    series_name = telemetry.series_name(name, round_count + 1, session_no, pid)
+                    persistence.submit_round(round_id, name, round_count + 1,
+                                             sim.score, sim.hit_count, sim.accuracy,
+                                             stats[pid].summary_row(name, round_count + 1, series_name),
+                                             latency_rows if pid == 0 else None,
+                                             (series_name, stats[pid].series()),
+                                             build_event_rows(name, round_count + 1, sim.events))
+                pygame.mouse.set_visible(True)
+                board.set_base(build_game_over_layer(board, board_moles, sims, names))
 
+        profiler.since("update", t_stage)
+        metrics.frames_rendered += 1
+
+        # chỉ vẽ lại các vùng thay đổi trên lớp nền dựng sẵn
+        sprites = []
+        if not game_over:
+            for mole in board_moles:
+                if mole.is_up:
+                    sprites.append((mole.image, layout.pos(mole.rect.topleft)))
+            sprites += hud_sprites(board, sims, names)
+
+        for pid, r in hands.items():
+            if r.hand_pos and pid < len(hammers):
+                # ngoại suy vị trí tới thời điểm vẽ để búa mượt theo tốc độ render
+                cursor = r.predict_pos()
+                sprites.append((hammers[pid], layout.pos((cursor[0]-30, cursor[1]-30))))
+
+        # preview cập nhật thưa (PREVIEW_FPS) thẳng vào lớp nền, không tạo surface mới
+        if cam_preview.update(hand_result, hands=hands.values() if multi else None):
+            board.blit_to_base(cam_preview.surface, cam_preview_pos)
+            # độ trễ của kết quả nhận diện (từ lúc capture tới lúc vẽ)
+            age_text = board.text.render(tiny_font, f"{hand_result.age(capture_clock()) * 1000:.0f} ms", WHITE)
+            board.blit_to_base(age_text, (cam_preview_pos[0] + 4, cam_preview_pos[1] + 2))
+
+        if latency_overlay.visible:
+            sprites.append((latency_overlay.surface(), layout.pos((10, 50))))
+
+        board.present(sprites)
+        if not game_over:
+            # chuột mới ngoi lên từ frame này: mốc onset để tính thời gian phản ứng
+            shown_at = capture_clock()
+            for sim in sims:
+                sim.mark_shown(shown_at)
+        if new_reading and profiler.enabled:
+            # motion-to-photon: từ lúc capture tới khi frame dùng kết quả đó lên màn hình
+            profiler.add("capture_to_photon", (capture_clock() - hand_result.capture_time) * 1000.0)
+        if on_frame is not None:
+            on_frame(sims[0], game_over)
+        clock.tick(fps)
+
+
+def main():
+    telemetry = TelemetryWriter()
+    inference = None
+    if INFERENCE_SERVER:
+        try:
+            inference = InferenceClient(INFERENCE_SERVER, budget_ms=INFERENCE_BUDGET_MS)
+            atexit.register(inference.close)
+        except OSError as e:
+            print(f"Inference server {INFERENCE_SERVER} unavailable ({e}), running MediaPipe locally")
+    if PLAYERS > 1:
+        hand_controller = MultiHandController(max_hands=PLAYERS, latency_budget_ms=INFER_BUDGET_MS,
+                                              inference=inference)
+    else:
+        hand_controller = HandController(roi=HAND_ROI, latency_budget_ms=INFER_BUDGET_MS, inference=inference)
+    hand_controller.draw_overlays = False    # landmarks được vẽ ở kích thước preview
+    if AUTO_QUALITY:
+        hand_controller.quality = AdaptiveQuality(hand_controller, INFER_BUDGET_MS)
+        latency_overlay.status_fn = hand_controller.quality.describe
+    hand_controller.profiler = profiler
+    if LANDMARK_FEED:
+        hand_controller.feed = FeedWriter()
+        atexit.register(hand_controller.feed.close)
+    recorder = SessionRecorder(RECORD_FILE, RECORD_VIDEO) if RECORD_FILE else None
+    # camera + MediaPipe chạy trên thread riêng, game loop chỉ đọc kết quả mới nhất;
+    # start() trả về ngay, model được nạp và chạy thử trong lúc người chơi nhập tên
+    hand_worker = HandTrackingWorker(hand_controller, telemetry=telemetry, recorder=recorder,
+                                     source=CAMERA_SOURCE, idle_after_s=IDLE_AFTER_S,
+                                     idle_check_hz=IDLE_CHECK_HZ, metrics=metrics)
+    hand_worker.start()
+    atexit.register(report_usage, os.path.join(telemetry.directory, "usage.csv"))
+
+    # telemetry từng frame (append-only), xlsx được dựng lại bằng: python src/telemetry.py export
+    # mọi thao tác ghi đĩa (lịch sử điểm, tổng kết lượt, telemetry, nhập xlsx cũ) chạy trên thread riêng
+    persistence = PersistenceWorker(telemetry, startup=migrate_legacy_xlsx if OPENPYXL else None)
+    persistence.start()
+
+    if METRICS_PORT:
+        metrics.controller, metrics.hand_source, metrics.persistence = hand_controller, hand_worker, persistence
+        try:
+            MetricsServer(metrics, port=METRICS_PORT).start()
+        except OSError as e:
+            print(f"Metrics endpoint on port {METRICS_PORT} unavailable ({e})")
+
+    # --- VÒNG LẶP TOÀN GAME ---
+    session_no = 0
+    while True:
+        names, total_rounds = get_player_info(hand_worker, PLAYERS)
+        player_name = names if PLAYERS > 1 else names[0]
+        session_no += 1
+        round_count = 0
+
+        # trong lượt chơi luôn nhận diện đủ tốc độ, kể cả khi tay tạm ra khỏi khung hình
+        hand_worker.keep_active = True
+        while round_count < total_rounds:
+            seed = None if SIM_SEED is None else SIM_SEED + round_count
+            play_round(player_name, round_count, session_no, hand_worker, telemetry, persistence, seed=seed)
+            round_count += 1
+        hand_worker.keep_active = False
+
+        # --- Hết số lần chơi ---
+        waiting = redraw = True
+        while waiting:
+            if redraw:
+                screen.fill(BLACK)
+                blit_centered(screen, font.render("DA HET LUOT!", True, RED), 300)
+                blit_centered(screen, small_font.render("An phim bat ky ", True, WHITE), 400)
+                pygame.display.flip()
+                redraw = False
+            usage.enter("end", hand_worker.mode)
+            for event in wait_events(MENU_WAIT_MS):
+                if handle_display_event(event):
+                    redraw = True
+                elif event.type == pygame.QUIT:
+                    shutdown(hand_worker, persistence)
+                elif event.type == pygame.KEYDOWN:
+                    waiting = False
+
+
+if __name__ == "__main__":
+    main()
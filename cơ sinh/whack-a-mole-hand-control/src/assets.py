@@ -0,0 +1,135 @@
+"""
+Nạp ảnh và co giãn bố cục theo độ phân giải cửa sổ.
+
+  - AssetManager: nạp mỗi file ảnh đúng một lần (khi cần tới, không quét trước
+    cả thư mục nên thêm ảnh / theme không làm chậm lúc khởi động), đổi sang
+    định dạng pixel của màn hình và giữ các bản đã co giãn theo (tên, kích thước,
+    màu nhuộm)
+  - Layout: đổi tọa độ thiết kế (vd. 900x800) sang tọa độ cửa sổ thật: cùng một
+    tỉ lệ cho cả hai chiều, căn giữa, chữ và ảnh được dựng sẵn ở kích thước đã
+    co giãn nên mỗi frame không phải scale lại surface nào
+  - load_image(file_name, size=None): hàm gọn dùng AssetManager mặc định
+"""
+import os
+
+import pygame
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+
+class AssetManager:
+    """
+    Kho ảnh dùng chung.
+
+      - themes: các thư mục ưu tiên tìm trước asset_dir (file thiếu lấy từ asset_dir)
+      - get(name, size=None, tint=None): surface đã convert, cache theo (name, size, tint)
+      - drop_scaled(): bỏ các bản co giãn (vd. khi đổi độ phân giải), giữ ảnh gốc đã nạp
+      - set_themes(themes): đổi theme, ảnh gốc được nạp lại khi cần
+
+    Ảnh lỗi / thiếu file được thay bằng một ô màu để game vẫn chạy được.
+    """
+
+    def __init__(self, asset_dir=ASSET_DIR, themes=()):
+        self.asset_dir = asset_dir
+        self.themes = list(themes)
+        self._sources = {}
+        self._scaled = {}
+
+    def set_themes(self, themes):
+        self.themes = list(themes)
+        self._sources.clear()
+        self._scaled.clear()
+
+    def path(self, name):
+        for theme in self.themes:
+            p = os.path.join(theme, name)
+            if os.path.isfile(p):
+                return p
+        return os.path.join(self.asset_dir, name)
+
+    def source(self, name):
+        """Original image converted to the display format, loaded once."""
+        surf = self._sources.get(name)
+        if surf is None:
+            path = self.path(name)
+            try:
+                image = pygame.image.load(path)
+                # ảnh không trong suốt (vd. nền) dùng convert(): blit nhanh hơn convert_alpha()
+                opaque = not (image.get_flags() & pygame.SRCALPHA) and image.get_colorkey() is None
+                surf = image.convert() if opaque else image.convert_alpha()
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"Cannot load image: {path}. Error: {e}")
+                surf = pygame.Surface((100, 100))
+                surf.fill((0, 150, 0))
+            self._sources[name] = surf
+        return surf
+
+    def get(self, name, size=None, tint=None):
+        key = (name, tuple(size) if size else None, tint)
+        surf = self._scaled.get(key)
+        if surf is None:
+            if tint is not None:
+                surf = self.get(name, size).copy()
+                surf.fill(tuple(tint) + (255,), special_flags=pygame.BLEND_RGBA_MULT)
+            elif size and tuple(size) != self.source(name).get_size():
+                surf = pygame.transform.smoothscale(self.source(name), (max(1, size[0]), max(1, size[1])))
+            else:
+                surf = self.source(name)
+            self._scaled[key] = surf
+        return surf
+
+    def drop_scaled(self):
+        self._scaled.clear()
+
+
+class Layout:
+    """
+    Ánh xạ tọa độ thiết kế -> tọa độ cửa sổ.
+
+      - scale: tỉ lệ chung (giữ tỉ lệ khung hình), offset: lề căn giữa (px)
+      - pos(p), size(s), rect(r), length(v): thiết kế -> cửa sổ
+      - to_design(p): cửa sổ -> thiết kế (vd. vị trí click chuột)
+      - font(size, name): pygame font đã co giãn, cache theo (name, size)
+    """
+
+    def __init__(self, design_size, window_size):
+        self.design_size = design_size
+        self.window_size = window_size
+        self.scale = min(window_size[0] / design_size[0], window_size[1] / design_size[1])
+        self.offset = (round((window_size[0] - design_size[0] * self.scale) / 2),
+                       round((window_size[1] - design_size[1] * self.scale) / 2))
+        self._fonts = {}
+
+    def length(self, v):
+        return max(1, round(v * self.scale))
+
+    def pos(self, p):
+        return (self.offset[0] + round(p[0] * self.scale), self.offset[1] + round(p[1] * self.scale))
+
+    def size(self, s):
+        return (self.length(s[0]), self.length(s[1]))
+
+    def rect(self, r):
+        r = pygame.Rect(r)
+        return pygame.Rect(self.pos(r.topleft), self.size(r.size))
+
+    def to_design(self, p):
+        return ((p[0] - self.offset[0]) / self.scale, (p[1] - self.offset[1]) / self.scale)
+
+    def font(self, size, name="arial"):
+        key = (name, size)
+        f = self._fonts.get(key)
+        if f is None:
+            f = self._fonts[key] = pygame.font.SysFont(name, self.length(size))
+        return f
+
+
+_default = None
+
+
+def load_image(file_name, size=None):
+    """Image from the default AssetManager (cached, display format)."""
+    global _default
+    if _default is None:
+        _default = AssetManager()
+    return _default.get(file_name, size)
@@ -0,0 +1,210 @@
+"""
+Phân tích offline các video buổi tập đã ghi (vd. app.RECORD_VIDEO), không cần màn hình.
+
+Mỗi video được đưa qua HandController giống lúc chơi (cùng góc khớp, clench
+speed, nắm tay) nhưng không vẽ gì lên frame và đọc nhanh nhất có thể; thời
+điểm mỗi frame lấy theo vị trí trong video nên clench speed đúng như thời gian
+thực. Các video được chia cho một pool process (mặc định mỗi core một process).
+
+    python src/batch_analysis.py videos/ --out analysis/
+    python src/batch_analysis.py a.avi b.mp4 --workers 4 --roi
+
+Kết quả trong --out:
+  - <video>.frames.csv: mỗi frame một dòng (FRAME_COLUMNS bên dưới); tên theo
+    đường dẫn tương đối so với thư mục chung của mọi video, giữ cả đuôi file
+    ("p1/day1.avi" -> "p1__day1.avi.frames.csv") nên video trùng tên ở các thư
+    mục khác nhau không ghi đè nhau
+  - summary.csv: mỗi video một dòng theo telemetry.SUMMARY_COLUMNS
+    (player = đường dẫn tương đối của video, series_file = file .frames.csv)
+"""
+import csv
+import os
+import time
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mov", ".mkv", ".webm")
+FRAME_COLUMNS = ["frame", "t", "detected", "wrist_x", "wrist_y",
+                 "thumb", "index", "middle", "ring", "pinky", "clench_speed", "gesture"]
+SUMMARY_FILE = "summary.csv"
+
+
+def find_videos(paths, extensions=VIDEO_EXTENSIONS):
+    """Expand directories (recursively) into a sorted list of video files."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos += [os.path.join(root, f) for f in files if f.lower().endswith(extensions)]
+        elif os.path.isfile(path):
+            videos.append(path)
+    # cùng một file liệt kê hai lần (vd. "videos/" và "videos/a.avi") chỉ phân tích một lần
+    return sorted({os.path.normpath(v) for v in videos})
+
+
+def output_names(videos):
+    """
+    (label, frames csv name) for each video: path relative to the common directory
+    of all videos, extension kept. Names that still collide get a "-2", "-3"... suffix.
+    """
+    if not videos:
+        return []
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(v)) for v in videos])
+    names, seen = [], set()
+    for v in videos:
+        label = os.path.relpath(os.path.abspath(v), root).replace(os.sep, "/")
+        base = label.replace("/", "__")
+        frames_name, n = base + ".frames.csv", 1
+        while frames_name.lower() in seen:          # so không phân biệt hoa thường (Windows / macOS)
+            n += 1
+            frames_name = f"{base}-{n}.frames.csv"
+        seen.add(frames_name.lower())
+        names.append((label, frames_name))
+    return names
+
+
+def _init_worker():
+    # một process mỗi core: tắt thread pool riêng của OpenCV để các process không tranh core
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def analyze_video(task):
+    """
+    Worker: run one video through HandController headless.
+    task = (path, label, frames_name, out_dir, controller_kwargs), names from output_names().
+    Returns a dict with the summary row and timing, or {"video", "error"} if the video failed.
+    """
+    path, label, frames_name, out_dir, controller_kwargs = task
+    cap = None
+    try:
+        from replay import ReplayCapture
+
+        cap = ReplayCapture(path, realtime=False)
+        if not cap.isOpened():
+            return {"video": path, "error": "cannot open video"}
+        return _analyze(cap, path, label, frames_name, out_dir, controller_kwargs)
+    except Exception as e:
+        # một video lỗi (stream hỏng giữa chừng, MediaPipe lỗi...) không dừng cả lô
+        try:
+            os.remove(os.path.join(out_dir, frames_name))       # bỏ file frames dở dang
+        except OSError:
+            pass
+        return {"video": path, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        if cap is not None:
+            cap.release()
+
+
+def _analyze(cap, path, label, frames_name, out_dir, controller_kwargs):
+    import cv2
+
+    from hand_control import FINGERS, HandController
+    from telemetry import RoundStats
+
+    t0 = time.perf_counter()
+    fps = cap.fps
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    controller = HandController(**controller_kwargs)
+    try:
+        controller.draw_overlays = False
+        controller.clock = cap.frame_time
+        controller.start_detection(cap)
+        controller.load_model()
+        stats = RoundStats(duration_s=max(n_frames, 1) / fps, capture_hz=fps)
+
+        frames = detected = 0
+        with open(os.path.join(out_dir, frames_name), "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(FRAME_COLUMNS)
+            while True:
+                hand_pos, gesture, frame = controller.get_hand_position()
+                if frame is None:
+                    break
+                frames += 1
+                t = controller.last_frame_time
+                if hand_pos is None:
+                    w.writerow([frames, round(t, 4), 0] + [""] * (len(FRAME_COLUMNS) - 3))
+                    continue
+                detected += 1
+                angles = controller.last_angles
+                clench = None if controller.last_predicted else controller.last_clench_speed
+                stats.add(angles, clench, t)
+                w.writerow([frames, round(t, 4), 1, hand_pos[0], hand_pos[1]]
+                           + [round(angles[f], 2) for f in FINGERS]
+                           + ["" if clench is None else round(clench, 2), int(gesture)])
+    finally:
+        controller.stop_detection()
+        for graph in (controller.hands, controller.roi_hands):
+            if graph is not None:
+                graph.close()
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "video": path,
+        "frames": frames,
+        "detected": detected,
+        "seconds": elapsed,
+        "video_seconds": frames / fps,
+        "summary_row": stats.summary_row(label, None, frames_name),
+    }
+
+
+def run_batch(videos, out_dir, workers=None, controller_kwargs=None, on_result=None):
+    """Analyze every video on a process pool. Returns (results, wall seconds)."""
+    from multiprocessing import get_context
+
+    from telemetry import SUMMARY_COLUMNS
+
+    os.makedirs(out_dir, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(videos)))
+    # tên file kết quả được chọn (không trùng nhau) trước khi mở pool
+    names = output_names(videos)
+    tasks = [(v, label, frames_name, out_dir, controller_kwargs or {})
+             for v, (label, frames_name) in zip(videos, names)]
+    results = []
+    t0 = time.perf_counter()
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(SUMMARY_COLUMNS)
+        with get_context("spawn").Pool(workers, initializer=_init_worker) as pool:
+            # video dài trước để các process kết thúc gần cùng lúc
+            tasks.sort(key=lambda t: os.path.getsize(t[0]), reverse=True)
+            for res in pool.imap_unordered(analyze_video, tasks):
+                if "summary_row" in res:
+                    w.writerow(res["summary_row"])
+                    fh.flush()
+                results.append(res)
+                if on_result is not None:
+                    on_result(res)
+    return results, time.perf_counter() - t0
+
+
+def _print_result(res):
+    name = os.path.basename(res["video"])
+    if "error" in res:
+        print(f"{name:<32} ERROR {res['error']}")
+        return
+    fps = res["frames"] / res["seconds"] if res["seconds"] > 0 else 0.0
+    print(f"{name:<32} {res['frames']:>7} frames  {res['detected']:>7} with hand  "
+          f"{fps:>7.1f} fps  {res['video_seconds'] / res['seconds']:>5.1f}x realtime")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Batch finger-angle analysis of recorded videos")
+    parser.add_argument("paths", nargs="+", help="video files or directories")
+    parser.add_argument("--out", default="analysis", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU cores)")
+    parser.add_argument("--roi", action="store_true", help="run the model on the tracked hand region only")
+    parser.add_argument("--no-depth", action="store_true", help="2D angles (ignore MediaPipe z)")
+    args = parser.parse_args()
+
+    videos = find_videos(args.paths)
+    if not videos:
+        parser.error("no video files found")
+    kwargs = {"roi": args.roi, "use_depth": not args.no_depth}
+    results, wall = run_batch(videos, args.out, args.workers, kwargs, on_result=_print_result)
+    total = sum(r.get("frames", 0) for r in results)
+    video_s = sum(r.get("video_seconds", 0.0) for r in results)
+    print(f"{len(results)} videos, {total} frames in {wall:.1f} s: {total / wall:.1f} fps overall, "
+          f"{video_s / wall:.1f}x realtime -> {os.path.join(args.out, SUMMARY_FILE)}")
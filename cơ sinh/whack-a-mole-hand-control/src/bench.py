@@ -0,0 +1,243 @@
+"""
+Benchmark game loop headless (SDL dummy driver), không cần webcam hay cửa sổ.
+
+Mỗi kịch bản chạy trọn một lượt chơi qua app.play_round() với đồng hồ ảo:
+mỗi frame render tiến đúng 1/render_hz giây thời gian game, còn luồng tay
+đến từ replay.ScriptedHandSource (kịch bản tổng hợp hoặc file đã ghi), nên
+cùng seed cho cùng một lượt chơi và kết quả so sánh được giữa các lần đổi code.
+
+    python bench.py                         # mọi kịch bản có sẵn
+    python bench.py sweep --alloc           # thêm thống kê cấp phát (tracemalloc)
+    python bench.py --replay session.jsonl  # phát lại luồng tay đã ghi (app.RECORD_FILE)
+    python bench.py --json out.json         # lưu kết quả để so sánh
+
+Báo cáo: số frame, FPS, thời gian mỗi frame (p50/p95/p99/max, ms), p95 từng
+stage (latency.py), số lần GC thế hệ 0 và, với --alloc, bộ nhớ cấp phát đỉnh /
+còn giữ lại.
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(os.path.dirname(os.path.abspath(__file__)))     # đường dẫn tương đối của app (telemetry, xlsx) theo src/
+
+import gc
+import json
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import app
+from hand_worker import HandResult
+from persistence import PersistenceWorker
+from replay import ScriptedHandSource, load_recording
+from telemetry import FINGERS, TelemetryWriter
+
+OPEN_ANGLE = 170.0
+FIST_ANGLE = 40.0
+
+
+class VirtualClock:
+    """Đồng hồ ảo: chỉ tiến khi gọi advance(), dùng làm time_fn cho game và hand source."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, dt):
+        self.now += dt
+
+
+def sweep_stream(targets, duration_s, camera_fps=30.0, dwell_s=0.8, seed=0):
+    """
+    Luồng tay tổng hợp: lần lượt di chuyển tới một lỗ ngẫu nhiên trong 40% đầu
+    mỗi dwell_s giây, nắm tay ở 60% (một gesture), mở tay lại ở lỗ kế tiếp.
+    """
+    rng = random.Random(seed)
+    segments = int(duration_s / dwell_s) + 2
+    path = [targets[0]] + [rng.choice(targets) for _ in range(segments)]
+    results = []
+    prev_pos, prev_angle = None, OPEN_ANGLE
+    fired = -1
+    for i in range(int(duration_s * camera_fps)):
+        t = i / camera_fps
+        seg, phase = divmod(t / dwell_s, 1.0)
+        seg = int(seg)
+        a, b = path[seg], path[seg + 1]
+        k = min(phase / 0.4, 1.0)
+        pos = (int(a[0] + (b[0] - a[0]) * k), int(a[1] + (b[1] - a[1]) * k))
+        fist = phase >= 0.6
+        gesture = fist and fired != seg
+        if gesture:
+            fired = seg
+        angle = FIST_ANGLE if fist else OPEN_ANGLE
+        velocity = (0.0, 0.0) if prev_pos is None else \
+            ((pos[0] - prev_pos[0]) * camera_fps, (pos[1] - prev_pos[1]) * camera_fps)
+        results.append(HandResult(pos, gesture, None, dict.fromkeys(FINGERS, angle),
+                                  (angle - prev_angle) * camera_fps, t, i + 1,
+                                  velocity=velocity))
+        prev_pos, prev_angle = pos, angle
+    return results
+
+
+def _hole_targets():
+    return [m.rect.center for m in app.moles]
+
+
+SCENARIOS = {
+    # tên: (difficulty, hàm tạo luồng tay theo (thời lượng, camera_fps))
+    "idle": ("easy", lambda duration, fps: []),
+    "sweep": ("easy", lambda duration, fps: sweep_stream(_hole_targets(), duration, fps)),
+    "sweep-hard": ("hard", lambda duration, fps: sweep_stream(_hole_targets(), duration, fps, dwell_s=0.5)),
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def run_scenario(name, results, difficulty, render_hz=120.0, seed=1, alloc=False, frame_size=(640, 480)):
+    """Run one headless round. Returns a dict of metrics."""
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    telemetry = TelemetryWriter(directory=os.path.join(tmp, "telemetry"))
+    persistence = PersistenceWorker(telemetry, store_path=os.path.join(tmp, "sessions.db"),
+                                    legacy_history=None)
+    persistence.start()
+
+    clock = VirtualClock()
+    frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+    source = ScriptedHandSource(results, time_fn=clock, frame=frame, telemetry=telemetry)
+    app.DIFFICULTY = difficulty
+
+    frame_times = []
+    state = {"last": None, "clicked": False, "sim": None}
+    dt = 1.0 / render_hz
+
+    def on_frame(sim, game_over):
+        now = time.perf_counter()
+        if state["last"] is not None:
+            frame_times.append(now - state["last"])
+        state["last"] = now
+        state["sim"] = sim
+        clock.advance(dt)
+        if game_over and not state["clicked"]:
+            # bấm LUOT TIEP để play_round() kết thúc ở frame sau
+            state["clicked"] = True
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, button=1,
+                                                 pos=app.layout.rect(app.play_again_rect).center))
+
+    pygame.event.clear()
+    gc.collect()
+    gc0 = gc.get_stats()[0]["collections"]
+    if alloc:
+        tracemalloc.start()
+        snap0 = tracemalloc.take_snapshot()
+    t0 = time.perf_counter()
+    source.start()
+    app.play_round(name, 0, 1, source, telemetry, persistence, seed=seed, time_fn=clock, fps=0,
+                   on_frame=on_frame)
+    wall = time.perf_counter() - t0
+    metrics = {}
+    if alloc:
+        snap1 = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # bỏ qua cấp phát của chính bench (danh sách thời gian frame)
+        own = [tracemalloc.Filter(False, os.path.abspath(__file__))]
+        diff = snap1.filter_traces(own).compare_to(snap0.filter_traces(own), "lineno")
+        metrics["alloc_peak_kib"] = round(peak / 1024.0, 1)
+        metrics["alloc_retained_kib"] = round(sum(d.size_diff for d in diff) / 1024.0, 1)
+        metrics["alloc_top"] = [str(d) for d in diff[:5]]
+    metrics["gc0_collections"] = gc.get_stats()[0]["collections"] - gc0
+    # p50/p95/p99 từng stage của game loop (app.profiler, reset đầu mỗi lượt)
+    metrics["stages"] = {s[0]: {"p50": round(s[3], 3), "p95": round(s[4], 3), "p99": round(s[5], 3)}
+                         for s in app.profiler.snapshot()}
+
+    persistence.close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    sim = state["sim"]
+    ft = sorted(t * 1000.0 for t in frame_times)
+    metrics.update({
+        "scenario": name,
+        "frames": len(frame_times) + 1,
+        "wall_s": round(wall, 3),
+        "fps": round((len(frame_times) + 1) / wall, 1) if wall > 0 else 0.0,
+        "frame_ms_p50": round(percentile(ft, 50), 3),
+        "frame_ms_p95": round(percentile(ft, 95), 3),
+        "frame_ms_p99": round(percentile(ft, 99), 3),
+        "frame_ms_max": round(ft[-1], 3) if ft else 0.0,
+        "score": sim.score,
+        "hits": sim.hit_count,
+        "moles_shown": sim.total_moles_shown,
+    })
+    return metrics
+
+
+def _print_row(m):
+    line = (f"{m['scenario']:<14} {m['frames']:>6} frames {m['fps']:>8.1f} fps  "
+            f"p50 {m['frame_ms_p50']:.2f}  p95 {m['frame_ms_p95']:.2f}  p99 {m['frame_ms_p99']:.2f}  "
+            f"max {m['frame_ms_max']:.2f} ms  gc0 {m['gc0_collections']}  "
+            f"score {m['score']} ({m['hits']}/{m['moles_shown']})")
+    if "alloc_peak_kib" in m:
+        line += f"  peak {m['alloc_peak_kib']} KiB  retained {m['alloc_retained_kib']} KiB"
+    print(line)
+    if m["stages"]:
+        print("    p95 ms: " + "  ".join(f"{k} {v['p95']:.2f}" for k, v in m["stages"].items()))
+    for site in m.get("alloc_top", []):
+        print("    " + site)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Headless game-loop benchmark")
+    parser.add_argument("scenarios", nargs="*", help=f"subset of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--replay", action="append", default=[], help="recorded .jsonl hand stream")
+    parser.add_argument("--difficulty", default="easy", help="difficulty for --replay runs")
+    parser.add_argument("--render-hz", type=float, default=120.0)
+    parser.add_argument("--camera-fps", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--alloc", action="store_true", help="track allocations (slower)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args(argv)
+
+    duration = 30.0 + 1.0       # một lượt 30 s + màn GAME OVER
+    names = args.scenarios or ([] if args.replay else list(SCENARIOS))
+    runs = []
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name!r}")
+        difficulty, make = SCENARIOS[name]
+        runs.append((name, make(duration, args.camera_fps), difficulty, (640, 480)))
+    for path in args.replay:
+        header, results = load_recording(path)
+        size = tuple(header.get("frame_size") or (640, 480))
+        runs.append((os.path.basename(path), results, args.difficulty, size))
+
+    out = []
+    for name, results, difficulty, size in runs:
+        m = run_scenario(name, results, difficulty, args.render_hz, args.seed, args.alloc, size)
+        _print_row(m)
+        out.append(m)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"render_hz": args.render_hz, "seed": args.seed, "python": sys.version.split()[0],
+                       "pygame": pygame.version.ver, "results": out}, fh, indent=2)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Bố cục bàn chơi và tra cứu va chạm búa - lỗ chuột.
+
+  - grid_layout(rows, columns, origin, spacing): vị trí lưới rows x columns bất kỳ
+  - SpatialIndex(rects, cell=None): lưới băm dựng sẵn một lần cho mỗi bàn chơi,
+    at(pos) và along(p0, p1) chỉ xét các lỗ trong những ô lưới mà điểm / đoạn
+    thẳng đi qua, nên chi phí không tăng theo số lỗ trên bàn
+"""
+import math
+
+
+def grid_layout(rows, columns, origin, spacing):
+    """Top-left positions of a rows x columns grid, row by row, left to right."""
+    (x0, y0), (dx, dy) = origin, spacing
+    return [(x0 + i * dx, y0 + j * dy) for j in range(rows) for i in range(columns)]
+
+
+class SpatialIndex:
+    """
+    Lưới băm đều trên các pygame.Rect (không đổi sau khi dựng).
+
+      - at(pos): index các rect chứa điểm pos
+      - along(p0, p1): [(t, index)] các rect mà đoạn p0 -> p1 cắt qua, t (0..1) là
+        vị trí đầu tiên đoạn thẳng chạm rect, tăng dần
+    """
+
+    def __init__(self, rects, cell=None):
+        self.rects = list(rects)
+        if cell is None:
+            cell = max([max(r.width, r.height) for r in self.rects] or [1])
+        self.cell = max(1, int(cell))
+        self._cells = {}
+        for i, r in enumerate(self.rects):
+            for cx in range(r.left // self.cell, (r.right - 1) // self.cell + 1):
+                for cy in range(r.top // self.cell, (r.bottom - 1) // self.cell + 1):
+                    self._cells.setdefault((cx, cy), []).append(i)
+
+    def at(self, pos):
+        cands = self._cells.get((int(pos[0]) // self.cell, int(pos[1]) // self.cell), ())
+        return [i for i in cands if self.rects[i].collidepoint(pos)]
+
+    def _cells_on_segment(self, p0, p1):
+        """Grid cells crossed by the segment (Amanatides & Woo traversal)."""
+        c = self.cell
+        x0, y0 = p0[0] / c, p0[1] / c
+        x1, y1 = p1[0] / c, p1[1] / c
+        cx, cy = math.floor(x0), math.floor(y0)
+        ex, ey = math.floor(x1), math.floor(y1)
+        dx, dy = x1 - x0, y1 - y0
+        sx = 1 if dx > 0 else -1
+        sy = 1 if dy > 0 else -1
+        t_dx = abs(1.0 / dx) if dx else math.inf
+        t_dy = abs(1.0 / dy) if dy else math.inf
+        t_x = ((cx + 1 - x0) if dx > 0 else (x0 - cx)) * t_dx if dx else math.inf
+        t_y = ((cy + 1 - y0) if dy > 0 else (y0 - cy)) * t_dy if dy else math.inf
+        cells = [(cx, cy)]
+        for _ in range(abs(ex - cx) + abs(ey - cy)):
+            if t_x < t_y:
+                cx += sx
+                t_x += t_dx
+            else:
+                cy += sy
+                t_y += t_dy
+            cells.append((cx, cy))
+        return cells
+
+    def along(self, p0, p1):
+        length2 = (p1[0] - p0[0]) ** 2 + (p1[1] - p0[1]) ** 2
+        if length2 == 0:
+            return [(0.0, i) for i in self.at(p0)]
+        seen = set()
+        hits = []
+        for key in self._cells_on_segment(p0, p1):
+            for i in self._cells.get(key, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                clipped = self.rects[i].clipline(p0, p1)
+                if clipped:
+                    (qx, qy), _ = clipped
+                    t = ((qx - p0[0]) * (p1[0] - p0[0]) + (qy - p0[1]) * (p1[1] - p0[1])) / length2
+                    hits.append((min(max(t, 0.0), 1.0), i))
+        hits.sort()
+        return hits
@@ -0,0 +1,250 @@
+"""
+Nguồn frame cho HandController: webcam độ trễ thấp, file video, chuỗi ảnh.
+
+Mọi nguồn có cùng giao diện kiểu cv2.VideoCapture (read / isOpened / get /
+set / release) và thêm capture_time: time.monotonic() lúc frame vừa đọc được
+chụp (với webcam là lúc grab() xong, trước khi giải mã ảnh).
+
+  - CameraSource(index): thương lượng cấu hình ít trễ (FOURCC MJPG, FPS,
+    CAP_PROP_BUFFERSIZE) và bỏ các frame cũ còn nằm trong buffer của driver
+    bằng grab() trước khi retrieve() frame mới nhất
+  - ImageSequence(path): thư mục ảnh hoặc mẫu glob ("frames/*.png") đọc theo nhịp fps
+  - open_source(src, ...): chọn nguồn theo src (số camera, file video, thư mục / mẫu ảnh)
+
+Cấu hình nhận được và độ lệch khoảng cách giữa các frame (jitter) được in ra
+lúc khởi động; xem thêm config và interval_stats().
+"""
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _fourcc_name(value):
+    value = int(value)
+    name = "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+    return name if name.isprintable() and name.strip() else str(value)
+
+
+class CameraSource:
+    """
+    Webcam với cấu hình ít trễ.
+
+    Driver thường giữ vài frame trong buffer; nếu nhận diện chậm hơn camera thì
+    read() trả về frame đã cũ vài chục ms. Khi đã lâu hơn ~1.5 khoảng frame kể
+    từ lần đọc trước, read() grab() liên tục (tối đa max_drain frame) cho tới khi
+    một lần grab() phải chờ frame mới, rồi mới retrieve() (giải mã) frame đó.
+
+      - config: dict cấu hình thực nhận (size, fourcc, fps, buffer_size, backend)
+      - dropped: số frame cũ đã bỏ
+      - interval_stats(): khoảng cách giữa các frame (ms): mean, std, p50, p95, max
+      - describe(): một dòng mô tả cấu hình + jitter
+    """
+
+    def __init__(self, index=0, width=640, height=480, fps=30, fourcc="MJPG", buffer_size=1,
+                 drain=True, max_drain=4, report_after=90, window=240):
+        self.cap = cv2.VideoCapture(index)
+        self.index = index
+        self.drain = drain
+        self.max_drain = max_drain
+        self.report_after = report_after
+        self.capture_time = 0.0
+        self.dropped = 0
+        self._intervals = np.zeros(window, dtype=np.float64)
+        self._n = 0
+        self._last_grab = None
+        self._reported = False
+        self.config = {}
+        if self.cap.isOpened():
+            self._negotiate(width, height, fps, fourcc, buffer_size)
+            print(f"Camera {index}: {self._describe_config()}")
+
+    def _negotiate(self, width, height, fps, fourcc, buffer_size):
+        cap = self.cap
+        # thứ tự quan trọng với nhiều driver: FOURCC trước, rồi kích thước, rồi FPS
+        if fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width and height:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        if buffer_size:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        got_fps = cap.get(cv2.CAP_PROP_FPS)
+        self.config = {
+            "size": (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+            "fourcc": _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+            "fps": got_fps if got_fps and got_fps < 1000 else float(fps or 30),
+            "buffer_size": int(cap.get(cv2.CAP_PROP_BUFFERSIZE) or 0) or None,
+            "backend": cap.getBackendName() if hasattr(cap, "getBackendName") else "?",
+        }
+
+    @property
+    def frame_interval(self):
+        return 1.0 / (self.config.get("fps") or 30.0)
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value) if self.cap is not None else False
+
+    def get(self, prop):
+        return self.cap.get(prop) if self.cap is not None else 0.0
+
+    def _grab(self):
+        t0 = time.monotonic()
+        ok = self.cap.grab()
+        t1 = time.monotonic()
+        return ok, t1 - t0, t1
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        prev = self._last_grab
+        ok, waited, t = self._grab()
+        if not ok:
+            return False, None
+        if self.drain and prev is not None and t - prev > 1.5 * self.frame_interval:
+            # grab() trả về ngay = frame đã nằm sẵn trong buffer (cũ): bỏ, lấy tiếp
+            fast = 0.25 * self.frame_interval
+            for _ in range(self.max_drain):
+                if waited >= fast:
+                    break
+                ok, waited, t = self._grab()
+                if not ok:
+                    return False, None
+                self.dropped += 1
+        ok, frame = self.cap.retrieve()
+        if not ok or frame is None:
+            return False, None
+        if prev is not None:
+            self._intervals[self._n % len(self._intervals)] = t - prev
+            self._n += 1
+        self._last_grab = self.capture_time = t
+        if not self._reported and self._n >= self.report_after:
+            self._reported = True
+            print(f"Camera {self.index}: {self.describe()}")
+        return True, frame
+
+    def interval_stats(self):
+        n = min(self._n, len(self._intervals))
+        if not n:
+            return None
+        ms = self._intervals[:n] * 1000.0
+        p50, p95 = np.percentile(ms, [50, 95])
+        return {"frames": self._n, "mean": float(ms.mean()), "std": float(ms.std()),
+                "p50": float(p50), "p95": float(p95), "max": float(ms.max()), "dropped": self.dropped}
+
+    def _describe_config(self):
+        c = self.config
+        buf = c["buffer_size"] or "driver default"
+        return (f"{c['size'][0]}x{c['size'][1]} {c['fourcc']} {c['fps']:.0f} fps, "
+                f"buffer {buf}, drain {'on' if self.drain else 'off'} ({c['backend']})")
+
+    def describe(self):
+        s = self.interval_stats()
+        if s is None:
+            return self._describe_config()
+        return (f"{self._describe_config()} | interval {s['mean']:.1f} ± {s['std']:.1f} ms "
+                f"(p95 {s['p95']:.1f}, max {s['max']:.1f}), {s['dropped']} stale frames dropped")
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageSequence:
+    """
+    Thay cho cv2.VideoCapture: đọc lần lượt các file ảnh (sắp theo tên).
+
+    path là thư mục (mọi ảnh IMAGE_EXTENSIONS bên trong) hoặc mẫu glob.
+    realtime / loop / frame_time() giống replay.ReplayCapture.
+    """
+
+    def __init__(self, path, fps=30.0, realtime=True, loop=False):
+        if os.path.isdir(path):
+            files = [os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            files = glob.glob(path)
+        self.files = sorted(files)
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.capture_time = 0.0
+        self._t0 = None
+        self._frames = 0
+        self._pos = 0
+        self._size = None
+        if self.files:
+            first = cv2.imread(self.files[0])
+            if first is not None:
+                self._size = (first.shape[1], first.shape[0])
+
+    def isOpened(self):
+        return self._size is not None
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.files)
+        if prop == cv2.CAP_PROP_FRAME_WIDTH and self._size:
+            return self._size[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT and self._size:
+            return self._size[1]
+        return 0.0
+
+    def read(self):
+        if not self.files:
+            return False, None
+        if self._pos >= len(self.files):
+            if not self.loop:
+                return False, None
+            self._pos = 0
+        frame = cv2.imread(self.files[self._pos])
+        self._pos += 1
+        if frame is None:
+            return False, None
+        if self.realtime:
+            now = time.monotonic()
+            if self._t0 is None:
+                self._t0 = now
+            due = self._t0 + self._frames / self.fps
+            if due > now:
+                time.sleep(due - now)
+        self._frames += 1
+        self.capture_time = time.monotonic()
+        return True, frame
+
+    def frame_time(self):
+        return max(self._frames - 1, 0) / self.fps
+
+    def release(self):
+        self.files = []
+        self._size = None
+
+
+def open_source(src=0, width=640, height=480, fps=30, realtime=True, **camera_kwargs):
+    """
+    Open a frame source: camera index (int or digit string) -> CameraSource,
+    directory / glob pattern -> ImageSequence, anything else -> replay.ReplayCapture (video file).
+    Capture-like objects are returned unchanged.
+    """
+    if hasattr(src, "read"):
+        return src
+    if isinstance(src, int) or (isinstance(src, str) and src.isdigit()):
+        return CameraSource(int(src), width, height, fps, **camera_kwargs)
+    if os.path.isdir(src) or glob.has_magic(src):
+        return ImageSequence(src, fps=fps, realtime=realtime)
+    from replay import ReplayCapture
+    return ReplayCapture(src, realtime=realtime)
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al.) cho số thực hoặc mảng NumPy (lọc từng phần tử).
+
+    Lọc mạnh khi tay đứng yên (giảm rung), lọc nhẹ khi tay di chuyển nhanh (giảm
+    trễ). Đạo hàm đã lọc được giữ lại để predict() ngoại suy vị trí giữa hai
+    lần nhận diện theo mô hình vận tốc không đổi.
+
+      - __call__(x, t): thêm mẫu x tại thời điểm t (giây), trả về giá trị đã lọc
+      - predict(t): ước lượng giá trị tại t (None nếu chưa có mẫu nào)
+      - velocity: đạo hàm đã lọc (đơn vị / giây)
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, max_horizon=0.15):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_horizon = max_horizon   # không ngoại suy xa hơn (giây)
+        self.reset()
+
+    def reset(self):
+        self.x_hat = None
+        self.dx_hat = None
+        self.t_prev = None
+
+    @property
+    def empty(self):
+        return self.x_hat is None
+
+    @property
+    def velocity(self):
+        return self.dx_hat
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2.0 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=np.float32)
+        if self.x_hat is None:
+            self.x_hat = x.copy()
+            self.dx_hat = np.zeros_like(x)
+            self.t_prev = t
+            return self.x_hat
+        dt = t - self.t_prev
+        if dt <= 0:
+            return self.x_hat
+        a_d = self._alpha(self.d_cutoff, dt)
+        self.dx_hat = self.dx_hat + a_d * ((x - self.x_hat) / dt - self.dx_hat)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.dx_hat)
+        a = 1.0 / (1.0 + (1.0 / (2.0 * np.pi * cutoff)) / dt)
+        self.x_hat = self.x_hat + a * (x - self.x_hat)
+        self.t_prev = t
+        return self.x_hat
+
+    def predict(self, t):
+        if self.x_hat is None:
+            return None
+        dt = min(max(t - self.t_prev, 0.0), self.max_horizon)
+        return self.x_hat + self.dx_hat * dt
@@ -1,7 +1,88 @@
-import time
+import itertools
 import math
+import time
 import cv2
-import mediapipe as mp
+import numpy as np
+from camera import open_source
+from filters import OneEuroFilter
+from inference_server import InferenceSkipped
+from latency import NULL_PROFILER
+
+FINGERS = ("thumb", "index", "middle", "ring", "pinky")
+JOINTS = ("mcp", "pip", "dip")   # ngón cái: CMC, MCP, IP
+
+# chuỗi landmark của từng ngón, bắt đầu từ WRIST (index theo mp.solutions.hands.HandLandmark)
+_FINGER_CHAINS = np.array([
+    [0, 1, 2, 3, 4],       # thumb: WRIST, CMC, MCP, IP, TIP
+    [0, 5, 6, 7, 8],       # index
+    [0, 9, 10, 11, 12],    # middle
+    [0, 13, 14, 15, 16],   # ring
+    [0, 17, 18, 19, 20],   # pinky
+])
+# khớp j của ngón f: góc tại _JOINT_MID[f, j] giữa 2 vector tới _JOINT_PREV và _JOINT_NEXT
+_JOINT_PREV = _FINGER_CHAINS[:, 0:3]
+_JOINT_MID = _FINGER_CHAINS[:, 1:4]
+_JOINT_NEXT = _FINGER_CHAINS[:, 2:5]
+# khớp dùng cho last_angles (như trước): IP của ngón cái, PIP của các ngón còn lại
+_MAIN_JOINT = np.array([2, 1, 1, 1, 1])
+_MAIN_JOINT_IDX = _JOINT_MID[np.arange(5), _MAIN_JOINT]
+_TIP_IDX = np.array([8, 12, 16, 20])
+_PIP_IDX = np.array([6, 10, 14, 18])
+# = mp.solutions.hands.HAND_CONNECTIONS, chép sẵn để không phải import mediapipe khi chỉ cần vẽ
+_HAND_CONNECTIONS = ((0, 1), (1, 2), (2, 3), (3, 4), (0, 5), (5, 6), (6, 7), (7, 8),
+                     (5, 9), (9, 10), (10, 11), (11, 12), (9, 13), (13, 14), (14, 15), (15, 16),
+                     (13, 17), (0, 17), (17, 18), (18, 19), (19, 20))
+
+
+def landmarks_to_array(hand_landmarks):
+    """Convert MediaPipe hand landmarks to a (21,3) float32 array of normalized x,y,z."""
+    if isinstance(hand_landmarks, np.ndarray):       # kết quả từ inference_server đã là mảng
+        return hand_landmarks.astype(np.float32, copy=True)
+    return np.array([(p.x, p.y, p.z) for p in hand_landmarks.landmark], dtype=np.float32)
+
+
+def joint_angles(points, scale=(1.0, 1.0, 1.0)):
+    """
+    Angles (degrees) of every joint in one batched pass.
+    points: (..., 21, 3) landmarks; scale: per-axis factor (vd. (w, h, w) để ra pixel).
+    Returns (..., 5, 3): finger x (MCP, PIP, DIP). 180 = duỗi thẳng.
+    """
+    p = points * np.asarray(scale, dtype=np.float32)
+    mid = p[..., _JOINT_MID, :]
+    v1 = p[..., _JOINT_PREV, :] - mid
+    v2 = p[..., _JOINT_NEXT, :] - mid
+    dot = np.einsum("...i,...i->...", v1, v2)
+    mag = np.linalg.norm(v1, axis=-1) * np.linalg.norm(v2, axis=-1)
+    # vector suy biến (độ dài 0) -> góc 0 như trước
+    cosang = np.divide(dot, mag, out=np.ones_like(dot), where=mag > 0)
+    return np.degrees(np.arccos(np.clip(cosang, -1.0, 1.0)))
+
+
+def _hand_score(results, i=0):
+    """Handedness score of hand i (độ tin cậy nhận diện), None nếu kết quả không có."""
+    labels = results.multi_handedness
+    if not labels or i >= len(labels):
+        return None
+    return getattr(labels[i].classification[0], "score", None)
+
+
+def draw_hand_landmarks(image, points, thickness=2, radius=2):
+    """Draw a (21,3) normalized landmark array on a BGR image of any size (như mp_draw.draw_landmarks)."""
+    h, w = image.shape[:2]
+    px = (points[:, :2] * (w, h)).astype(np.int32).tolist()
+    for a, b in _HAND_CONNECTIONS:
+        cv2.line(image, tuple(px[a]), tuple(px[b]), (224, 224, 224), thickness)
+    for x, y in px:
+        cv2.circle(image, (x, y), radius, (0, 0, 255), thickness)
+
+
+def draw_angle_labels(image, points, angles, font_scale=0.5, thickness=2):
+    """Write each finger's main angle next to its joint (IP ngón cái, PIP các ngón khác)."""
+    h, w = image.shape[:2]
+    off = int(round(12 * font_scale / 0.5)), int(round(8 * font_scale / 0.5))
+    for (x, y), f in zip(points[_MAIN_JOINT_IDX, :2] * (w, h), FINGERS):
+        cv2.putText(image, f"{int(angles.get(f, 0.0))}", (int(x) - off[0], int(y) - off[1]),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 255, 0), thickness)
 
 
 class HandController:
@@ -9,45 +90,183 @@ class HandController:
     Quản lý camera + MediaPipe hands.
 
     Methods:
-      - start_detection(src=0, width=640, height=480): mở camera
+      - start_detection(src=0, width=640, height=480): mở nguồn frame qua camera.open_source
+        (chỉ số camera, file video, thư mục / mẫu ảnh) hoặc dùng luôn một object kiểu
+        cv2.VideoCapture (vd. replay.ReplayCapture)
       - stop_detection(): giải phóng camera
       - get_hand_position(): trả về (hand_pos, gesture, frame)
          hand_pos: (x,y) pixel của WRIST hoặc None
          gesture: True khi phát hiện nắm tay (fist) theo vị trí hoặc góc, có cooldown
          frame: frame BGR (đã flip) có vẽ landmarks (dùng để hiển thị)
       - last_angles: dict lưu góc từng ngón (deg)
+      - last_landmarks: mảng (21,3) float32 landmarks chuẩn hóa của frame gần nhất
+      - last_joint_angles: mảng (5,3) góc MCP/PIP/DIP mọi ngón (deg)
       - last_clench_speed: tốc độ thay đổi mean-angle (deg/s)
+      - last_frame_time: clock() lúc đọc frame gần nhất (mặc định capture_time của nguồn frame,
+        tức time.monotonic() lúc chụp, hoặc time.monotonic() lúc đọc nếu nguồn không có; phân tích
+        video offline gán clock = thời điểm của frame trong video, vd. ReplayCapture.frame_time)
+      - last_predicted: True nếu kết quả frame gần nhất là dự đoán (không chạy model)
+      - last_velocity: vận tốc cổ tay (px/s) để vẽ con trỏ mượt giữa các frame
+      - profiler: latency.LatencyProfiler đo các stage cap.read, flip, cvtColor,
+        hands.process, angles, gesture (mặc định NULL_PROFILER = không đo)
+      - feed: landmark_feed.FeedWriter, nếu có thì mỗi frame (landmarks, góc, clench speed,
+        thời điểm chụp) được ghi vào ring buffer chia sẻ cho công cụ bên ngoài
+
+    ROI mode (roi=True): khi đang bám được tay, chỉ đưa vùng vuông quanh bàn tay
+    (nới thêm roi_padding mỗi phía, thu nhỏ về tối đa roi_size px) vào MediaPipe
+    rồi đổi landmarks về tọa độ cả frame. Mất dấu -> nhận diện lại trên cả frame.
+
+    Inference thưa: chỉ chạy MediaPipe mỗi `stride` frame (inference_stride cố
+    định, hoặc tự chỉnh theo latency_budget_ms và thời gian inference đo được).
+    Các frame ở giữa dùng landmarks dự đoán từ bộ lọc One-Euro (last_predicted=True),
+    không tính gesture và clench speed trên dữ liệu dự đoán.
+
+    Khởi tạo không nạp MediaPipe: load_model() (import mediapipe + dựng graph)
+    và warmup() tốn vài trăm ms nên được gọi trên thread nền (HandTrackingWorker),
+    get_hand_position() tự gọi load_model() nếu chưa nạp.
+
+    Chất lượng (model_complexity, infer_width) đổi được lúc chạy bằng set_quality();
+    gán quality = quality.AdaptiveQuality(...) để tự chỉnh theo độ trễ đo được.
+    infer_width thu nhỏ ảnh đưa vào model, frame và tọa độ tay giữ nguyên kích thước.
+
+    inference: một inference_server.InferenceClient -> không nạp MediaPipe trong
+    process này, mọi graph chạy trên server dùng chung (client mỏng). Frame bị
+    server bỏ (bận / quá ngân sách) được xử lý như frame xen giữa (dự đoán).
     """
 
-    def __init__(self, max_hands=1, min_detection_confidence=0.6, min_tracking_confidence=0.5):
-        self.mp_hands = mp.solutions.hands
-        self.mp_draw = mp.solutions.drawing_utils
-        self.hands = self.mp_hands.Hands(
+    def __init__(self, max_hands=1, min_detection_confidence=0.6, min_tracking_confidence=0.5, use_depth=True,
+                 roi=False, roi_padding=0.35, roi_size=256,
+                 inference_stride=1, latency_budget_ms=None, max_stride=4, inference=None, model_complexity=1):
+        self.mp_hands = None             # mp.solutions.hands, nạp trong load_model()
+        self.inference = inference       # InferenceClient, None = chạy MediaPipe trong process
+        self._hands_kwargs = dict(
             static_image_mode=False,
             max_num_hands=max_hands,
             min_detection_confidence=min_detection_confidence,
             min_tracking_confidence=min_tracking_confidence,
+            model_complexity=model_complexity,
         )
+        self.hands = None
+        self.infer_width = None          # None = đưa cả frame vào model
+        self._infer_buf = None           # buffer ảnh thu nhỏ, dùng lại mỗi frame
+        self.quality = None              # AdaptiveQuality, gọi observe() sau mỗi lần inference
+        self.feed = None                 # landmark_feed.FeedWriter, publish() mỗi frame
+        self.last_confidence = None      # handedness score của lần nhận diện gần nhất
+
+        # --- ROI inference ---
+        self.roi = roi
+        self.roi_padding = roi_padding
+        self.roi_size = roi_size         # cạnh lớn nhất của ảnh crop đưa vào model (None = không thu nhỏ)
+        self.roi_hands = None            # graph riêng cho ảnh crop (tạo khi cần)
+        self.roi_box = None              # (x0, y0, x1, y1) pixel, None = chưa bám được tay
+        self.last_used_roi = False
+
+        # --- inference thưa + dự đoán ---
+        self.stride = max(1, inference_stride)
+        self.latency_budget_ms = latency_budget_ms   # None = giữ stride cố định
+        self.max_stride = max_stride
+        self.landmark_filter = OneEuroFilter(min_cutoff=1.5, beta=0.5)
+        self.last_inference_ms = 0.0
+        self.inferences = 0              # số lần model đã chạy (đếm cho metrics)
+        self.inference_ms_avg = None     # EMA thời gian inference
+        self.last_predicted = False
+        self.last_velocity = (0.0, 0.0)  # vận tốc cổ tay (px/s)
+        self._frames_since_inference = 0
 
         self.cap = None
         self.last_angles = {}            # {'thumb','index','middle','ring','pinky'} in degrees
+        self.last_landmarks = None       # (21,3) float32
+        self.last_joint_angles = None    # (5,3) float32, deg
+        self.use_depth = use_depth       # tính góc 3D (dùng cả z của MediaPipe)
         self.prev_mean_angle = None      # previous frame mean of finger angles
         self.prev_mean_time = None
         self.last_clench_speed = 0.0     # deg / s
         self.gesture_cooldown = 0.3      # seconds between gestures
-        self.last_gesture_time = 0.0
+        self.last_gesture_time = float("-inf")   # cho phép nắm tay ngay từ frame đầu (clock có thể bắt đầu từ 0)
+        self.last_frame_time = 0.0       # monotonic timestamp of last captured frame
+        self.draw_overlays = True        # False: không vẽ lên frame gốc (preview tự vẽ ở kích thước nhỏ)
+        self.profiler = NULL_PROFILER
+        self.clock = self._capture_clock # thời điểm gắn cho frame vừa đọc
+
+    def load_model(self):
+        """Import MediaPipe and build the hand graph(s). Safe to call multiple times."""
+        if self.hands is not None:
+            return
+        if self.inference is None:
+            import mediapipe as mp
+            self.mp_hands = mp.solutions.hands
+        if self.roi:
+            self.roi_hands = self._new_graph("roi")
+        self.hands = self._new_graph("full")
+
+    def set_quality(self, model_complexity=None, infer_width=None):
+        """Switch model complexity / inference width at runtime (from the tracking thread)."""
+        self.infer_width = infer_width
+        if model_complexity is None or model_complexity == self._hands_kwargs["model_complexity"]:
+            return
+        self._hands_kwargs["model_complexity"] = model_complexity
+        if self.hands is None:
+            return                       # graph sẽ được dựng với cấu hình mới
+        old = (self.hands, self.roi_hands)
+        self.hands = self.roi_hands = None
+        self.load_model()
+        if self.inference is not None:
+            return                       # cùng kênh trên server, đã gửi cấu hình mới (worker dựng lại graph)
+        for graph in old:
+            if graph is not None:
+                graph.close()
+
+    def _infer_image(self, frame):
+        """Frame scaled down to infer_width (if set) for the full-frame model."""
+        h, w = frame.shape[:2]
+        if not self.infer_width or w <= self.infer_width:
+            return frame
+        size = (self.infer_width, max(1, round(h * self.infer_width / w)))
+        buf = self._infer_buf
+        if buf is None or buf.shape[1] != size[0] or buf.shape[0] != size[1]:
+            buf = self._infer_buf = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        return cv2.resize(frame, size, dst=buf, interpolation=cv2.INTER_AREA)
+
+    def _new_graph(self, channel):
+        """A hand graph: local MediaPipe, or a channel on the shared inference server."""
+        if self.inference is not None:
+            return self.inference.hands(channel, **self._hands_kwargs)
+        return self.mp_hands.Hands(**self._hands_kwargs)
+
+    def warmup(self, frames=3, size=(640, 480)):
+        """Run a few inferences on blank images so the first real frame does not pay the graph start-up cost."""
+        self.load_model()
+        w, h = size
+        blank = np.zeros((h, w, 3), dtype=np.uint8)
+        graphs = [(self.hands, blank)]
+        if self.roi_hands is not None:
+            side = min(self.roi_size or h, h)
+            graphs.append((self.roi_hands, blank[:side, :side]))
+        for _ in range(frames):
+            for graph, img in graphs:
+                try:
+                    graph.process(img)
+                except InferenceSkipped:
+                    pass
 
     def start_detection(self, src=0, width=640, height=480):
-        """Open camera (index or path). Safe to call multiple times."""
+        """Open camera (index, path or capture-like object). Safe to call multiple times."""
         if self.cap is not None and self.cap.isOpened():
             return
-        self.cap = cv2.VideoCapture(src)
+        if not hasattr(src, "read"):
+            self.cap = open_source(src, width, height)
+            return
+        self.cap = src
         try:
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         except Exception:
             pass
 
+    def _capture_clock(self):
+        t = getattr(self.cap, "capture_time", None)
+        return t if t else time.monotonic()
+
     def stop_detection(self):
         """Release camera and close OpenCV windows."""
         try:
@@ -57,82 +276,43 @@ class HandController:
         finally:
             cv2.destroyAllWindows()
 
-    def _angle_between_vectors(self, v1, v2):
-        """Return angle in degrees between 2D vectors v1 and v2."""
-        dot = v1[0] * v2[0] + v1[1] * v2[1]
-        mag1 = math.hypot(v1[0], v1[1])
-        mag2 = math.hypot(v2[0], v2[1])
-        if mag1 == 0 or mag2 == 0:
-            return 0.0
-        cosang = max(-1.0, min(1.0, dot / (mag1 * mag2)))
-        return math.degrees(math.acos(cosang))
-
-    def compute_finger_angles(self, hand_landmarks, image=None, draw=True):
+    def compute_finger_angles(self, hand_landmarks, image=None, draw=True, update_speed=True, t=None):
         """
-        Compute angles (degrees) for each finger and update last_angles.
-        - thumb: angle at THUMB_IP between vectors (THUMB_MCP->THUMB_IP) and (THUMB_TIP->THUMB_IP)
-        - index/middle/ring/pinky: angle at PIP between vectors (MCP->PIP) and (DIP->PIP)
-        Also compute mean of index..pinky and update last_clench_speed (deg/s).
-        If image provided and draw=True, angle texts are drawn on image.
+        Compute every joint angle (degrees) in one NumPy pass and update
+        last_landmarks / last_joint_angles / last_angles.
+        - hand_landmarks: MediaPipe landmarks hoặc mảng (21,3) đã chuyển sẵn
+        - last_angles giữ góc chính như trước: IP của ngón cái, PIP của các ngón khác
+        Also compute mean of index..pinky and update last_clench_speed (deg/s)
+        unless update_speed is False. If image provided and draw=True, angle texts are drawn on image.
+        - t: thời điểm chụp frame (time.monotonic()); mặc định là lúc gọi hàm
         """
-        lm = hand_landmarks.landmark
-        h, w = (None, None)
+        if isinstance(hand_landmarks, np.ndarray):
+            pts = hand_landmarks
+        else:
+            pts = landmarks_to_array(hand_landmarks)
+
         if image is not None:
             h, w = image.shape[:2]
+            scale = (w, h, w if self.use_depth else 0.0)
+        else:
+            scale = (1.0, 1.0, 1.0 if self.use_depth else 0.0)
 
-        def to_px(pt):
-            return (int(pt.x * w), int(pt.y * h)) if (w and h) else (pt.x, pt.y)
-
-        angles = {}
-
-        # Thumb: use MCP, IP, TIP -> angle at IP
-        try:
-            thumb_mcp = to_px(lm[self.mp_hands.HandLandmark.THUMB_MCP])
-            thumb_ip = to_px(lm[self.mp_hands.HandLandmark.THUMB_IP])
-            thumb_tip = to_px(lm[self.mp_hands.HandLandmark.THUMB_TIP])
-            v1 = (thumb_mcp[0] - thumb_ip[0], thumb_mcp[1] - thumb_ip[1])
-            v2 = (thumb_tip[0] - thumb_ip[0], thumb_tip[1] - thumb_ip[1])
-            angles['thumb'] = self._angle_between_vectors(v1, v2)
-            if draw and image is not None:
-                cv2.putText(image, f"{int(angles['thumb'])}", (thumb_ip[0] - 12, thumb_ip[1] - 8),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        except Exception:
-            angles['thumb'] = 0.0
+        joints = joint_angles(pts, scale)
+        main = joints[np.arange(5), _MAIN_JOINT]
+        angles = dict(zip(FINGERS, main.tolist()))
 
-        # Other fingers: angle at PIP using MCP, PIP, DIP
-        finger_defs = [
-            ('index', self.mp_hands.HandLandmark.INDEX_FINGER_MCP, self.mp_hands.HandLandmark.INDEX_FINGER_PIP, self.mp_hands.HandLandmark.INDEX_FINGER_DIP),
-            ('middle', self.mp_hands.HandLandmark.MIDDLE_FINGER_MCP, self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP, self.mp_hands.HandLandmark.MIDDLE_FINGER_DIP),
-            ('ring', self.mp_hands.HandLandmark.RING_FINGER_MCP, self.mp_hands.HandLandmark.RING_FINGER_PIP, self.mp_hands.HandLandmark.RING_FINGER_DIP),
-            ('pinky', self.mp_hands.HandLandmark.PINKY_MCP, self.mp_hands.HandLandmark.PINKY_PIP, self.mp_hands.HandLandmark.PINKY_DIP),
-        ]
+        if draw and image is not None:
+            draw_angle_labels(image, pts, angles)
 
-        for name, mcp_i, pip_i, dip_i in finger_defs:
-            try:
-                mcp = to_px(lm[mcp_i])
-                pip = to_px(lm[pip_i])
-                dip = to_px(lm[dip_i])
-                v1 = (mcp[0] - pip[0], mcp[1] - pip[1])
-                v2 = (dip[0] - pip[0], dip[1] - pip[1])
-                ang = self._angle_between_vectors(v1, v2)
-                angles[name] = ang
-                if draw and image is not None:
-                    cv2.putText(image, f"{int(ang)}", (pip[0] - 12, pip[1] - 8),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            except Exception:
-                angles[name] = 0.0
-
-        # update last_angles
+        self.last_landmarks = pts
+        self.last_joint_angles = joints
         self.last_angles = angles
+        if not update_speed:
+            return angles
 
-        # compute clench speed: change of mean(index..pinky) / dt
-        now = time.time()
-        mean_f = 0.0
-        cnt = 0
-        for k in ('index', 'middle', 'ring', 'pinky'):
-            mean_f += angles.get(k, 0.0)
-            cnt += 1
-        mean_f = (mean_f / cnt) if cnt else 0.0
+        # compute clench speed: change of mean(index..pinky) / dt, theo thời điểm chụp frame
+        now = time.monotonic() if t is None else t
+        mean_f = float(main[1:].mean())
 
         if self.prev_mean_angle is not None and self.prev_mean_time is not None:
             dt = now - self.prev_mean_time
@@ -149,6 +329,82 @@ class HandController:
 
         return angles
 
+    def _update_roi(self, pts, w, h):
+        """Square box around the landmarks, padded and clamped to the frame."""
+        x_min, y_min = pts[:, 0].min() * w, pts[:, 1].min() * h
+        x_max, y_max = pts[:, 0].max() * w, pts[:, 1].max() * h
+        side = max(x_max - x_min, y_max - y_min) * (1.0 + 2.0 * self.roi_padding)
+        side = int(min(max(side, 32), w, h))
+        cx, cy = (x_min + x_max) / 2.0, (y_min + y_max) / 2.0
+        x0 = int(min(max(cx - side / 2.0, 0), w - side))
+        y0 = int(min(max(cy - side / 2.0, 0), h - side))
+        self.roi_box = (x0, y0, x0 + side, y0 + side)
+
+    def _detect_roi(self, frame):
+        """Run the model on the tracked ROI only. Returns full-frame normalized (21,3) or None."""
+        h, w = frame.shape[:2]
+        prof = self.profiler
+        t = prof.now()
+        x0, y0, x1, y1 = self.roi_box
+        crop = frame[y0:y1, x0:x1]
+        cw, ch = x1 - x0, y1 - y0
+        if self.roi_size and max(cw, ch) > self.roi_size:
+            f = self.roi_size / float(max(cw, ch))
+            crop = cv2.resize(crop, (max(1, int(cw * f)), max(1, int(ch * f))), interpolation=cv2.INTER_AREA)
+        if self.roi_hands is None:
+            self.roi_hands = self._new_graph("roi")
+        rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        t = prof.since("cvtColor", t)
+        results = self.roi_hands.process(rgb)
+        prof.since("hands.process", t)
+        if not results.multi_hand_landmarks:
+            return None
+        self.last_confidence = _hand_score(results)
+        # tọa độ trong crop -> tọa độ chuẩn hóa của cả frame (z theo cùng tỉ lệ với x)
+        pts = landmarks_to_array(results.multi_hand_landmarks[0])
+        pts[:, 0] = (pts[:, 0] * cw + x0) / w
+        pts[:, 1] = (pts[:, 1] * ch + y0) / h
+        pts[:, 2] *= cw / float(w)
+        return pts
+
+    def _detect(self, frame):
+        """Detect the first hand. Returns normalized (21,3) landmarks of the full frame or None."""
+        h, w = frame.shape[:2]
+        pts = None
+        self.last_used_roi = False
+        if self.roi and self.roi_box is not None:
+            pts = self._detect_roi(frame)
+            self.last_used_roi = pts is not None
+        if pts is None:
+            prof = self.profiler
+            t = prof.now()
+            rgb = cv2.cvtColor(self._infer_image(frame), cv2.COLOR_BGR2RGB)
+            t = prof.since("cvtColor", t)
+            results = self.hands.process(rgb)
+            prof.since("hands.process", t)
+            if results.multi_hand_landmarks:
+                # use first detected hand
+                pts = landmarks_to_array(results.multi_hand_landmarks[0])
+                self.last_confidence = _hand_score(results)
+        if self.roi:
+            if pts is not None:
+                self._update_roi(pts, w, h)
+            else:
+                self.roi_box = None
+        return pts
+
+    def _adapt_stride(self, infer_ms):
+        """Run MediaPipe every N frames so that its average cost fits the latency budget."""
+        avg = self.inference_ms_avg
+        self.inference_ms_avg = infer_ms if avg is None else avg + 0.1 * (infer_ms - avg)
+        if self.latency_budget_ms:
+            wanted = math.ceil(self.inference_ms_avg / self.latency_budget_ms)
+            self.stride = int(min(max(wanted, 1), self.max_stride))
+
+    def request_inference(self):
+        """Run the model on the next frame regardless of stride (vd. kiểm tra có tay khi đang nghỉ)."""
+        self._frames_since_inference = max(self._frames_since_inference, self.stride)
+
     def get_hand_position(self):
         """
         Read camera frame, detect hand, compute wrist position, angles and gesture.
@@ -156,57 +412,295 @@ class HandController:
         """
         if self.cap is None:
             return None, False, None
+        if self.hands is None:
+            self.load_model()
 
+        prof = self.profiler
+        t_stage = prof.now()
         success, frame = self.cap.read()
         if not success or frame is None:
             return None, False, None
+        self.last_frame_time = self.clock()
+        t_stage = prof.since("cap.read", t_stage)
 
         frame = cv2.flip(frame, 1)  # mirror
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb)
+        prof.since("flip", t_stage)
+        h, w = frame.shape[:2]
+        t = self.last_frame_time
+
+        # một mảng (21,3) dùng chung cho vị trí cổ tay, góc khớp và kiểm tra nắm tay
+        self._frames_since_inference += 1
+        run_model = self._frames_since_inference >= self.stride
+        if run_model:
+            self._frames_since_inference = 0
+            t0 = time.perf_counter()
+            try:
+                pts = self._detect(frame)
+            except InferenceSkipped:
+                run_model = False        # server bỏ frame này: dự đoán như frame xen giữa
+            else:
+                self.last_inference_ms = (time.perf_counter() - t0) * 1000.0
+                self.inferences += 1
+                self._adapt_stride(self.last_inference_ms)
+                if self.quality is not None:
+                    self.quality.observe(self.last_inference_ms, self.last_confidence if pts is not None else None, t)
+                self.last_predicted = False
+                if pts is not None:
+                    self.landmark_filter(pts, t)
+                else:
+                    self.landmark_filter.reset()
+        if not run_model:
+            # frame xen giữa: ngoại suy từ lần nhận diện trước
+            pts = self.landmark_filter.predict(t)
+            self.last_predicted = pts is not None
 
         hand_pos = None
         gesture = False
 
-        if results.multi_hand_landmarks:
-            # use first detected hand
-            hand_landmarks = results.multi_hand_landmarks[0]
-            self.mp_draw.draw_landmarks(frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS)
+        if pts is not None:
+            v = self.landmark_filter.velocity
+            self.last_velocity = (float(v[0, 0]) * w, float(v[0, 1]) * h)
+        else:
+            self.last_velocity = (0.0, 0.0)
+
+        t_stage = prof.now()
+        if pts is not None and self.last_predicted:
+            hand_pos = (int(pts[0, 0] * w), int(pts[0, 1] * h))
+            self.compute_finger_angles(pts, image=frame, draw=False, update_speed=False)
+            prof.since("angles", t_stage)
+
+        elif pts is not None:
+            if self.draw_overlays:
+                draw_hand_landmarks(frame, pts)
 
             # wrist position in pixels
-            try:
-                wpt = hand_landmarks.landmark[self.mp_hands.HandLandmark.WRIST]
-                hand_pos = (int(wpt.x * frame.shape[1]), int(wpt.y * frame.shape[0]))
-            except Exception:
-                hand_pos = None
+            hand_pos = (int(pts[0, 0] * w), int(pts[0, 1] * h))
 
             # angles (and draw)
-            self.compute_finger_angles(hand_landmarks, image=frame, draw=True)
+            self.compute_finger_angles(pts, image=frame, draw=self.draw_overlays, t=t)
+            t_stage = prof.since("angles", t_stage)
 
             # detect fist by comparing tip.y and pip.y for 4 fingers
-            folded = 0
-            try:
-                tips = [self.mp_hands.HandLandmark.INDEX_FINGER_TIP,
-                        self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP,
-                        self.mp_hands.HandLandmark.RING_FINGER_TIP,
-                        self.mp_hands.HandLandmark.PINKY_TIP]
-                pips = [self.mp_hands.HandLandmark.INDEX_FINGER_PIP,
-                        self.mp_hands.HandLandmark.MIDDLE_FINGER_PIP,
-                        self.mp_hands.HandLandmark.RING_FINGER_PIP,
-                        self.mp_hands.HandLandmark.PINKY_PIP]
-                for tip, pip in zip(tips, pips):
-                    if hand_landmarks.landmark[tip].y > hand_landmarks.landmark[pip].y:
-                        folded += 1
-            except Exception:
-                folded = 0
+            folded = int(np.count_nonzero(pts[_TIP_IDX, 1] > pts[_PIP_IDX, 1]))
 
             # optionally also use angle threshold
-            ang_fold_count = sum(1 for k in ('index', 'middle', 'ring', 'pinky') if self.last_angles.get(k, 0.0) > 60)
+            ang_fold_count = int(np.count_nonzero(self.last_joint_angles[1:, _MAIN_JOINT[1]] > 60))
 
-            now = time.time()
             folded_ok = (folded >= 3) or (ang_fold_count >= 3)
-            if folded_ok and (now - self.last_gesture_time) > self.gesture_cooldown:
+            if folded_ok and (t - self.last_gesture_time) > self.gesture_cooldown:
                 gesture = True
-                self.last_gesture_time = now
+                self.last_gesture_time = t
+            prof.since("gesture", t_stage)
 
+        if self.feed is not None:
+            found = hand_pos is not None
+            self.feed.publish(t, 0 if found else -1, hand_pos, self.last_angles if found else None,
+                              self.last_clench_speed if found and not self.last_predicted else None,
+                              pts, self.last_predicted, gesture)
         return hand_pos, gesture, frame
+
+
+class HandTrack:
+    """
+    Một bàn tay được bám qua các frame = một người chơi (chế độ nhiều tay).
+
+    player_id cố định cho tới hết phiên; vị trí cổ tay và handedness cuối cùng
+    được giữ cả khi mất dấu để tay xuất hiện lại được gán về đúng người chơi.
+    Các thuộc tính hand_pos / gesture / angles / clench_speed / landmarks /
+    predicted / velocity có cùng ý nghĩa như last_* của HandController.
+    """
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.handedness = None           # "Left" / "Right" theo MediaPipe (trên ảnh đã lật)
+        self.wrist = None                # (x, y) chuẩn hóa lần cuối nhìn thấy
+        self.active = False
+        self.filter = OneEuroFilter(min_cutoff=1.5, beta=0.5)
+        self.hand_pos = None
+        self.gesture = False
+        self.angles = {}
+        self.joint_angles = None
+        self.landmarks = None
+        self.clench_speed = 0.0
+        self.predicted = False
+        self.velocity = (0.0, 0.0)
+        self.prev_mean_angle = None
+        self.prev_mean_time = None
+        self.last_gesture_time = float("-inf")
+
+
+class MultiHandController(HandController):
+    """
+    HandController cho nhiều người chơi trên một camera.
+
+      - get_hands(): trả về (tracks, frame); tracks là list HandTrack đang thấy tay,
+        mỗi track ứng với một người chơi (player_id 0..max_hands-1)
+
+    Mỗi lần inference, các tay được gán cho track bằng cách thử mọi cách ghép
+    (max_hands nhỏ nên rẻ) và chọn tổng chi phí nhỏ nhất: khoảng cách cổ tay tới
+    vị trí cuối của track + phạt khi khác handedness hoặc track đang mất dấu.
+    Lần đầu, tay bên trái màn hình là người chơi 0. Góc khớp, nắm tay và clench
+    speed của mọi tay được tính chung một lượt NumPy. ROI tắt (ROI chỉ bám một tay);
+    inference thưa + dự đoán One-Euro vẫn dùng được, riêng cho từng track.
+    """
+
+    def __init__(self, max_hands=2, handedness_penalty=0.25, lost_penalty=0.15, new_track_cost=0.6, **kwargs):
+        kwargs["roi"] = False
+        super().__init__(max_hands=max_hands, **kwargs)
+        self.max_hands = max_hands
+        self.handedness_penalty = handedness_penalty
+        self.lost_penalty = lost_penalty
+        self.new_track_cost = new_track_cost
+        self.tracks = [HandTrack(i) for i in range(max_hands)]
+
+    def _detect_all(self, frame):
+        """All hands in the frame as [(pts (21,3), handedness label)], sorted left to right."""
+        prof = self.profiler
+        t = prof.now()
+        rgb = cv2.cvtColor(self._infer_image(frame), cv2.COLOR_BGR2RGB)
+        t = prof.since("cvtColor", t)
+        results = self.hands.process(rgb)
+        prof.since("hands.process", t)
+        if not results.multi_hand_landmarks:
+            self.last_confidence = None
+            return []
+        scores = [s for s in (_hand_score(results, i) for i in range(len(results.multi_hand_landmarks)))
+                  if s is not None]
+        self.last_confidence = min(scores) if scores else None
+        labels = results.multi_handedness or []
+        dets = []
+        for i, lm in enumerate(results.multi_hand_landmarks):
+            label = labels[i].classification[0].label if i < len(labels) else None
+            dets.append((landmarks_to_array(lm), label))
+        dets.sort(key=lambda d: d[0][0, 0])
+        return dets
+
+    def _match_cost(self, det, track):
+        pts, label = det
+        if track.wrist is None:
+            return self.new_track_cost
+        cost = math.hypot(pts[0, 0] - track.wrist[0], pts[0, 1] - track.wrist[1])
+        if label is not None and track.handedness is not None and label != track.handedness:
+            cost += self.handedness_penalty
+        if not track.active:
+            cost += self.lost_penalty
+        return cost
+
+    def _associate(self, dets):
+        """Return [(det, track)] minimizing the total matching cost."""
+        dets = dets[:len(self.tracks)]
+        best, best_cost = [], math.inf
+        # permutations() theo thứ tự từ điển: khi hòa, tay bên trái nhận player_id nhỏ hơn
+        for perm in itertools.permutations(self.tracks, len(dets)):
+            cost = sum(self._match_cost(d, tr) for d, tr in zip(dets, perm))
+            if cost < best_cost:
+                best, best_cost = list(zip(dets, perm)), cost
+        return best
+
+    def _update_features(self, tracks, pts_list, frame, t, predicted):
+        """Angles (and, for real detections, fist + clench speed) of all hands in one batched pass."""
+        h, w = frame.shape[:2]
+        pts_all = np.stack(pts_list)
+        joints = joint_angles(pts_all, (w, h, w if self.use_depth else 0.0))
+        main = joints[:, np.arange(5), _MAIN_JOINT]
+        folded = np.count_nonzero(pts_all[:, _TIP_IDX, 1] > pts_all[:, _PIP_IDX, 1], axis=1)
+        ang_folded = np.count_nonzero(joints[:, 1:, _MAIN_JOINT[1]] > 60, axis=1)
+        mean_f = main[:, 1:].mean(axis=1)
+
+        for k, tr in enumerate(tracks):
+            pts = pts_all[k]
+            tr.landmarks = pts
+            tr.joint_angles = joints[k]
+            tr.angles = dict(zip(FINGERS, main[k].tolist()))
+            tr.hand_pos = (int(pts[0, 0] * w), int(pts[0, 1] * h))
+            v = tr.filter.velocity
+            tr.velocity = (float(v[0, 0]) * w, float(v[0, 1]) * h)
+            tr.predicted = predicted
+            tr.gesture = False
+            if predicted:
+                continue
+            if self.draw_overlays:
+                draw_hand_landmarks(frame, pts)
+                draw_angle_labels(frame, pts, tr.angles)
+            m = float(mean_f[k])
+            if tr.prev_mean_time is not None and t > tr.prev_mean_time:
+                tr.clench_speed = (m - tr.prev_mean_angle) / (t - tr.prev_mean_time)
+            else:
+                tr.clench_speed = 0.0
+            tr.prev_mean_angle, tr.prev_mean_time = m, t
+            if (folded[k] >= 3 or ang_folded[k] >= 3) and (t - tr.last_gesture_time) > self.gesture_cooldown:
+                tr.gesture = True
+                tr.last_gesture_time = t
+
+    def get_hands(self):
+        """
+        Read one camera frame and update every player's track.
+        Returns (tracks, frame): tracks currently holding a hand, frame BGR (đã flip) or None.
+        """
+        if self.cap is None:
+            return [], None
+        if self.hands is None:
+            self.load_model()
+
+        prof = self.profiler
+        t_stage = prof.now()
+        success, frame = self.cap.read()
+        if not success or frame is None:
+            return [], None
+        self.last_frame_time = t = self.clock()
+        t_stage = prof.since("cap.read", t_stage)
+        frame = cv2.flip(frame, 1)  # mirror
+        prof.since("flip", t_stage)
+
+        self._frames_since_inference += 1
+        tracks, pts_list = [], []
+        dets = None
+        if self._frames_since_inference >= self.stride:
+            self._frames_since_inference = 0
+            t0 = time.perf_counter()
+            try:
+                dets = self._detect_all(frame)
+            except InferenceSkipped:
+                pass                     # server bỏ frame này: dự đoán như frame xen giữa
+        if dets is not None:
+            self.last_inference_ms = (time.perf_counter() - t0) * 1000.0
+            self.inferences += 1
+            self._adapt_stride(self.last_inference_ms)
+            if self.quality is not None:
+                self.quality.observe(self.last_inference_ms, self.last_confidence, t)
+            self.last_predicted = predicted = False
+            matched = set()
+            for (pts, label), tr in self._associate(dets):
+                tr.filter(pts, t)
+                tr.wrist = (float(pts[0, 0]), float(pts[0, 1]))
+                if label is not None:
+                    tr.handedness = label
+                tr.active = True
+                matched.add(tr.player_id)
+                tracks.append(tr)
+                pts_list.append(pts)
+            for tr in self.tracks:
+                if tr.player_id not in matched:
+                    tr.active = False
+                    tr.filter.reset()
+        else:
+            # frame xen giữa: ngoại suy từng tay từ lần nhận diện trước
+            self.last_predicted = predicted = True
+            for tr in self.tracks:
+                pts = tr.filter.predict(t) if tr.active else None
+                if pts is not None:
+                    tracks.append(tr)
+                    pts_list.append(pts)
+
+        if tracks:
+            t_stage = prof.now()
+            self._update_features(tracks, pts_list, frame, t, predicted)
+            prof.since("angles", t_stage)
+        if self.feed is not None:
+            for tr in tracks:
+                self.feed.publish(t, tr.player_id, tr.hand_pos, tr.angles,
+                                  None if tr.predicted else tr.clench_speed, tr.landmarks,
+                                  tr.predicted, tr.gesture)
+            if not tracks:
+                self.feed.publish(t)
+        return tracks, frame
@@ -0,0 +1,279 @@
+import threading
+import time
+
+
+class HandResult:
+    """
+    Kết quả nhận diện của một frame camera (snapshot bất biến).
+
+      - hand_pos: (x,y) pixel của WRIST hoặc None
+      - gesture: True nếu có cú nắm tay chưa được game loop tiêu thụ
+      - frame: frame BGR (đã flip) dùng để hiển thị, hoặc None
+      - angles: dict góc từng ngón (deg) tại thời điểm capture
+      - clench_speed: tốc độ nắm tay (deg/s)
+      - capture_time: time.monotonic() lúc đọc frame
+      - seq: số thứ tự frame, tăng dần
+      - predicted: True nếu landmarks là dự đoán (frame không chạy MediaPipe)
+      - velocity: vận tốc cổ tay (px/s)
+      - landmarks: mảng (21,3) landmarks chuẩn hóa hoặc None
+    """
+
+    __slots__ = ("hand_pos", "gesture", "frame", "angles", "clench_speed", "capture_time", "seq",
+                 "predicted", "velocity", "landmarks")
+
+    def __init__(self, hand_pos, gesture, frame, angles, clench_speed, capture_time, seq,
+                 predicted=False, velocity=(0.0, 0.0), landmarks=None):
+        self.hand_pos = hand_pos
+        self.gesture = gesture
+        self.frame = frame
+        self.angles = angles
+        self.clench_speed = clench_speed
+        self.capture_time = capture_time
+        self.seq = seq
+        self.predicted = predicted
+        self.velocity = velocity
+        self.landmarks = landmarks
+
+    def age(self, now=None):
+        """Seconds elapsed since the frame behind this result was captured."""
+        if now is None:
+            now = time.monotonic()
+        return now - self.capture_time
+
+    def predict_pos(self, now=None, max_horizon=0.1):
+        """Wrist position extrapolated to `now` (constant velocity), for a smooth cursor."""
+        if self.hand_pos is None:
+            return None
+        dt = min(max(self.age(now), 0.0), max_horizon)
+        return (int(self.hand_pos[0] + self.velocity[0] * dt),
+                int(self.hand_pos[1] + self.velocity[1] * dt))
+
+
+EMPTY_RESULT = HandResult(None, False, None, {}, 0.0, 0.0, 0)
+
+
+class HandTrackingWorker:
+    """
+    Chạy HandController (cap.read + hands.process) trên thread nền.
+
+    Chỉ giữ kết quả mới nhất (latest-result-wins): không có hàng đợi nên game
+    loop luôn đọc landmarks mới nhất và không bao giờ bị chặn bởi camera hay
+    MediaPipe. Cú nắm tay được giữ lại cho tới khi poll() đọc, để không bị mất
+    khi có nhiều frame được xử lý giữa hai lần render.
+
+    Methods:
+      - start() / stop(): bật / tắt thread (stop() cũng giải phóng camera)
+      - poll(): trả về HandResult mới nhất, gesture chỉ trả True một lần
+      - status: "loading" -> "camera" -> "warmup" -> "ready" (hoặc "error")
+      - ready: threading.Event, được set khi model đã nạp, camera đã mở và đã chạy thử
+      - mode: "active" (mọi frame) hoặc "idle" (chỉ kiểm tra có tay idle_check_hz lần mỗi giây)
+      - keep_active: True = không chuyển sang idle (vd. trong lượt chơi)
+
+    Nếu có metrics (metrics.GameMetrics), mỗi frame camera được đếm (có tay,
+    nắm tay, thời gian inference nếu model chạy ở frame đó).
+
+    Nghỉ khi không có tay: sau idle_after_s giây không thấy tay (None = không
+    bao giờ), worker chỉ đọc và chạy model trên một frame mỗi 1/idle_check_hz
+    giây. Frame kiểm tra nào thấy tay thì frame kế tiếp đã chạy lại đủ tốc độ.
+
+    start() trả về ngay: nạp MediaPipe, mở camera và warmup_frames lần inference
+    chạy thử đều diễn ra trên thread nền, nên màn hình đầu tiên hiện được ngay.
+
+    Với MultiHandController (nhiều người chơi), poll() trả về frame (không có
+    tay) và poll_players() trả về {player_id: HandResult} của từng người chơi,
+    gesture của mỗi người chơi cũng chỉ được báo một lần.
+
+    Nếu có telemetry (TelemetryWriter), mọi frame có tay được ghi lại ngay
+    trên thread này, tức là theo tốc độ camera chứ không theo tốc độ render.
+    Nếu có recorder (replay.SessionRecorder), mọi HandResult được ghi lại để
+    phát lại sau không cần camera. source được truyền cho start_detection()
+    (chỉ số camera, đường dẫn video, thư mục / mẫu ảnh, xem camera.open_source,
+    hoặc replay.ReplayCapture).
+    """
+
+    def __init__(self, controller, telemetry=None, idle_sleep=0.005, recorder=None, source=0,
+                 warmup_frames=3, idle_after_s=None, idle_check_hz=4.0, metrics=None):
+        self.controller = controller
+        self.telemetry = telemetry
+        self.recorder = recorder
+        self.source = source
+        self.idle_sleep = idle_sleep      # nghỉ khi camera chưa có frame
+        self.warmup_frames = warmup_frames
+        self.idle_after_s = idle_after_s
+        self.idle_check_hz = idle_check_hz
+        self.metrics = metrics
+        self._inferences = 0
+        self.keep_active = False
+        self.mode = "active"
+        self._last_hand = time.monotonic()
+        self.status = "stopped"
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._latest = EMPTY_RESULT
+        self._pending_gesture = False
+        self.multi = hasattr(controller, "get_hands")
+        self._players = {}
+        self._pending_players = {}      # player_id -> HandResult của frame có cú nắm tay chưa báo
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the capture thread. Safe to call multiple times."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.status = "loading"
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="hand-tracking", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop the capture thread and release the camera."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.controller.stop_detection()
+        self.ready.clear()
+        self.status = "stopped"
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _startup(self):
+        ctrl = self.controller
+        try:
+            ctrl.load_model()
+            self.status = "camera"
+            ctrl.start_detection(self.source)
+            if ctrl.cap is None or not ctrl.cap.isOpened():
+                raise RuntimeError(f"cannot open camera {self.source!r}")
+            self.status = "warmup"
+            if self.warmup_frames:
+                ctrl.warmup(self.warmup_frames)
+        except Exception as e:
+            print(f"⚠️ Không khởi động được nhận diện tay: {e}")
+            self.status = "error"
+            return False
+        self.status = "ready"
+        self.ready.set()
+        return True
+
+    def _count_frame(self, has_hand, gesture):
+        ctrl = self.controller
+        ran = ctrl.inferences != self._inferences
+        self._inferences = ctrl.inferences
+        self.metrics.camera_frame(has_hand, gesture, ctrl.last_inference_ms if ran else None)
+
+    def _pace(self, has_hand):
+        """Presence gating after each frame: sleep between presence checks while no hand is around."""
+        now = time.monotonic()
+        if has_hand or self.keep_active:
+            if has_hand:
+                self._last_hand = now
+            self.mode = "active"
+            return
+        if self.idle_after_s is None or now - self._last_hand < self.idle_after_s:
+            return
+        self.mode = "idle"
+        # frame sau (sau khi nghỉ) luôn chạy model, không dùng landmarks dự đoán
+        self.controller.request_inference()
+        time.sleep(1.0 / self.idle_check_hz)
+
+    def _run(self):
+        if not self._startup():
+            return
+        if self.multi:
+            self._run_multi()
+            return
+        seq = 0
+        ctrl = self.controller
+        while self._running:
+            hand_pos, gesture, frame = ctrl.get_hand_position()
+            if frame is None:
+                time.sleep(self.idle_sleep)
+                continue
+            seq += 1
+            result = HandResult(hand_pos, gesture, frame,
+                                dict(ctrl.last_angles) if hand_pos else {},
+                                ctrl.last_clench_speed if hand_pos else None,
+                                ctrl.last_frame_time, seq,
+                                ctrl.last_predicted, ctrl.last_velocity,
+                                ctrl.last_landmarks if hand_pos else None)
+            with self._lock:
+                self._latest = result
+                if gesture:
+                    self._pending_gesture = True
+            # chỉ ghi số đo thật, không ghi landmarks dự đoán
+            if self.telemetry is not None and hand_pos and not result.predicted:
+                self.telemetry.record(result.angles, result.clench_speed, result.capture_time)
+            if self.recorder is not None:
+                self.recorder.write(result)
+            if self.metrics is not None:
+                self._count_frame(hand_pos is not None, gesture)
+            self._pace(hand_pos is not None)
+
+    def _run_multi(self):
+        seq = 0
+        ctrl = self.controller
+        while self._running:
+            tracks, frame = ctrl.get_hands()
+            if frame is None:
+                time.sleep(self.idle_sleep)
+                continue
+            seq += 1
+            t = ctrl.last_frame_time
+            result = HandResult(None, False, frame, {}, None, t, seq, ctrl.last_predicted)
+            players = {tr.player_id: HandResult(tr.hand_pos, tr.gesture, frame, dict(tr.angles),
+                                                tr.clench_speed, t, seq, tr.predicted, tr.velocity,
+                                                tr.landmarks)
+                       for tr in tracks}
+            with self._lock:
+                self._latest = result
+                self._players = players
+                self._pending_players.update((pid, r) for pid, r in players.items() if r.gesture)
+            if self.telemetry is not None:
+                for pid, r in players.items():
+                    if not r.predicted:
+                        self.telemetry.record(r.angles, r.clench_speed, t, slot=pid)
+            if self.recorder is not None:
+                # file ghi chỉ chứa một luồng tay: người chơi 0
+                self.recorder.write(players.get(0, result))
+            if self.metrics is not None:
+                self._count_frame(bool(players), any(r.gesture for r in players.values()))
+            self._pace(bool(players))
+
+    def poll_players(self):
+        """
+        Return {player_id: HandResult} for the hands in the newest frame (multi-hand mode).
+        Each player's gesture is reported exactly once, even if that player's hand is
+        missing from the newest frame (then the result of the gesture frame is returned).
+        """
+        with self._lock:
+            players = self._players
+            pending = self._pending_players
+            self._pending_players = {}
+        out = {}
+        for pid, r in players.items():
+            gesture = pid in pending
+            if gesture != r.gesture:
+                r = HandResult(r.hand_pos, gesture, r.frame, r.angles, r.clench_speed, r.capture_time,
+                               r.seq, r.predicted, r.velocity, r.landmarks)
+            out[pid] = r
+        for pid, r in pending.items():
+            if pid not in out:
+                out[pid] = r            # tay mất ngay sau cú nắm: vẫn báo cú nắm (seq cũ)
+        return out
+
+    def poll(self):
+        """
+        Return the newest HandResult without blocking.
+        A gesture seen by the worker is reported exactly once.
+        """
+        with self._lock:
+            latest = self._latest
+            gesture = self._pending_gesture
+            self._pending_gesture = False
+        if gesture == latest.gesture:
+            return latest
+        return HandResult(latest.hand_pos, gesture, latest.frame, latest.angles,
+                          latest.clench_speed, latest.capture_time, latest.seq,
+                          latest.predicted, latest.velocity, latest.landmarks)
@@ -0,0 +1,457 @@
+"""
+Inference server dùng chung cho nhiều máy game (kiosk) trên cùng một máy tính.
+
+Một process server giữ một pool process worker, mỗi worker có graph MediaPipe
+Hands riêng. Các process game (HandController(inference=InferenceClient(...)))
+gửi frame qua shared memory (multiprocessing.shared_memory) và nhận landmarks
+về qua một kết nối cục bộ (multiprocessing.connection), nên không process game
+nào phải nạp MediaPipe.
+
+    python inference_server.py --workers 4          # mặc định: số core - 1
+
+  - Mỗi station (và mỗi kênh "full" / "roi" của nó) được gắn cố định với một
+    worker, vì graph MediaPipe giữ trạng thái tracking theo chuỗi frame. Các
+    station được chia đều cho các worker nên thông lượng tăng theo số core.
+  - Cấu hình graph (max_num_hands, độ tin cậy, model_complexity) do station gửi
+    trong "open", ghi đè HANDS_KWARGS của server; gửi lại "open" với cấu hình
+    khác (HandController.set_quality) thì worker dựng lại graph của kênh đó.
+  - Backpressure: mỗi worker nhận tối đa max_pending frame chờ; vượt quá thì
+    server trả "busy" ngay. Frame chờ lâu hơn ngân sách (budget_ms) của station
+    bị bỏ ("late") thay vì xử lý trễ. Client có 2 slot frame trong shared
+    memory; khi cả hai còn đang xử lý thì frame mới bị bỏ qua.
+  - Lỗi khi xử lý một frame (shared memory đã bị xóa, MediaPipe lỗi...) chỉ trả
+    "error" cho frame đó, worker vẫn chạy tiếp.
+  - Frame bị bỏ làm process() của client raise InferenceSkipped; HandController
+    coi đó như một frame không chạy model và dùng landmarks dự đoán.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from multiprocessing import get_context
+from multiprocessing.connection import Client, Listener
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_ADDRESS = ("127.0.0.1", 6150)
+DEFAULT_AUTHKEY = b"whack-a-mole"
+HANDS_KWARGS = dict(static_image_mode=False, max_num_hands=2,
+                    min_detection_confidence=0.6, min_tracking_confidence=0.5)
+
+
+class InferenceSkipped(Exception):
+    """Frame không được xử lý (server bận, quá ngân sách độ trễ hoặc mất kết nối)."""
+
+
+def _attach_shm(name):
+    """Attach to a client's shared memory without letting this process unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)    # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+# --- SERVER ---
+def _worker_main(tasks, results, hands_kwargs):
+    """Worker process: one MediaPipe graph per (station, channel), frames read straight from shared memory."""
+    import mediapipe as mp
+
+    graphs = {}                 # (station, channel, worker) -> (cấu hình, graph)
+    buffers = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        if task[0] == "close":
+            for key in [k for k in graphs if k[0] == task[1]]:
+                graphs.pop(key)[1].close()
+            for key in [k for k in buffers if k[0] == task[1]]:
+                buffers.pop(key).close()
+            continue
+        _, key, seq, shm_name, offset, shape, deadline, config = task
+        if time.monotonic() > deadline:
+            results.put((key, seq, "late", None, None, 0.0))
+            continue
+        image = None
+        try:
+            shm = buffers.get(key)
+            if shm is None or shm.name.lstrip("/") != shm_name.lstrip("/"):
+                if shm is not None:
+                    buffers.pop(key).close()
+                shm = buffers[key] = _attach_shm(shm_name)
+            image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+            entry = graphs.get(key)
+            if entry is None or entry[0] != config:
+                if entry is not None:
+                    graphs.pop(key)[1].close()      # station đổi cấu hình: dựng lại graph
+                entry = graphs[key] = (config, mp.solutions.hands.Hands(**dict(hands_kwargs, **dict(config))))
+            graph = entry[1]
+            t0 = time.perf_counter()
+            res = graph.process(image)
+            infer_ms = (time.perf_counter() - t0) * 1000.0
+            image = None
+            pts, labels = None, None
+            if res.multi_hand_landmarks:
+                pts = np.array([[(p.x, p.y, p.z) for p in lm.landmark] for lm in res.multi_hand_landmarks],
+                               dtype=np.float32)
+                labels = [h.classification[0].label for h in (res.multi_handedness or [])]
+        except Exception as e:
+            # chỉ frame này lỗi: bỏ buffer / graph của kênh (dựng lại ở frame sau), worker chạy tiếp
+            image = None
+            entry = graphs.pop(key, None)
+            for obj in (buffers.pop(key, None), entry[1] if entry else None):
+                try:
+                    if obj is not None:
+                        obj.close()
+                except Exception:
+                    pass
+            print(f"inference worker: frame {seq} of station {key[0]}/{key[1]} failed: {e}")
+            results.put((key, seq, "error", None, None, 0.0))
+            continue
+        results.put((key, seq, "ok", pts, labels, infer_ms))
+
+
+class _Station:
+    def __init__(self, uid, conn, name, budget_ms, worker):
+        self.uid = uid
+        self.conn = conn
+        self.name = name
+        self.budget_ms = budget_ms
+        self.worker = worker
+        self.channels = {}          # channel -> (shm_name, slot_bytes, cấu hình graph)
+        self.send_lock = threading.Lock()
+
+    def send(self, msg):
+        with self.send_lock:
+            try:
+                self.conn.send(msg)
+            except (OSError, EOFError):
+                pass
+
+
+class InferenceServer:
+    """
+    Server nhận frame từ nhiều station và chia cho pool worker.
+
+      - workers: số process worker (mặc định số core - 1)
+      - max_pending: số frame chờ tối đa mỗi worker trước khi trả "busy"
+      - serve_forever() / close()
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY, workers=None, max_pending=4,
+                 hands_kwargs=None):
+        self.address = address
+        self.authkey = authkey
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending
+        self.hands_kwargs = dict(HANDS_KWARGS, **(hands_kwargs or {}))
+        ctx = get_context("spawn")
+        self._results = ctx.Queue()
+        self._tasks = [ctx.Queue() for _ in range(self.workers)]
+        self._procs = [ctx.Process(target=_worker_main, args=(q, self._results, self.hands_kwargs),
+                                   name=f"inference-worker-{i}", daemon=True)
+                       for i, q in enumerate(self._tasks)]
+        self._pending = [0] * self.workers
+        self._drain_locks = [threading.Lock() for _ in range(self.workers)]
+        self._load = [0] * self.workers          # số station gắn với mỗi worker
+        self._stations = {}
+        self._lock = threading.Lock()
+        self._uids = itertools.count(1)
+        self._listener = None
+        self._running = False
+
+    def serve_forever(self):
+        for p in self._procs:
+            p.start()
+        self._running = True
+        threading.Thread(target=self._route_results, name="inference-results", daemon=True).start()
+        self._listener = Listener(self.address, authkey=self.authkey)
+        print(f"Inference server on {self.address[0]}:{self.address[1]}, {self.workers} workers")
+        try:
+            while self._running:
+                conn = self._listener.accept()
+                threading.Thread(target=self._serve_station, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        self._running = False
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        for q in self._tasks:
+            q.put(None)
+        for p in self._procs:
+            p.join(1.0)
+
+    def _serve_station(self, conn):
+        station = None
+        try:
+            while True:
+                msg = conn.recv()
+                kind = msg[0]
+                if kind == "hello":
+                    with self._lock:
+                        worker = min(range(self.workers), key=self._load.__getitem__)
+                        self._load[worker] += 1
+                        station = _Station(next(self._uids), conn, msg[1], msg[2], worker)
+                        self._stations[station.uid] = station
+                elif kind == "open":
+                    _, channel, shm_name, slot_bytes = msg[:4]
+                    config = tuple(sorted((msg[4] if len(msg) > 4 else {}).items()))
+                    station.channels[channel] = (shm_name, slot_bytes, config)
+                elif kind == "frame":
+                    self._submit(station, *msg[1:])
+                elif kind == "close":
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if station is not None:
+                with self._lock:
+                    self._stations.pop(station.uid, None)
+                    self._load[station.worker] -= 1
+                self._drop_queued(station.uid, station.worker)
+                self._tasks[station.worker].put(("close", station.uid))
+
+    def _drop_queued(self, uid, w):
+        """Remove frames of a closed station still waiting in worker w's queue and release their slots."""
+        keep, dropped = [], 0
+        with self._drain_locks[w]:
+            while True:
+                try:
+                    task = self._tasks[w].get_nowait()
+                except queue.Empty:
+                    break
+                if task is not None and task[0] == "frame" and task[1][0] == uid:
+                    dropped += 1
+                else:
+                    keep.append(task)
+            for task in keep:
+                self._tasks[w].put(task)
+        if dropped:
+            with self._lock:
+                self._pending[w] = max(0, self._pending[w] - dropped)
+
+    def _submit(self, station, channel, seq, slot, shape):
+        # kiểm tra frame trước khi giữ slot: frame sai trả "error", không làm chết thread của station
+        opened = station.channels.get(channel)
+        if opened is None or slot < 0 or int(np.prod(shape)) > opened[1]:
+            station.send(("result", channel, seq, "error", None, None, 0.0))
+            return
+        shm_name, slot_bytes, config = opened
+        w = station.worker
+        with self._lock:
+            busy = self._pending[w] >= self.max_pending
+            if not busy:
+                self._pending[w] += 1
+        if busy:
+            station.send(("result", channel, seq, "busy", None, None, 0.0))
+            return
+        deadline = time.monotonic() + station.budget_ms / 1000.0
+        self._tasks[w].put(("frame", (station.uid, channel, w), seq, shm_name, slot * slot_bytes,
+                            tuple(shape), deadline, config))
+
+    def _route_results(self):
+        while self._running:
+            try:
+                (uid, channel, w), seq, status, pts, labels, infer_ms = self._results.get()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                # trả slot cho worker kể cả khi station đã ngắt kết nối
+                self._pending[w] = max(0, self._pending[w] - 1)
+                station = self._stations.get(uid)
+            if station is not None:
+                station.send(("result", channel, seq, status, pts, labels, infer_ms))
+
+
+# --- CLIENT ---
+class _Label:
+    __slots__ = ("label",)
+
+    def __init__(self, label):
+        self.label = label
+
+
+class _Handedness:
+    __slots__ = ("classification",)
+
+    def __init__(self, label):
+        self.classification = [_Label(label)]
+
+
+class RemoteResults:
+    """Cùng dạng với kết quả Hands.process(): multi_hand_landmarks là các mảng (21,3) float32."""
+
+    __slots__ = ("multi_hand_landmarks", "multi_handedness", "infer_ms")
+
+    def __init__(self, pts, labels, infer_ms):
+        self.multi_hand_landmarks = list(pts) if pts is not None else None
+        self.multi_handedness = [_Handedness(l) for l in labels] if labels else None
+        self.infer_ms = infer_ms
+
+
+class RemoteHands:
+    """
+    Thay cho mp.solutions.hands.Hands trong HandController: process(rgb) gửi ảnh
+    qua shared memory tới server và chờ kết quả tối đa budget của station.
+    hands_kwargs: tham số của Hands(...) cho graph trên server; configure() đổi lúc chạy.
+    """
+
+    def __init__(self, client, channel, max_frame_bytes, slots=2, hands_kwargs=None):
+        self.client = client
+        self.channel = channel
+        self.slot_bytes = max_frame_bytes
+        self.shm = shared_memory.SharedMemory(create=True, size=max_frame_bytes * slots)
+        self._busy = [0] * slots            # seq đang xử lý ở mỗi slot, 0 = trống
+        self._seq = 0
+        self.hands_kwargs = dict(hands_kwargs or {})
+        self._open()
+
+    def _open(self):
+        self.client._send(("open", self.channel, self.shm.name, self.slot_bytes, self.hands_kwargs))
+
+    def configure(self, hands_kwargs):
+        """Change the server-side graph parameters; the worker rebuilds the graph on the next frame."""
+        if dict(hands_kwargs) != self.hands_kwargs:
+            self.hands_kwargs = dict(hands_kwargs)
+            self._open()
+
+    def _release(self, seq):
+        for i, s in enumerate(self._busy):
+            if s == seq:
+                self._busy[i] = 0
+
+    def process(self, image):
+        if image.nbytes > self.slot_bytes:
+            raise ValueError(f"frame of {image.nbytes} bytes exceeds shared slot of {self.slot_bytes}")
+        if 0 not in self._busy:
+            self.client._drain()
+            if 0 not in self._busy:
+                raise InferenceSkipped("all frame slots in flight")
+        slot = self._busy.index(0)
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = image
+        del view
+        self._seq += 1
+        self._busy[slot] = self._seq
+        self.client._send(("frame", self.channel, self._seq, slot, image.shape))
+        reply = self.client._wait(self.channel, self._seq)
+        if reply is None or reply[3] != "ok":
+            raise InferenceSkipped(reply[3] if reply else "timeout")
+        return RemoteResults(reply[4], reply[5], reply[6])
+
+    def close(self):
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class InferenceClient:
+    """
+    Kết nối của một station (một process game) tới InferenceServer.
+
+      - budget_ms: ngân sách độ trễ của station; server bỏ frame chờ lâu hơn,
+        client cũng chỉ chờ kết quả chừng đó (+ timeout_margin)
+      - hands(channel, **hands_kwargs): RemoteHands cho một kênh ("full", "roi"...);
+        gọi lại với cấu hình khác thì graph của kênh được dựng lại trên server
+      - close()
+    Chỉ dùng từ một thread (thread nhận diện).
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=DEFAULT_AUTHKEY, station=None, budget_ms=50.0,
+                 max_frame=(1280, 720), timeout_margin=1.5):
+        self.budget_ms = budget_ms
+        self.max_frame_bytes = max_frame[0] * max_frame[1] * 3
+        self.timeout = budget_ms * timeout_margin / 1000.0
+        self.station = station or f"{os.getpid()}"
+        self._conn = Client(address, authkey=authkey)
+        self._channels = {}
+        self._broken = False
+        self._send(("hello", self.station, budget_ms))
+
+    def hands(self, channel="full", **hands_kwargs):
+        remote = self._channels.get(channel)
+        if remote is None:
+            remote = self._channels[channel] = RemoteHands(self, channel, self.max_frame_bytes,
+                                                           hands_kwargs=hands_kwargs)
+        elif hands_kwargs:
+            remote.configure(hands_kwargs)
+        return remote
+
+    def _send(self, msg):
+        if self._broken:
+            raise InferenceSkipped("inference server disconnected")
+        try:
+            self._conn.send(msg)
+        except (OSError, EOFError):
+            self._broken = True
+            raise InferenceSkipped("inference server disconnected")
+
+    def _dispatch(self, msg):
+        remote = self._channels.get(msg[1])
+        if remote is not None:
+            remote._release(msg[2])
+
+    def _drain(self):
+        """Handle replies that already arrived (vd. kết quả trễ của frame đã bỏ chờ)."""
+        try:
+            while self._conn.poll(0):
+                self._dispatch(self._conn.recv())
+        except (OSError, EOFError):
+            self._broken = True
+
+    def _wait(self, channel, seq):
+        end = time.monotonic() + self.timeout
+        try:
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0 or not self._conn.poll(remaining):
+                    return None
+                msg = self._conn.recv()
+                self._dispatch(msg)
+                if msg[1] == channel and msg[2] == seq:
+                    return msg
+        except (OSError, EOFError):
+            self._broken = True
+            return None
+
+    def close(self):
+        try:
+            if not self._broken:
+                self._conn.send(("close",))
+            self._conn.close()
+        except (OSError, EOFError):
+            pass
+        for remote in self._channels.values():
+            remote.close()
+        self._channels = {}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared hand inference server")
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: cores - 1)")
+    parser.add_argument("--max-pending", type=int, default=4, help="queued frames per worker before 'busy'")
+    args = parser.parse_args()
+
+    server = InferenceServer((args.host, args.port), workers=args.workers, max_pending=args.max_pending)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,237 @@
+"""
+Luồng landmarks trực tiếp cho công cụ bên ngoài (vd. dashboard của kỹ thuật viên).
+
+HandController ghi mỗi frame (landmarks, góc ngón, clench speed, thời điểm
+chụp) vào một ring buffer trong file memory-mapped; bao nhiêu process đọc
+cùng lúc cũng được, mỗi process mmap file chỉ-đọc và xem thẳng dữ liệu qua
+numpy (không copy, không socket). Không có lock: writer không bao giờ chờ
+reader, reader chậm chỉ bị mất các bản ghi cũ đã bị ghi đè.
+
+Bố cục file (little-endian, xem HEADER_DTYPE / SLOT_DTYPE):
+
+  header, HEADER_SIZE = 64 byte
+    0   magic        8s   b"WAMLMK01"
+    8   version      u32  FORMAT_VERSION
+    12  header_size  u32  64
+    16  slot_size    u32  SLOT_DTYPE.itemsize (320)
+    20  n_slots      u32  số slot của ring
+    24  write_seq    u64  seq của bản ghi mới nhất đã ghi xong (0 = chưa có)
+    32  writer_pid   u32
+    40  created      f64  time.time() lúc tạo file
+  slot k (bản ghi seq nằm ở slot seq % n_slots), tại 64 + k * 320
+    0   seq          u64  0 = đang ghi, ngược lại seq của bản ghi (tăng dần từ 1)
+    8   capture_time f64  time.monotonic() lúc chụp frame (cùng đồng hồ cho mọi process)
+    16  player       i32  người chơi (0.., -1 = frame không có tay)
+    20  flags        u32  FLAG_HAND | FLAG_PREDICTED | FLAG_GESTURE
+    24  hand_pos     2 x f32  cổ tay (px trên frame đã lật gương)
+    32  clench_speed f32  deg/s, NaN nếu không có
+    36  angles       5 x f32  thumb, index, middle, ring, pinky (deg), NaN nếu không có
+    56  landmarks    21 x 3 x f32  tọa độ chuẩn hóa MediaPipe, NaN nếu không có
+
+Giao thức (seqlock, một writer): writer đặt seq = 0, ghi nội dung, đặt seq =
+n rồi mới tăng write_seq = n. Reader đọc slot n % n_slots, copy bản ghi rồi
+đọc lại seq: bản ghi hợp lệ khi seq trước và sau khi copy đều bằng n.
+
+  - FeedWriter(path, n_slots): publish(...) gọi từ thread nhận diện (HandController.feed)
+  - FeedReader(path): latest(), read_since(seq), slots (view numpy chỉ-đọc)
+
+    python src/landmark_feed.py             # in trực tiếp góc ngón + clench speed
+"""
+import mmap
+import os
+import tempfile
+import time
+
+import numpy as np
+
+MAGIC = b"WAMLMK01"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+FLAG_HAND, FLAG_PREDICTED, FLAG_GESTURE = 1, 2, 4
+FINGER_ORDER = ("thumb", "index", "middle", "ring", "pinky")
+
+HEADER_DTYPE = np.dtype({
+    "names": ["magic", "version", "header_size", "slot_size", "n_slots", "write_seq", "writer_pid", "created"],
+    "formats": ["S8", "<u4", "<u4", "<u4", "<u4", "<u8", "<u4", "<f8"],
+    "offsets": [0, 8, 12, 16, 20, 24, 32, 40],
+    "itemsize": HEADER_SIZE,
+})
+SLOT_DTYPE = np.dtype({
+    "names": ["seq", "capture_time", "player", "flags", "hand_pos", "clench_speed", "angles", "landmarks"],
+    "formats": ["<u8", "<f8", "<i4", "<u4", ("<f4", 2), "<f4", ("<f4", 5), ("<f4", (21, 3))],
+    "offsets": [0, 8, 16, 20, 24, 32, 36, 56],
+    "itemsize": 320,
+})
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+DEFAULT_PATH = os.path.join(_SHM_DIR, "whack_a_mole_landmarks.ring")
+
+
+class FeedWriter:
+    """
+    Writer duy nhất của ring buffer (một process, một thread).
+
+    File được dựng ở path + ".tmp" rồi os.replace() vào path, nên reader đang mở
+    file cũ không bao giờ thấy file dở dang.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, n_slots=1024):
+        self.path = path
+        self.n_slots = n_slots
+        size = HEADER_SIZE + n_slots * SLOT_DTYPE.itemsize
+        tmp = path + ".tmp"
+        with open(tmp, "w+b") as fh:
+            fh.truncate(size)
+            self._mm = mmap.mmap(fh.fileno(), size)
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._mm)
+        self._slots = np.ndarray((n_slots,), dtype=SLOT_DTYPE, buffer=self._mm, offset=HEADER_SIZE)
+        self._header["version"] = FORMAT_VERSION
+        self._header["header_size"] = HEADER_SIZE
+        self._header["slot_size"] = SLOT_DTYPE.itemsize
+        self._header["n_slots"] = n_slots
+        self._header["writer_pid"] = os.getpid()
+        self._header["created"] = time.time()
+        self._header["magic"] = MAGIC           # ghi sau cùng: header đầy đủ khi magic hợp lệ
+        os.replace(tmp, path)
+        self.seq = 0
+        self._angles = np.empty(5, dtype=np.float32)
+
+    def publish(self, capture_time, player=-1, hand_pos=None, angles=None, clench_speed=None,
+                landmarks=None, predicted=False, gesture=False):
+        """Append one record. Never blocks; overwrites the oldest slot."""
+        if self._mm is None:
+            return
+        seq = self.seq + 1
+        slot = self._slots[seq % self.n_slots]
+        slot["seq"] = 0
+        slot["capture_time"] = capture_time
+        slot["player"] = player
+        slot["flags"] = ((FLAG_HAND if hand_pos is not None else 0) | (FLAG_PREDICTED if predicted else 0)
+                         | (FLAG_GESTURE if gesture else 0))
+        slot["hand_pos"] = hand_pos if hand_pos is not None else (np.nan, np.nan)
+        slot["clench_speed"] = np.nan if clench_speed is None else clench_speed
+        if angles:
+            for i, f in enumerate(FINGER_ORDER):
+                self._angles[i] = angles.get(f, np.nan)
+            slot["angles"] = self._angles
+        else:
+            slot["angles"] = np.nan
+        slot["landmarks"] = landmarks if landmarks is not None else np.nan
+        slot["seq"] = seq
+        self._header["write_seq"] = seq
+        self.seq = seq
+
+    def close(self, remove=True):
+        if self._mm is None:
+            return
+        self._header = self._slots = None
+        self._mm.close()
+        self._mm = None
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+class FeedReader:
+    """
+    Reader (process bất kỳ trên cùng máy), chỉ đọc, không ảnh hưởng writer.
+
+      - write_seq: seq mới nhất writer đã ghi xong
+      - slots: mảng SLOT_DTYPE chỉ-đọc trỏ thẳng vào file (zero-copy, có thể đang bị ghi)
+      - latest(): bản ghi mới nhất hợp lệ (copy) hoặc None
+      - read_since(seq): (list bản ghi mới hơn seq theo thứ tự, số bản ghi đã mất vì bị ghi đè)
+      - replaced(): True nếu game đã mở lại feed (file mới) -> tạo FeedReader mới
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as fh:
+            self._inode = os.fstat(fh.fileno()).st_ino
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._mm)
+        if header["magic"] != MAGIC or header["version"] != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: not a landmark feed (version {FORMAT_VERSION})")
+        if header["slot_size"] != SLOT_DTYPE.itemsize:
+            self._mm.close()
+            raise ValueError(f"{path}: unexpected slot size {int(header['slot_size'])}")
+        self._header = header
+        self.n_slots = int(header["n_slots"])
+        self.slots = np.ndarray((self.n_slots,), dtype=SLOT_DTYPE, buffer=self._mm, offset=HEADER_SIZE)
+
+    @property
+    def write_seq(self):
+        return int(self._header["write_seq"])
+
+    def _read(self, seq):
+        slot = self.slots[seq % self.n_slots]
+        if slot["seq"] != seq:
+            return None
+        rec = slot.copy()
+        return rec if slot["seq"] == seq else None
+
+    def latest(self):
+        seq = self.write_seq
+        return self._read(seq) if seq else None
+
+    def read_since(self, last_seq):
+        newest = self.write_seq
+        first = max(last_seq + 1, newest - self.n_slots + 1, 1)
+        missed = first - (last_seq + 1)
+        out = []
+        for seq in range(first, newest + 1):
+            rec = self._read(seq)
+            if rec is None:
+                missed += 1          # bị ghi đè trong lúc đọc
+            else:
+                out.append(rec)
+        return out, missed
+
+    def replaced(self):
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return False
+
+    def close(self):
+        self._header = self.slots = None
+        self._mm.close()
+
+
+def _tail(path, interval=0.1):
+    reader, last = None, 0
+    while True:
+        if reader is None or reader.replaced():
+            try:
+                reader, last = FeedReader(path), 0
+            except (OSError, ValueError):
+                time.sleep(1.0)
+                continue
+        records, missed = reader.read_since(last)
+        for rec in records:
+            last = int(rec["seq"])
+        if records:
+            rec = records[-1]
+            age_ms = (time.monotonic() - float(rec["capture_time"])) * 1000.0
+            if rec["flags"] & FLAG_HAND:
+                angles = " ".join(f"{f[:2]} {a:5.1f}" for f, a in zip(FINGER_ORDER, rec["angles"]))
+                print(f"#{last:<8} p{int(rec['player'])}  {angles}  clench {float(rec['clench_speed']):7.1f} deg/s  "
+                      f"age {age_ms:5.1f} ms  +{len(records)} frames, {missed} missed")
+            else:
+                print(f"#{last:<8} no hand  age {age_ms:5.1f} ms")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tail the live landmark feed of a running game")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between prints")
+    args = parser.parse_args()
+    try:
+        _tail(args.path, args.interval)
+    except KeyboardInterrupt:
+        pass
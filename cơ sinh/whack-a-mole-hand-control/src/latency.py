@@ -0,0 +1,137 @@
+"""
+Đo độ trễ từng stage của mỗi frame (camera -> nhận diện -> game -> màn hình).
+
+Mỗi stage giữ một cửa sổ trượt các mẫu gần nhất (ms) để tính p50/p95/p99.
+Cách dùng trong code nóng, nối các stage liên tiếp bằng một mốc thời gian:
+
+    t = prof.now()
+    ok, frame = cap.read()
+    t = prof.since("cap.read", t)
+    frame = cv2.flip(frame, 1)
+    t = prof.since("flip", t)
+
+NULL_PROFILER có cùng giao diện nhưng không làm gì (không cả gọi đồng hồ),
+dùng làm mặc định để code không cần kiểm tra None.
+"""
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# thứ tự hiển thị / ghi file; stage khác được thêm vào sau theo thứ tự xuất hiện
+STAGES = ("cap.read", "flip", "cvtColor", "hands.process", "angles", "gesture",
+          "update", "render", "display.flip", "capture_to_hit", "capture_to_photon")
+PERCENTILES = (50, 95, 99)
+
+
+class RollingHistogram:
+    """Ring buffer cố định window mẫu (ms); percentiles() chỉ tính trên các mẫu gần nhất."""
+
+    def __init__(self, window=1024):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._next = 0
+        self.count = 0          # tổng số mẫu từ lần reset gần nhất (kể cả mẫu đã bị đè)
+
+    def add(self, value):
+        self._samples[self._next] = value
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+
+    def values(self):
+        return self._samples[:min(self.count, len(self._samples))]
+
+    def percentiles(self, qs=PERCENTILES):
+        v = self.values()
+        if not len(v):
+            return [0.0] * len(qs)
+        return np.percentile(v, qs).tolist()
+
+    def reset(self):
+        self._next = 0
+        self.count = 0
+
+
+class LatencyProfiler:
+    """
+    Thu thập thời gian từng stage từ nhiều thread (thread-safe).
+
+      - now(): mốc thời gian (perf_counter) để bắt đầu đo
+      - since(stage, t0): ghi (hiện tại - t0) cho stage, trả về hiện tại để nối stage kế
+      - add(stage, ms): ghi một mẫu đã đo sẵn (vd. độ trễ capture -> hit)
+      - snapshot(): [(stage, count, mean, p50, p95, p99, max)] theo thứ tự STAGES
+      - summary_rows(player, round_no): các dòng theo telemetry.LATENCY_COLUMNS
+      - reset(): xóa mọi mẫu (gọi đầu mỗi lượt để số liệu tính theo lượt)
+    """
+
+    enabled = True
+
+    def __init__(self, window=1024):
+        self.window = window
+        self._hist = {}
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter()
+
+    def add(self, stage, ms):
+        with self._lock:
+            hist = self._hist.get(stage)
+            if hist is None:
+                hist = self._hist[stage] = RollingHistogram(self.window)
+            hist.add(ms)
+
+    def since(self, stage, t0):
+        now = time.perf_counter()
+        self.add(stage, (now - t0) * 1000.0)
+        return now
+
+    def reset(self):
+        with self._lock:
+            for hist in self._hist.values():
+                hist.reset()
+
+    def snapshot(self):
+        with self._lock:
+            names = [s for s in STAGES if s in self._hist] + [s for s in self._hist if s not in STAGES]
+            out = []
+            for name in names:
+                hist = self._hist[name]
+                v = hist.values()
+                if not len(v):
+                    continue
+                p = hist.percentiles()
+                out.append((name, hist.count, float(v.mean()), p[0], p[1], p[2], float(v.max())))
+        return out
+
+    def summary_rows(self, player, round_no):
+        ts = datetime.now().isoformat()
+        return [[ts, player, round_no, name, count] + [round(x, 3) for x in vals]
+                for name, count, *vals in self.snapshot()]
+
+
+class NullProfiler:
+    """Profiler tắt: cùng giao diện với LatencyProfiler, mọi lệnh đều là no-op."""
+
+    enabled = False
+
+    def now(self):
+        return 0.0
+
+    def add(self, stage, ms):
+        pass
+
+    def since(self, stage, t0):
+        return 0.0
+
+    def reset(self):
+        pass
+
+    def snapshot(self):
+        return []
+
+    def summary_rows(self, player, round_no):
+        return []
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,201 @@
+"""
+Số đo của máy game cho hệ thống giám sát (định dạng text Prometheus).
+
+Game loop và thread nhận diện chỉ cộng số nguyên / đặt thuộc tính trên
+GameMetrics (không lock, không cấp phát); mọi phép tính (FPS, tỉ lệ nhận
+diện, bộ nhớ, độ sâu hàng đợi...) chỉ chạy khi có request tới /metrics,
+trên thread của MetricsServer.
+
+    metrics = GameMetrics(station="kiosk-3")
+    MetricsServer(metrics, port=9464).start()     # http://127.0.0.1:9464/metrics
+
+Máy bị chậm: wam_render_fps thấp, wam_inference_seconds lệch về bucket cao,
+wam_last_camera_frame_age_seconds lớn, wam_persistence_queue_depth tăng dần.
+"""
+import bisect
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+INFERENCE_BUCKETS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    """Prometheus histogram with fixed upper bounds (giây); observe() là bisect + cộng số nguyên."""
+
+    def __init__(self, buckets=INFERENCE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # ô cuối = +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        out, total = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            out.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {total}")
+        return out
+
+
+def _resident_bytes():
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024    # đỉnh, Linux: KiB
+    except (ImportError, OSError):
+        return None
+
+
+class GameMetrics:
+    """
+    Bộ đếm của một máy game.
+
+    Ghi (từ game loop / thread nhận diện):
+      - frames_rendered, rounds_played: cộng trực tiếp (+= 1)
+      - camera_frame(has_hand, gesture, inference_ms): mỗi frame camera đã xử lý
+    Nguồn đọc khi scrape (gán sau khi tạo các object tương ứng):
+      - persistence: PersistenceWorker (độ sâu hàng đợi ghi đĩa)
+      - hand_source: HandTrackingWorker (chế độ active / idle)
+      - controller: HandController (frame cũ camera.CameraSource đã bỏ)
+      - render(): toàn bộ text Prometheus
+    """
+
+    def __init__(self, station=None):
+        self.station = station or socket.gethostname()
+        self.frames_rendered = 0
+        self.rounds_played = 0
+        self.camera_frames = 0
+        self.hand_frames = 0
+        self.gestures = 0
+        self.inference = Histogram()
+        self.last_camera_frame = None
+        self.persistence = None
+        self.hand_source = None
+        self.controller = None
+        self._lock = threading.Lock()       # chỉ giữa các request scrape
+        self._prev = None
+        self._rates = (0.0, 0.0)
+
+    def camera_frame(self, has_hand, gesture=False, inference_ms=None):
+        self.camera_frames += 1
+        if has_hand:
+            self.hand_frames += 1
+        if gesture:
+            self.gestures += 1
+        if inference_ms is not None:
+            self.inference.observe(inference_ms / 1000.0)
+        self.last_camera_frame = time.monotonic()
+
+    def _window_rates(self, now):
+        # FPS và tỉ lệ nhận diện trong khoảng giữa hai lần scrape (tối thiểu 0.25 s)
+        cur = (now, self.frames_rendered, self.camera_frames, self.hand_frames)
+        if self._prev is None:
+            self._prev = cur
+        elif now - self._prev[0] >= 0.25:
+            dt = now - self._prev[0]
+            cams = cur[2] - self._prev[2]
+            self._rates = ((cur[1] - self._prev[1]) / dt, (cur[3] - self._prev[3]) / cams if cams else 0.0)
+            self._prev = cur
+        return self._rates
+
+    def render(self):
+        with self._lock:
+            now = time.monotonic()
+            fps, detection_rate = self._window_rates(now)
+            label = f'station="{self.station}"'
+            out = []
+
+            def metric(name, kind, help_text, value):
+                if value is None:
+                    return
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+                out.append(f"{name}{{{label}}} {value}")
+
+            metric("wam_station_info", "gauge", "Game station (label station).", 1)
+            metric("wam_frames_rendered_total", "counter", "Frames drawn by the game loop during rounds.",
+                   self.frames_rendered)
+            metric("wam_render_fps", "gauge", "Render frames per second since the previous scrape.", round(fps, 2))
+            metric("wam_camera_frames_total", "counter", "Camera frames processed by hand tracking.",
+                   self.camera_frames)
+            metric("wam_frames_with_hand_total", "counter", "Camera frames in which a hand was found.",
+                   self.hand_frames)
+            metric("wam_detection_rate", "gauge", "Share of camera frames with a hand since the previous scrape.",
+                   round(detection_rate, 4))
+            metric("wam_gestures_total", "counter", "Fist gestures detected.", self.gestures)
+            out.append("# HELP wam_inference_seconds Hand model inference time.")
+            out.append("# TYPE wam_inference_seconds histogram")
+            out += self.inference.lines("wam_inference_seconds", label)
+            cap = getattr(self.controller, "cap", None)
+            metric("wam_camera_dropped_frames_total", "counter", "Stale camera frames skipped to keep latency low.",
+                   getattr(cap, "dropped", None))
+            if self.last_camera_frame is not None:
+                metric("wam_last_camera_frame_age_seconds", "gauge", "Seconds since hand tracking processed a frame.",
+                       round(now - self.last_camera_frame, 3))
+            if self.hand_source is not None:
+                metric("wam_hand_tracking_idle", "gauge", "1 while hand tracking is in low-rate idle mode.",
+                       int(getattr(self.hand_source, "mode", "active") == "idle"))
+            if self.persistence is not None:
+                metric("wam_persistence_queue_depth", "gauge", "Jobs waiting for the disk writer thread.",
+                       self.persistence.pending())
+            metric("wam_rounds_played_total", "counter", "Rounds finished.", self.rounds_played)
+            metric("wam_process_resident_memory_bytes", "gauge", "Resident memory of the game process.",
+                   _resident_bytes())
+            metric("wam_process_cpu_seconds_total", "counter", "CPU time of the game process.",
+                   round(time.process_time(), 3))
+            return "\n".join(out) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass                                # không in mỗi lần scrape
+
+
+class MetricsServer:
+    """HTTP /metrics trên thread nền (mặc định chỉ localhost). start() / stop()."""
+
+    def __init__(self, metrics, host="127.0.0.1", port=9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.metrics = self.metrics
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+            self._thread = None
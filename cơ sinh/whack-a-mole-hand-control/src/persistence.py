@@ -0,0 +1,169 @@
+import atexit
+import importlib.util
+import os
+import queue
+import threading
+from datetime import datetime
+
+from session_store import HISTORY_XLSX, SESSION_DB, SessionStore
+
+# chỉ kiểm tra có openpyxl; module được import khi ghi lần đầu (trên thread ghi),
+# không làm chậm lúc khởi động game
+OPENPYXL = importlib.util.find_spec("openpyxl") is not None
+
+_STOP = object()
+
+
+class PersistenceWorker:
+    """
+    Thread ghi dữ liệu xuống đĩa, để render loop không bao giờ làm I/O.
+
+      - submit_round(round_id, ...): giao kết quả một lượt, mỗi round_id đúng một lần
+      - request_flush(): yêu cầu ghi buffer telemetry (gọi từ bất kỳ thread nào)
+      - pending(): số job đang chờ trong hàng đợi (giám sát)
+      - close(): ghi nốt mọi thứ còn trong hàng đợi rồi dừng (tự gọi khi thoát)
+
+    Các job được gom theo lô: mỗi lượt được ghi vào SessionStore (SQLite, một
+    transaction mỗi lượt), telemetry được flush định kỳ mỗi flush_interval giây.
+    Lần đầu tạo database, lịch sử cũ trong legacy_history (xlsx) được nhập vào.
+    startup (vd. migrate_legacy_xlsx) được gọi một lần trên thread ghi trước mọi
+    job khác, để việc chậm lúc khởi động không chặn màn hình đầu tiên.
+    """
+
+    def __init__(self, telemetry=None, store_path=SESSION_DB, flush_interval=1.0, startup=None,
+                 legacy_history=HISTORY_XLSX):
+        self.telemetry = telemetry
+        self.store_path = store_path
+        self.legacy_history = legacy_history
+        self.store = None                # SessionStore, mở trên thread ghi (sqlite3 gắn với thread)
+        self.flush_interval = flush_interval
+        self.startup = startup
+        self._queue = queue.Queue()
+        self._submitted = set()
+        self._thread = None
+        self._closed = False
+        if telemetry is not None:
+            telemetry.flush_hook = self.request_flush
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit_round(self, round_id, player, round_no, score, hit_count, accuracy, summary_row=None,
+                     latency_rows=None, series=None, event_rows=None):
+        """
+        Queue one finished round. Returns False if round_id was already submitted.
+        series: (name, arrays) for TelemetryWriter.save_series; event_rows: telemetry.EVENT_COLUMNS rows.
+        """
+        if round_id in self._submitted or self._closed:
+            return False
+        self._submitted.add(round_id)
+        self._queue.put(("round", {
+            "player": player,
+            "round": round_no,
+            "time": datetime.now().timestamp(),
+            "session": str(round_id[0]),
+            "score": score,
+            "hit_count": hit_count,
+            "accuracy": accuracy,
+            "summary_row": summary_row,
+            "latency_rows": latency_rows,
+            "series": series,
+            "event_rows": event_rows,
+        }))
+        return True
+
+    def pending(self):
+        """Number of jobs still waiting for the writer thread."""
+        return self._queue.qsize()
+
+    def request_flush(self):
+        self._queue.put(("flush", None))
+
+    def close(self, timeout=5.0):
+        """Flush everything still queued and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+    def _run(self):
+        try:
+            self.store = SessionStore(self.store_path)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi mở lịch sử chơi: {e}")
+        if self.store is not None and OPENPYXL and self.legacy_history:
+            # thử lại mỗi lần khởi động cho tới khi nhập xong (marker ghi cùng transaction với dữ liệu)
+            try:
+                self.store.import_history_xlsx(self.legacy_history)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi nhập {os.path.basename(self.legacy_history)}: {e}")
+        if self.startup is not None:
+            try:
+                self.startup()
+            except Exception as e:
+                print(f"⚠️ Lỗi khi khởi tạo dữ liệu: {e}")
+        stopping = False
+        while not stopping:
+            try:
+                jobs = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                jobs = []
+            # gom mọi job đang chờ thành một lô
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = _STOP in jobs
+            rounds = []
+            for job in jobs:
+                if job is not _STOP and job[0] == "round":
+                    rounds.append(job[1])
+            try:
+                self._write(rounds)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi lưu dữ liệu: {e}")
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def _sink(self, name, fn, *args):
+        # mỗi file telemetry độc lập: một file lỗi không chặn file khác hay lịch sử chơi
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi ghi telemetry ({name}): {e}")
+
+    def _write(self, rounds):
+        if self.telemetry is not None:
+            self._sink("flush", self.telemetry.flush)
+            for r in rounds:
+                if r["summary_row"] is not None:
+                    self._sink("summary", self.telemetry.append_summary, r["summary_row"])
+                if r["latency_rows"]:
+                    self._sink("latency", self.telemetry.append_latency, r["latency_rows"])
+                if r["series"] is not None:
+                    self._sink("series", self.telemetry.save_series, *r["series"])
+                if r["event_rows"]:
+                    self._sink("events", self.telemetry.append_events, r["event_rows"])
+
+        if not rounds or self.store is None:
+            return
+        for r in rounds:
+            try:
+                self.store.record_round(r["player"], r["round"], r["score"], r["hit_count"], r["accuracy"],
+                                        r["summary_row"], played_at=r["time"],
+                                        session=f"{self.store.session}-{r['session']}", event_rows=r["event_rows"])
+            except Exception as e:
+                print(f"⚠️ Lỗi khi lưu kết quả của {r['player']}: {e}")
+                continue
+            print(f"✅ Đã lưu kết quả của {r['player']} vào {os.path.basename(self.store_path)}")
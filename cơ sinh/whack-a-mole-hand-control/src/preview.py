@@ -0,0 +1,61 @@
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+from hand_control import draw_angle_labels, draw_hand_landmarks
+
+
+class CameraPreview:
+    """
+    Ảnh camera thu nhỏ cho góc màn hình, không cấp phát lại mỗi frame.
+
+    Frame được resize thẳng vào một buffer BGR dựng sẵn; `surface` là
+    pygame.image.frombuffer() trỏ vào chính buffer đó nên không cần tạo Surface
+    mới. Landmarks / góc được vẽ ở độ phân giải preview.
+
+      - fps: số lần cập nhật preview mỗi giây, 0 = tắt preview
+      - update(result, hands=None): cập nhật từ HandResult, trả True nếu ảnh thay đổi;
+        hands (nhiều người chơi) là các HandResult có landmarks cần vẽ thay cho result
+    """
+
+    def __init__(self, size=(180, 150), fps=15, draw_overlays=True):
+        self.size = size
+        self.fps = fps
+        self.draw_overlays = draw_overlays
+        w, h = size
+        self._bgr = np.zeros((h, w, 3), dtype=np.uint8)
+        try:
+            self.surface = pygame.image.frombuffer(self._bgr, size, "BGR")
+            self._rgb = None
+        except ValueError:
+            # pygame cũ không hỗ trợ "BGR": thêm một buffer RGB cố định
+            self._rgb = np.zeros((h, w, 3), dtype=np.uint8)
+            self.surface = pygame.image.frombuffer(self._rgb, size, "RGB")
+        self._last_seq = 0
+        self._last_update = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.fps)
+
+    def update(self, result, now=None, hands=None):
+        if not self.fps or result.frame is None or result.seq == self._last_seq:
+            return False
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_update < 1.0 / self.fps:
+            return False
+        self._last_seq = result.seq
+        self._last_update = now
+
+        cv2.resize(result.frame, self.size, dst=self._bgr, interpolation=cv2.INTER_AREA)
+        if self.draw_overlays:
+            for r in (result,) if hands is None else hands:
+                if r.landmarks is not None:
+                    draw_hand_landmarks(self._bgr, r.landmarks, thickness=1, radius=1)
+                    draw_angle_labels(self._bgr, r.landmarks, r.angles, font_scale=0.3, thickness=1)
+        if self._rgb is not None:
+            cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return True
@@ -0,0 +1,111 @@
+"""
+Tự chỉnh chất lượng nhận diện tay theo độ trễ đo được.
+
+Các mức chất lượng xếp từ nặng tới nhẹ: model MediaPipe đầy đủ / lite và độ
+rộng ảnh đưa vào model (frame camera không đổi kích thước, nên tọa độ tay
+trên màn hình không đổi). AdaptiveQuality nhận thời gian mỗi lần inference:
+p90 trong cửa sổ vượt ngân sách -> xuống một mức; p90 dưới up_ratio ngân sách
+-> thử lên một mức.
+
+Chống dao động (hysteresis):
+  - hai ngưỡng khác nhau cho xuống / lên, và mỗi lần đổi mức phải chờ đủ một
+    cửa sổ mẫu mới + cooldown_s
+  - mức vừa bị bỏ vì chậm chỉ được thử lại sau backoff, thời gian chờ nhân đôi
+    mỗi lần mức đó lại bị bỏ (máy yếu không lên xuống liên tục)
+  - độ tin cậy nhận diện thấp (vd. model lite / ảnh nhỏ) cũng là lý do để lên
+    mức, nếu còn dư ngân sách
+"""
+import time
+
+import numpy as np
+
+QUALITY_LEVELS = [
+    # name, model_complexity (MediaPipe Hands: 1 = đầy đủ, 0 = lite), infer_width (None = cả frame)
+    {"name": "full", "model_complexity": 1, "infer_width": None},
+    {"name": "lite", "model_complexity": 0, "infer_width": None},
+    {"name": "lite-480", "model_complexity": 0, "infer_width": 480},
+    {"name": "lite-320", "model_complexity": 0, "infer_width": 320},
+]
+
+
+class AdaptiveQuality:
+    """
+    Bộ điều khiển chất lượng cho một HandController (gắn vào controller.quality).
+
+      - observe(infer_ms, confidence, t): gọi sau mỗi lần chạy model (trên thread nhận diện)
+      - status(): dict trạng thái hiện tại (mức, model, độ rộng ảnh, p90, độ tin cậy, số lần đổi)
+      - describe(): một dòng chữ cho overlay
+    """
+
+    def __init__(self, controller, budget_ms, levels=QUALITY_LEVELS, window=30, up_ratio=0.6,
+                 min_confidence=0.75, cooldown_s=2.0, backoff_s=10.0, max_backoff_s=300.0, start_level=0):
+        self.controller = controller
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.window = window
+        self.up_ratio = up_ratio
+        self.min_confidence = min_confidence
+        self.cooldown_s = cooldown_s
+        self.max_backoff_s = max_backoff_s
+        self.level = min(max(start_level, 0), len(levels) - 1)
+        self.changes = 0
+        self._lat = np.zeros(window, dtype=np.float64)
+        self._conf = np.zeros(window, dtype=np.float64)
+        self._n = 0
+        self._n_conf = 0
+        self._changed_at = -1e9
+        self._backoff = [backoff_s] * len(levels)
+        self._retry_after = [-1e9] * len(levels)
+        self._p90 = 0.0
+        self._confidence = None
+        self.apply()
+
+    def apply(self):
+        lvl = self.levels[self.level]
+        self.controller.set_quality(lvl["model_complexity"], lvl["infer_width"])
+
+    def observe(self, infer_ms, confidence=None, t=None):
+        t = time.monotonic() if t is None else t
+        i = self._n % self.window
+        self._lat[i] = infer_ms
+        self._n += 1
+        if confidence is not None:
+            self._conf[self._n_conf % self.window] = confidence
+            self._n_conf += 1
+        if self._n < self.window or t - self._changed_at < self.cooldown_s:
+            return
+        self._p90 = p90 = float(np.percentile(self._lat, 90))
+        n_conf = min(self._n_conf, self.window)
+        self._confidence = conf = float(self._conf[:n_conf].mean()) if n_conf else None
+
+        if p90 > self.budget_ms and self.level < len(self.levels) - 1:
+            # mức hiện tại quá nặng: lần sau chờ lâu hơn mới thử lại
+            self._retry_after[self.level] = t + self._backoff[self.level]
+            self._backoff[self.level] = min(self._backoff[self.level] * 2.0, self.max_backoff_s)
+            self._set_level(self.level + 1, t, f"p90 {p90:.1f} ms > {self.budget_ms} ms")
+        elif self.level > 0 and t >= self._retry_after[self.level - 1]:
+            if p90 < self.budget_ms * self.up_ratio:
+                self._set_level(self.level - 1, t, f"p90 {p90:.1f} ms, headroom")
+            elif conf is not None and conf < self.min_confidence and p90 < self.budget_ms * 0.85:
+                self._set_level(self.level - 1, t, f"confidence {conf:.2f} < {self.min_confidence}")
+
+    def _set_level(self, level, t, reason):
+        self.level = level
+        self.changes += 1
+        self._changed_at = t
+        self._n = 0                   # cửa sổ mẫu mới cho mức mới
+        self._n_conf = 0
+        self.apply()
+        print(f"Hand tracking quality -> {self.levels[level]['name']} ({reason})")
+
+    def status(self):
+        lvl = self.levels[self.level]
+        return {"level": lvl["name"], "model_complexity": lvl["model_complexity"],
+                "infer_width": lvl["infer_width"], "p90_ms": round(self._p90, 2),
+                "confidence": None if self._confidence is None else round(self._confidence, 3),
+                "budget_ms": self.budget_ms, "changes": self.changes}
+
+    def describe(self):
+        s = self.status()
+        conf = "-" if s["confidence"] is None else f"{s['confidence']:.2f}"
+        return f"quality {s['level']}  p90 {s['p90_ms']:.1f}/{s['budget_ms']} ms  conf {conf}"
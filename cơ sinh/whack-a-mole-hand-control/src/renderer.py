@@ -0,0 +1,135 @@
+import time
+
+import pygame
+
+from latency import NULL_PROFILER, PERCENTILES
+
+
+class TextCache:
+    """Giữ lại surface chữ đã render, chỉ render lại khi nội dung thay đổi."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._cache = {}
+
+    def render(self, font, text, color):
+        key = (id(font), text, color)
+        surf = self._cache.get(key)
+        if surf is None:
+            if len(self._cache) >= self.max_entries:
+                self._cache.clear()
+            surf = self._cache[key] = font.render(text, True, color)
+        return surf
+
+
+class GameRenderer:
+    """
+    Vẽ màn chơi bằng lớp nền dựng sẵn + dirty rectangles.
+
+    Nền (background + 9 lỗ) được ghép một lần thành `static`. Mỗi frame chỉ:
+      1. khôi phục từ lớp nền các vùng đã vẽ ở frame trước,
+      2. vẽ các sprite của frame này (chuột, búa, HUD, camera...) theo thứ tự,
+      3. display.update() đúng các vùng cũ + mới.
+
+      - set_base(surface): đổi lớp nền (vd. màn GAME OVER dựng sẵn), None = nền bàn chơi
+      - blit_to_base(surface, pos): vẽ thẳng vào lớp nền (vd. ảnh camera cập nhật thưa),
+        vùng đó chỉ được cập nhật lên màn hình ở frame kế tiếp
+      - invalidate(): vẽ lại toàn màn hình ở frame sau (sau khi màn hình khác đã vẽ đè)
+      - present(sprites): sprites là list (surface, (x, y)) theo thứ tự vẽ
+      - profiler: đo stage "render" (blit) và "display.flip" (đẩy lên màn hình)
+    """
+
+    def __init__(self, screen, background, hole_image, hole_positions):
+        self.screen = screen
+        self.static = background.copy()
+        for pos in hole_positions:
+            self.static.blit(hole_image, pos)
+        self.static = self.static.convert()
+        self.base = self.static.copy()
+        self.text = TextCache()
+        self._prev_rects = []
+        self._base_dirty = []
+        self._full_redraw = True
+        self.profiler = NULL_PROFILER
+
+    def invalidate(self):
+        self._full_redraw = True
+
+    def set_base(self, surface=None):
+        self.base = self.static.copy() if surface is None else surface
+        self._full_redraw = True
+
+    def blit_to_base(self, surface, pos):
+        self._base_dirty.append(self.base.blit(surface, pos))
+
+    def present(self, sprites):
+        screen = self.screen
+        prof = self.profiler
+        t = prof.now()
+        rects = []
+        if self._full_redraw:
+            screen.blit(self.base, (0, 0))
+            for surf, pos in sprites:
+                rects.append(screen.blit(surf, pos))
+            t = prof.since("render", t)
+            pygame.display.flip()
+            self._full_redraw = False
+        else:
+            restore = self._prev_rects + self._base_dirty
+            for r in restore:
+                screen.blit(self.base, r, r)
+            for surf, pos in sprites:
+                rects.append(screen.blit(surf, pos))
+            t = prof.since("render", t)
+            pygame.display.update(restore + rects)
+        prof.since("display.flip", t)
+        self._prev_rects = rects
+        self._base_dirty = []
+        return rects
+
+
+class LatencyOverlay:
+    """
+    Bảng độ trễ (p50/p95/p99 ms từng stage) vẽ đè lên màn chơi.
+
+    Surface được dựng lại tối đa mỗi `interval` giây, các frame khác dùng lại
+    surface cũ nên overlay gần như không tốn thêm thời gian render.
+    status_fn: nếu có, hàm trả về một dòng trạng thái thêm vào cuối bảng
+    (vd. AdaptiveQuality.describe).
+    """
+
+    def __init__(self, profiler, font, interval=0.5, color=(255, 255, 0), bg=(0, 0, 0, 160)):
+        self.profiler = profiler
+        self.font = font
+        self.interval = interval
+        self.color = color
+        self.bg = bg
+        self.visible = False
+        self.status_fn = None
+        self._surface = None
+        self._built_at = -1e9
+
+    def surface(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self._surface is None or now - self._built_at >= self.interval:
+            self._surface = self._build()
+            self._built_at = now
+        return self._surface
+
+    def _build(self):
+        lines = [f"{'stage (ms)':<16}" + "".join(f" {'p%d' % q:>6}" for q in PERCENTILES)]
+        for name, count, mean, p50, p95, p99, mx in self.profiler.snapshot():
+            lines.append(f"{name:<16} {p50:6.1f} {p95:6.1f} {p99:6.1f}")
+        if self.status_fn is not None:
+            lines.append(self.status_fn())
+        labels = [self.font.render(line, True, self.color) for line in lines]
+        w = max(l.get_width() for l in labels) + 12
+        h = sum(l.get_height() for l in labels) + 8
+        surf = pygame.Surface((w, h), pygame.SRCALPHA)
+        surf.fill(self.bg)
+        y = 4
+        for label in labels:
+            surf.blit(label, (6, y))
+            y += label.get_height()
+        return surf
@@ -0,0 +1,241 @@
+"""
+Ghi lại và phát lại luồng nhận diện tay, để chạy game không cần webcam.
+
+File ghi là JSON Lines: dòng đầu là header, mỗi dòng sau là một HandResult
+(hand_pos, gesture, angles, clench_speed, landmarks...) với thời điểm tính
+từ frame đầu tiên. Có thể ghi kèm frame gốc vào một file video.
+
+  - SessionRecorder: gắn vào HandTrackingWorker(recorder=...) để ghi mỗi frame
+  - load_recording(path): đọc lại thành (header, [HandResult])
+  - ScriptedHandSource: thay HandTrackingWorker (cùng poll()), phát lại một
+    danh sách HandResult theo đồng hồ tùy chọn -> thay cho camera + MediaPipe
+  - ReplayCapture: thay cv2.VideoCapture, đọc frame từ video đã ghi theo đúng
+    nhịp gốc (để chạy lại MediaPipe thật trên dữ liệu cố định)
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from hand_worker import EMPTY_RESULT, HandResult
+
+FORMAT_VERSION = 1
+
+
+class SessionRecorder:
+    """
+    Ghi từng HandResult vào file .jsonl (thread-safe).
+
+      - frames_path: nếu có, frame camera được ghi vào video này (MJPG)
+      - write(result) / close()
+    """
+
+    def __init__(self, path, frames_path=None, fps=30.0, with_landmarks=True):
+        self.path = path
+        self.frames_path = frames_path
+        self.fps = fps
+        self.with_landmarks = with_landmarks
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+        self._video = None
+        self._t0 = None
+        self._header_written = False
+
+    def _write_header(self, frame):
+        size = None if frame is None else [frame.shape[1], frame.shape[0]]
+        header = {"version": FORMAT_VERSION, "frame_size": size, "fps": self.fps,
+                  "video": os.path.basename(self.frames_path) if self.frames_path else None}
+        self._file.write(json.dumps(header) + "\n")
+        self._header_written = True
+        if self.frames_path and size is not None:
+            fourcc = cv2.VideoWriter_fourcc(*"MJPG")
+            self._video = cv2.VideoWriter(self.frames_path, fourcc, self.fps, tuple(size))
+
+    def write(self, result):
+        with self._lock:
+            if self._file is None:
+                return
+            if not self._header_written:
+                self._write_header(result.frame)
+            if self._t0 is None:
+                self._t0 = result.capture_time
+            rec = {
+                "t": round(result.capture_time - self._t0, 4),
+                "seq": result.seq,
+                "hand_pos": list(result.hand_pos) if result.hand_pos else None,
+                "gesture": bool(result.gesture),
+                "angles": {k: round(float(v), 2) for k, v in result.angles.items()},
+                "clench_speed": None if result.clench_speed is None else round(float(result.clench_speed), 2),
+                "predicted": bool(result.predicted),
+                "velocity": [round(float(v), 1) for v in result.velocity],
+            }
+            if self.with_landmarks and result.landmarks is not None:
+                rec["landmarks"] = np.round(result.landmarks, 5).tolist()
+            self._file.write(json.dumps(rec) + "\n")
+            if self._video is not None and result.frame is not None:
+                # frame trong HandResult đã được lật gương; lật lại để giống ảnh camera gốc
+                self._video.write(cv2.flip(result.frame, 1))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._video is not None:
+                self._video.release()
+                self._video = None
+
+
+def load_recording(path):
+    """Read a .jsonl recording. Returns (header, [HandResult]) with capture_time = seconds from start."""
+    header = {}
+    results = []
+    with open(path, encoding="utf-8") as fh:
+        for i, line in enumerate(fh):
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if i == 0 and "version" in rec:
+                header = rec
+                continue
+            lm = rec.get("landmarks")
+            results.append(HandResult(
+                tuple(rec["hand_pos"]) if rec.get("hand_pos") else None,
+                rec.get("gesture", False), None, rec.get("angles", {}),
+                rec.get("clench_speed"), rec["t"], rec.get("seq", len(results) + 1),
+                rec.get("predicted", False), tuple(rec.get("velocity", (0.0, 0.0))),
+                None if lm is None else np.asarray(lm, dtype=np.float32)))
+    return header, results
+
+
+class ScriptedHandSource:
+    """
+    Phát lại danh sách HandResult thay cho HandTrackingWorker.
+
+    capture_time của mỗi result là thời điểm (giây, tính từ start()) nó "được
+    chụp"; poll() trả về result mới nhất đã tới hạn theo time_fn, với
+    capture_time đổi sang đồng hồ time_fn (start() + capture_time), nên với một
+    đồng hồ ảo thì lượt chơi, thời gian phản ứng và độ trễ đo được đều tái lập
+    được. Gesture được báo đúng một lần như HandTrackingWorker.poll().
+
+      - frame: ảnh BGR gắn vào mọi result (vd. để preview camera vẫn chạy)
+      - telemetry: nếu có, ghi số đo thật như worker thật
+      - loop: phát lại từ đầu khi hết danh sách
+    """
+
+    def __init__(self, results, time_fn=time.perf_counter, frame=None, telemetry=None, loop=False):
+        self.results = list(results)
+        self.time_fn = time_fn
+        self.frame = frame
+        self.telemetry = telemetry
+        self.loop = loop
+        n = len(self.results)
+        # độ dài một vòng phát lại: tới frame cuối + khoảng cách trung bình giữa hai frame
+        self._period = self.results[-1].capture_time * n / (n - 1) if n > 1 else 0.0
+        self._t0 = None
+        self._index = 0
+        self._latest = EMPTY_RESULT
+        self._seq = 0
+        self._pending_gesture = False
+
+    def start(self):
+        self._t0 = self.time_fn()
+        self._index = 0
+
+    def stop(self, timeout=None):
+        pass
+
+    def poll(self):
+        if self._t0 is None:
+            self.start()
+        elapsed = self.time_fn() - self._t0
+        results = self.results
+        while results:
+            if self._index >= len(results):
+                if not self.loop or self._period <= 0:
+                    break
+                self._t0 += self._period
+                self._index = 0
+                elapsed = self.time_fn() - self._t0
+            src = results[self._index]
+            if src.capture_time > elapsed:
+                break
+            self._index += 1
+            self._seq += 1
+            self._latest = HandResult(src.hand_pos, src.gesture, self.frame, src.angles,
+                                      src.clench_speed, self._t0 + src.capture_time, self._seq,
+                                      src.predicted, src.velocity, src.landmarks)
+            if src.gesture:
+                self._pending_gesture = True
+            if self.telemetry is not None and src.hand_pos and not src.predicted:
+                self.telemetry.record(src.angles, src.clench_speed, self._latest.capture_time)
+
+        latest = self._latest
+        gesture, self._pending_gesture = self._pending_gesture, False
+        if gesture == latest.gesture:
+            return latest
+        return HandResult(latest.hand_pos, gesture, latest.frame, latest.angles,
+                          latest.clench_speed, latest.capture_time, latest.seq,
+                          latest.predicted, latest.velocity, latest.landmarks)
+
+
+class ReplayCapture:
+    """
+    Thay cho cv2.VideoCapture: đọc frame từ file video đã ghi.
+
+    realtime=True giữ nhịp frame gốc (read() chờ tới thời điểm của frame),
+    False thì trả frame nhanh nhất có thể. loop=True tua lại khi hết video.
+    Dùng với HandController.start_detection(ReplayCapture(path)).
+    frame_time(): thời điểm (giây, tính từ đầu video) của frame vừa đọc,
+    capture_time: time.monotonic() lúc trả frame đó (như camera.CameraSource).
+    """
+
+    def __init__(self, path, realtime=True, loop=False, fps=None):
+        self.cap = cv2.VideoCapture(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._t0 = None
+        self._frames = 0
+        self.capture_time = 0.0
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def set(self, prop, value):
+        return False         # kích thước / thuộc tính do file quyết định
+
+    def get(self, prop):
+        return self.cap.get(prop) if self.cap is not None else 0.0
+
+    def read(self):
+        if self.cap is None:
+            return False, None
+        ok, frame = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.cap.read()
+        if not ok:
+            return False, None
+        if self.realtime:
+            now = time.monotonic()
+            if self._t0 is None:
+                self._t0 = now
+            due = self._t0 + self._frames / self.fps
+            if due > now:
+                time.sleep(due - now)
+        self._frames += 1
+        self.capture_time = time.monotonic()
+        return True, frame
+
+    def frame_time(self):
+        return max(self._frames - 1, 0) / self.fps
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
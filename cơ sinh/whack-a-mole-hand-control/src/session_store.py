@@ -0,0 +1,299 @@
+"""
+Lưu lịch sử chơi vào SQLite (thay cho game_history.xlsx).
+
+Bảng: players, rounds (mỗi lượt một dòng, index theo người chơi + thời gian),
+scores (điểm của lượt), angle_summaries (thống kê góc / clench speed của
+lượt, theo telemetry.SUMMARY_COLUMNS) và mole_events (mỗi lần chuột ngoi lên,
+thời gian phản ứng theo thời điểm chụp frame). Mỗi lượt được ghi trong một transaction,
+database chạy ở chế độ WAL nên đọc (vd. màn hình therapist) không chặn ghi.
+
+    python src/session_store.py last "Tên" -n 10
+    python src/session_store.py progress "Tên" --days 30
+    python src/session_store.py export --out lich_su.xlsx [--player "Tên"]
+"""
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from telemetry import EVENT_COLUMNS, FINGERS, SUMMARY_COLUMNS
+
+SESSION_DB = os.path.join(os.path.dirname(__file__), "sessions.db")
+HISTORY_XLSX = "game_history.xlsx"
+HISTORY_HEADER = ["Thời gian", "Tên người chơi", "Điểm", "Số lần trúng", "Tỉ lệ phản ứng (%)"]
+METRICS = FINGERS + ("clench",)
+_ANGLE_FIELDS = ("avg", "max", "min", "var", "p10", "p50", "p90", "rom")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    player_id INTEGER NOT NULL REFERENCES players(id),
+    session TEXT,
+    round_no INTEGER,
+    played_at REAL NOT NULL,
+    series_file TEXT
+);
+CREATE TABLE IF NOT EXISTS scores (
+    round_id INTEGER PRIMARY KEY REFERENCES rounds(id) ON DELETE CASCADE,
+    score INTEGER NOT NULL,
+    hit_count INTEGER NOT NULL,
+    accuracy REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS angle_summaries (
+    round_id INTEGER NOT NULL REFERENCES rounds(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    frames INTEGER,
+    avg REAL, max REAL, min REAL, var REAL, p10 REAL, p50 REAL, p90 REAL, rom REAL,
+    PRIMARY KEY (round_id, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS mole_events (
+    round_id INTEGER NOT NULL REFERENCES rounds(id) ON DELETE CASCADE,
+    mole INTEGER, x INTEGER, y INTEGER,
+    spawn_ms REAL, up_ms INTEGER, onset REAL, hit_capture REAL,
+    reaction_ms REAL,
+    outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS mole_events_round ON mole_events(round_id);
+CREATE INDEX IF NOT EXISTS rounds_player_time ON rounds(player_id, played_at);
+CREATE INDEX IF NOT EXISTS rounds_time ON rounds(played_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+LEGACY_IMPORTED = "legacy_xlsx_imported"      # khóa trong meta: đã nhập xong game_history.xlsx
+
+
+def _num(value):
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SessionStore:
+    """
+    Lịch sử chơi trong SQLite. Một object dùng trên một thread (quy tắc của sqlite3);
+    thread khác tự mở SessionStore riêng trên cùng file.
+
+      - record_round(player, round_no, score, hit_count, accuracy, summary_row=None, ...): ghi một lượt
+      - last_rounds(player, n=10): n lượt gần nhất, mới nhất trước (kèm thời gian phản ứng trung bình)
+      - progress(player, days=30): tổng hợp theo ngày (điểm, tỉ lệ trúng, phản ứng, tầm vận động)
+      - players(): tên mọi người chơi
+      - import_history_xlsx(path): nhập game_history.xlsx cũ một lần (marker trong bảng meta)
+      - export_xlsx(path, player=None, since=None): bảng tính cho therapist
+      - close()
+    """
+
+    def __init__(self, path=SESSION_DB):
+        self.path = path
+        self.created = path == ":memory:" or not os.path.exists(path)
+        self.session = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")      # WAL: an toàn khi mất điện ở mức transaction
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self._player_ids = {}
+
+    def _player_id(self, name):
+        pid = self._player_ids.get(name)
+        if pid is None:
+            self.conn.execute("INSERT OR IGNORE INTO players(name, created_at) VALUES (?, ?)", (name, time.time()))
+            pid = self.conn.execute("SELECT id FROM players WHERE name = ?", (name,)).fetchone()[0]
+            self._player_ids[name] = pid
+        return pid
+
+    def record_round(self, player, round_no, score, hit_count, accuracy, summary_row=None, played_at=None,
+                     session=None, event_rows=None):
+        """Insert one round (score, angle summary, mole events) in a single transaction. Returns the round id."""
+        try:
+            with self.conn:
+                return self._insert_round(player, round_no, score, hit_count, accuracy, summary_row, played_at,
+                                          session, event_rows)
+        except Exception:
+            self._player_ids.clear()        # id người chơi vừa tạo đã bị rollback
+            raise
+
+    def _insert_round(self, player, round_no, score, hit_count, accuracy, summary_row=None, played_at=None,
+                      session=None, event_rows=None):
+        # không tự commit: người gọi bọc trong transaction (record_round, import_history_xlsx)
+        summary = dict(zip(SUMMARY_COLUMNS, summary_row)) if summary_row else {}
+        cur = self.conn.execute(
+            "INSERT INTO rounds(player_id, session, round_no, played_at, series_file) VALUES (?, ?, ?, ?, ?)",
+            (self._player_id(player), session or self.session, round_no,
+             time.time() if played_at is None else played_at, summary.get("series_file") or None))
+        round_id = cur.lastrowid
+        self.conn.execute("INSERT INTO scores(round_id, score, hit_count, accuracy) VALUES (?, ?, ?, ?)",
+                          (round_id, score, hit_count, accuracy))
+        if summary:
+            frames = _num(summary.get("frames_recorded"))
+            self.conn.executemany(
+                "INSERT INTO angle_summaries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(round_id, m, frames) + tuple(_num(summary.get(f"{m}_{f}")) for f in _ANGLE_FIELDS)
+                 for m in METRICS])
+        if event_rows:
+            # bỏ timestamp / player / round của dòng telemetry, round_id thay cho chúng
+            self.conn.executemany("INSERT INTO mole_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [(round_id,) + tuple(row[3:len(EVENT_COLUMNS)]) for row in event_rows])
+        return round_id
+
+    def players(self):
+        return [r[0] for r in self.conn.execute("SELECT name FROM players ORDER BY name")]
+
+    def last_rounds(self, player, n=10):
+        rows = self.conn.execute(
+            """SELECT r.id, r.played_at, r.session, r.round_no, s.score, s.hit_count, s.accuracy,
+                      (SELECT AVG(e.reaction_ms) FROM mole_events e
+                       WHERE e.round_id = r.id AND e.outcome = 'hit') AS reaction_ms
+               FROM rounds r JOIN players p ON p.id = r.player_id JOIN scores s ON s.round_id = r.id
+               WHERE p.name = ? ORDER BY r.played_at DESC LIMIT ?""", (player, n))
+        return [dict(r) for r in rows]
+
+    def progress(self, player, days=30, now=None):
+        """Per-day aggregates over the last `days` days, oldest first."""
+        since = (time.time() if now is None else now) - days * 86400.0
+        # ROM từng ngón của mỗi lượt (một dòng / lượt) rồi mới gộp theo ngày
+        pivot = ", ".join(f"MAX(CASE WHEN a.metric = '{f}' THEN a.rom END) AS {f}_rom" for f in FINGERS)
+        avg_rom = ", ".join(f"AVG({f}_rom) AS {f}_rom" for f in FINGERS)
+        rows = self.conn.execute(
+            f"""SELECT date(played_at, 'unixepoch', 'localtime') AS day, COUNT(*) AS rounds,
+                       AVG(score) AS avg_score, MAX(score) AS best_score, AVG(accuracy) AS avg_accuracy,
+                       AVG(reaction_ms) AS avg_reaction_ms, {avg_rom}
+                FROM (SELECT r.played_at, s.score, s.accuracy, {pivot},
+                             (SELECT AVG(e.reaction_ms) FROM mole_events e
+                              WHERE e.round_id = r.id AND e.outcome = 'hit') AS reaction_ms
+                      FROM rounds r JOIN players p ON p.id = r.player_id JOIN scores s ON s.round_id = r.id
+                      LEFT JOIN angle_summaries a ON a.round_id = r.id
+                      WHERE p.name = ? AND r.played_at >= ?
+                      GROUP BY r.id)
+                GROUP BY day ORDER BY day""", (player, since))
+        return [dict(r) for r in rows]
+
+    def legacy_imported(self):
+        """True once game_history.xlsx has been imported (marker in the meta table)."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (LEGACY_IMPORTED,)).fetchone():
+            return True
+        # database của bản trước (chưa có marker) đã nhập xong: ghi marker, không nhập lại
+        if self.conn.execute("SELECT 1 FROM rounds WHERE session = 'legacy-xlsx' LIMIT 1").fetchone():
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (LEGACY_IMPORTED, "0"))
+            return True
+        return False
+
+    def import_history_xlsx(self, path=HISTORY_XLSX):
+        """
+        Import the old game_history.xlsx rows once. Returns the number of rounds imported.
+        Rows and the meta marker are written in one transaction: after a failure nothing
+        is kept and the import is retried on the next start.
+        """
+        if not os.path.exists(path) or self.legacy_imported():
+            return 0
+        from openpyxl import load_workbook
+
+        wb = load_workbook(path, read_only=True)
+        rows = []
+        try:
+            # cột cũ: Thời gian, Tên người chơi, Điểm, Số lần trúng, Tỉ lệ phản ứng (%)
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if not row or row[0] is None or row[1] is None:
+                    continue
+                try:
+                    ts = datetime.strptime(str(row[0]), "%Y-%m-%d %H:%M:%S").timestamp()
+                except ValueError:
+                    continue
+                rows.append((str(row[1]), int(row[2] or 0), int(row[3] or 0), float(row[4] or 0.0), ts))
+        finally:
+            wb.close()
+        try:
+            with self.conn:
+                for name, score, hit_count, accuracy, ts in rows:
+                    self._insert_round(name, None, score, hit_count, accuracy, played_at=ts, session="legacy-xlsx")
+                self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (LEGACY_IMPORTED, str(len(rows))))
+        except Exception:
+            self._player_ids.clear()        # id người chơi vừa tạo đã bị rollback
+            raise
+        return len(rows)
+
+    def export_xlsx(self, path=HISTORY_XLSX, player=None, since=None):
+        """Write a History sheet (same columns as the old game_history.xlsx) and an Angles sheet."""
+        from openpyxl import Workbook
+
+        where, args = [], []
+        if player is not None:
+            where.append("p.name = ?")
+            args.append(player)
+        if since is not None:
+            where.append("r.played_at >= ?")
+            args.append(since)
+        cond = ("WHERE " + " AND ".join(where)) if where else ""
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("LichSu")
+        ws.append(HISTORY_HEADER)
+        n = 0
+        for r in self.conn.execute(
+                f"""SELECT r.played_at, p.name, s.score, s.hit_count, s.accuracy
+                    FROM rounds r JOIN players p ON p.id = r.player_id JOIN scores s ON s.round_id = r.id
+                    {cond} ORDER BY r.played_at""", args):
+            ws.append([datetime.fromtimestamp(r[0]).strftime("%Y-%m-%d %H:%M:%S"), r[1], r[2], r[3],
+                       round(r[4], 1)])
+            n += 1
+        ws = wb.create_sheet("Angles")
+        ws.append(["Thời gian", "Tên người chơi", "Lượt", "metric", "frames"] + list(_ANGLE_FIELDS))
+        for r in self.conn.execute(
+                f"""SELECT r.played_at, p.name, r.round_no, a.metric, a.frames, {', '.join('a.' + f for f in _ANGLE_FIELDS)}
+                    FROM rounds r JOIN players p ON p.id = r.player_id JOIN angle_summaries a ON a.round_id = r.id
+                    {cond} ORDER BY r.played_at, a.metric""", args):
+            ws.append([datetime.fromtimestamp(r[0]).strftime("%Y-%m-%d %H:%M:%S")] + list(r[1:]))
+        wb.save(path)
+        return n
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Session history tools")
+    parser.add_argument("--db", default=SESSION_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_last = sub.add_parser("last", help="last N rounds of a player")
+    p_last.add_argument("player")
+    p_last.add_argument("-n", type=int, default=10)
+    p_prog = sub.add_parser("progress", help="per-day progress of a player")
+    p_prog.add_argument("player")
+    p_prog.add_argument("--days", type=int, default=30)
+    p_exp = sub.add_parser("export", help="write an xlsx for therapists")
+    p_exp.add_argument("--out", default=HISTORY_XLSX)
+    p_exp.add_argument("--player")
+    p_exp.add_argument("--days", type=int, help="only the last N days")
+    args = parser.parse_args()
+
+    store = SessionStore(args.db)
+    if args.command == "last":
+        for r in store.last_rounds(args.player, args.n):
+            print(f"{datetime.fromtimestamp(r['played_at']):%Y-%m-%d %H:%M}  round {r['round_no']}  "
+                  f"score {r['score']}  hits {r['hit_count']}  accuracy {r['accuracy']:.1f}%"
+                  + (f"  reaction {r['reaction_ms']:.0f} ms" if r["reaction_ms"] is not None else ""))
+    elif args.command == "progress":
+        for r in store.progress(args.player, args.days):
+            roms = "  ".join(f"{f} {r[f + '_rom']:.0f}" for f in FINGERS if r[f + "_rom"] is not None)
+            print(f"{r['day']}  {r['rounds']} rounds  avg {r['avg_score']:.1f}  best {r['best_score']}  "
+                  f"accuracy {r['avg_accuracy']:.1f}%  "
+                  + (f"reaction {r['avg_reaction_ms']:.0f} ms  " if r["avg_reaction_ms"] is not None else "")
+                  + (("ROM " + roms) if roms else ""))
+    else:
+        since = time.time() - args.days * 86400.0 if args.days else None
+        n = store.export_xlsx(args.out, args.player, since)
+        print(f"Exported {n} rounds -> {args.out}")
+    store.close()
@@ -0,0 +1,218 @@
+import bisect
+import math
+import random
+import time
+
+from board import SpatialIndex
+
+
+class FixedTimestep:
+    """
+    Bộ tích lũy thời gian cho mô phỏng bước cố định.
+
+    advance() nhận thời gian thực đã trôi qua và trả về số bước mô phỏng cần
+    chạy, nên tốc độ game không phụ thuộc FPS render. max_steps giới hạn số
+    bước bù mỗi lần gọi (tránh "spiral of death" khi máy bị khựng lâu).
+    """
+
+    def __init__(self, step_ms, max_steps=8, time_fn=time.perf_counter):
+        self.step_ms = step_ms
+        self.max_steps = max_steps
+        self.time_fn = time_fn
+        self.accumulator = 0.0
+        self._last = None
+
+    def reset(self):
+        self.accumulator = 0.0
+        self._last = self.time_fn()
+
+    def advance(self):
+        """Return how many fixed steps are due since the previous call."""
+        now = self.time_fn()
+        if self._last is None:
+            self._last = now
+        self.accumulator += (now - self._last) * 1000.0
+        self._last = now
+        steps = int(self.accumulator // self.step_ms)
+        if steps > self.max_steps:
+            # bỏ phần thời gian không kịp mô phỏng thay vì chạy bù mãi
+            steps = self.max_steps
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.step_ms
+        return steps
+
+
+class MoleEvent:
+    """
+    Một lần chuột ngoi lên. Mốc thời gian thực đều theo đồng hồ của
+    HandResult.capture_time (time.monotonic() với camera thật):
+      - onset: lúc frame đầu tiên có con chuột này được đưa lên màn hình
+      - hit_capture: lúc camera chụp frame có cú nắm tay trúng chuột
+      - reaction_ms: hit_capture - onset (ms), không phụ thuộc độ trễ xử lý / render
+      - outcome: "hit", "miss" (tự lặn) hoặc "open" (hết giờ khi chuột còn ngoi)
+    """
+
+    __slots__ = ("mole", "pos", "spawn_ms", "up_ms", "onset", "hit_capture", "hit_ms", "reaction_ms",
+                 "outcome")
+
+    def __init__(self, mole, pos, spawn_ms, up_ms):
+        self.mole = mole
+        self.pos = pos
+        self.spawn_ms = spawn_ms
+        self.up_ms = up_ms
+        self.onset = None
+        self.hit_capture = None
+        self.hit_ms = None
+        self.reaction_ms = None
+        self.outcome = None
+
+
+class GameSimulation:
+    """
+    Trạng thái một lượt chơi, chạy theo thời gian mô phỏng (sim time, ms).
+
+      - moles: danh sách Mole (cần is_up, rect, show(), update(), was_hit())
+      - difficulty: preset {'spawn_rate','min_up','max_up','max_simultaneous'}
+          spawn_rate: số chuột xuất hiện trung bình mỗi giây
+      - seed: cùng seed + cùng input tay -> cùng một lượt chơi
+
+    Mọi thời gian (spawn, thời gian chuột ngoi lên, hết giờ) đều tính theo
+    time_ms, chỉ tăng trong step(), nên FPS render không ảnh hưởng lối chơi.
+
+    events: một MoleEvent mỗi lần chuột ngoi lên. Gọi mark_shown(t) sau khi
+    frame được đưa lên màn hình và hit_at(pos, capture_time) với thời điểm chụp
+    frame để có thời gian phản ứng theo đồng hồ lúc chụp.
+
+    Chi phí mỗi bước không phụ thuộc kích thước bàn: chỉ cập nhật các lỗ đang
+    ngoi (tập _up), chọn lỗ spawn từ danh sách lỗ trống (_free, giữ thứ tự index
+    nên cùng seed vẫn cho cùng lượt chơi), tra cứu cú đập qua index (board.SpatialIndex,
+    dựng một lần từ rect của các lỗ nếu không truyền vào).
+    """
+
+    def __init__(self, moles, difficulty, game_time_s, seed=None, step_ms=1000.0 / 60, index=None,
+                 max_sweep_px=300):
+        self.moles = moles
+        self.index = index if index is not None else SpatialIndex([m.rect for m in moles])
+        self.max_sweep_px = max_sweep_px
+        self.step_ms = step_ms
+        self.game_time_ms = game_time_s * 1000
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.time_ms = 0.0
+        self.score = 0
+        self.hit_count = 0
+        self.total_moles_shown = 0
+        self.game_over = False
+        self.events = []
+        self._open = {}                  # index chuột -> MoleEvent đang ngoi
+        self._unshown = []               # event chưa có onset (chưa lên màn hình)
+        self.set_difficulty(difficulty)
+        for mole in moles:
+            mole.reset()
+        self._up = set()
+        self._free = list(range(len(moles)))
+
+    def set_difficulty(self, difficulty):
+        self.difficulty = difficulty
+        self.min_up = difficulty["min_up"]
+        self.max_up = difficulty["max_up"]
+        self.max_simultaneous = difficulty["max_simultaneous"]
+        # xác suất spawn trong một bước (quá trình Poisson với tốc độ spawn_rate/s)
+        self.spawn_p = 1.0 - math.exp(-difficulty["spawn_rate"] * self.step_ms / 1000.0)
+
+    @property
+    def time_left_s(self):
+        return max(0, int(math.ceil((self.game_time_ms - self.time_ms) / 1000.0)))
+
+    @property
+    def accuracy(self):
+        return (self.hit_count / self.total_moles_shown * 100) if self.total_moles_shown > 0 else 0
+
+    def hit_at(self, pos, capture_time=None, prev_pos=None):
+        """
+        Whack at pixel position pos; capture_time = monotonic capture time of the frame.
+        prev_pos: vị trí tay ở lần nhận diện trước; nếu không trúng lỗ nào tại pos thì
+        xét cả đoạn prev_pos -> pos (tay lướt nhanh qua lỗ giữa hai frame) và đập lỗ
+        đang ngoi gần pos nhất trên đoạn đó. Returns number of moles hit.
+        """
+        if self.game_over:
+            return 0
+        hits = 0
+        for i in self.index.at(pos):
+            hits += self._whack(i, capture_time)
+        if not hits and prev_pos is not None and prev_pos != pos:
+            dx, dy = prev_pos[0] - pos[0], prev_pos[1] - pos[1]
+            dist = math.hypot(dx, dy)
+            if dist > self.max_sweep_px:
+                # bước nhảy quá xa (thường là bám nhầm tay): chỉ xét đoạn cuối
+                k = self.max_sweep_px / dist
+                prev_pos = (pos[0] + dx * k, pos[1] + dy * k)
+            for _, i in reversed(self.index.along(prev_pos, pos)):
+                if self._whack(i, capture_time):
+                    hits = 1
+                    break
+        return hits
+
+    def _whack(self, i, capture_time):
+        if not self.moles[i].was_hit(self.time_ms):
+            return 0
+        self.score += 10
+        self.hit_count += 1
+        ev = self._open.pop(i, None)
+        if ev is not None:
+            ev.outcome = "hit"
+            ev.hit_ms = self.time_ms
+            ev.hit_capture = capture_time
+            if capture_time is not None and ev.onset is not None:
+                ev.reaction_ms = (capture_time - ev.onset) * 1000.0
+        return 1
+
+    def mark_shown(self, t):
+        """Stamp moles that just appeared with the time the frame showing them was presented."""
+        if self._unshown:
+            for ev in self._unshown:
+                ev.onset = t
+            self._unshown.clear()
+
+    def reaction_times(self):
+        """Reaction times (ms) of every hit mole that has one."""
+        return [ev.reaction_ms for ev in self.events if ev.reaction_ms is not None]
+
+    def step(self):
+        """Advance the game by exactly one fixed step."""
+        if self.game_over:
+            return
+        self.time_ms += self.step_ms
+        now = self.time_ms
+
+        # chỉ chuột đang ngoi mới cần cập nhật
+        for i in tuple(self._up):
+            mole = self.moles[i]
+            mole.update(now)
+            if not mole.is_up:
+                self._up.discard(i)
+                bisect.insort(self._free, i)
+                ev = self._open.pop(i, None)
+                if ev is not None:
+                    ev.outcome = "miss"
+
+        # giới hạn số moles cùng lúc, spawn theo tốc độ (moles / giây)
+        if len(self._up) < self.max_simultaneous and self.rng.random() < self.spawn_p:
+            if self._free:
+                i = self.rng.choice(self._free)
+                del self._free[bisect.bisect_left(self._free, i)]
+                self._up.add(i)
+                up_ms = self.rng.randint(self.min_up, self.max_up)
+                self.moles[i].show(now, up_ms)
+                self.total_moles_shown += 1
+                ev = MoleEvent(i, self.moles[i].rect.center, now, up_ms)
+                self.events.append(ev)
+                self._open[i] = ev
+                self._unshown.append(ev)
+
+        if self.time_ms >= self.game_time_ms:
+            self.game_over = True
+            for ev in self._open.values():
+                ev.outcome = "open"
+            self._open.clear()
@@ -0,0 +1,398 @@
+"""
+Nhật ký telemetry dạng append-only (CSV theo segment).
+
+Mỗi frame camera có tay được ghi một dòng (góc từng ngón + clench speed).
+Dòng được gom trong bộ nhớ và ghi nối theo chunk vào file segment đang mở,
+nên chi phí ghi không phụ thuộc lịch sử dài bao nhiêu. File xlsx cho
+therapist được dựng lại khi cần bằng export_xlsx() hoặc:
+
+    python src/telemetry.py export
+"""
+import csv
+import glob
+import os
+import threading
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+FINGERS = ("thumb", "index", "middle", "ring", "pinky")
+FRAME_COLUMNS = ["time", "capture_time", "player", "round"] + list(FINGERS) + ["clench_speed"]
+
+SUMMARY_COLUMNS = ["timestamp", "player", "round", "frames_recorded"]
+for _f in FINGERS:
+    SUMMARY_COLUMNS += [_f + "_avg", _f + "_max", _f + "_min"]
+SUMMARY_COLUMNS += ["clench_avg", "clench_max", "clench_min"]
+# phân bố: thêm sau các cột cũ để summary.csv cũ vẫn đọc được theo vị trí
+for _f in FINGERS:
+    SUMMARY_COLUMNS += [_f + "_var", _f + "_p10", _f + "_p50", _f + "_p90", _f + "_rom"]
+SUMMARY_COLUMNS += ["clench_var", "clench_p10", "clench_p50", "clench_p90", "series_file"]
+
+LATENCY_COLUMNS = ["timestamp", "player", "round", "stage", "count",
+                   "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+# mỗi lần chuột ngoi lên một dòng; onset / hit_capture là time.monotonic() (chỉ so sánh trong một lượt)
+EVENT_COLUMNS = ["timestamp", "player", "round", "mole", "x", "y", "spawn_ms", "up_ms",
+                 "onset", "hit_capture", "reaction_ms", "outcome"]
+
+TELEMETRY_DIR = os.path.join(os.path.dirname(__file__), "telemetry")
+ANGLES_XLSX = os.path.join(os.path.dirname(__file__), "game_angles.xlsx")
+ANGLES_SUMMARY_XLSX = os.path.join(os.path.dirname(__file__), "game_angles_summary.xlsx")
+
+SUMMARY_FILE = "summary.csv"
+LATENCY_FILE = "latency.csv"
+EVENTS_FILE = "events.csv"
+LEGACY_FRAMES_FILE = "frames-0-legacy.csv"
+SERIES_DIR = "series"            # chuỗi số đo thô của từng lượt (.npz nén), cạnh summary.csv
+CAPTURE_HZ = 30                  # tốc độ camera dự kiến, để cấp phát sẵn buffer RoundStats
+XLSX_MAX_ROWS = 1048575          # giới hạn số dòng của một sheet Excel (trừ header)
+
+
+def build_summary_row(player, round_no, samples, series_file=None):
+    """
+    samples: mảng (n, 6) float, cột = FINGERS + clench_speed, NaN = không có số đo.
+    Mọi thống kê (mean/max/min, phương sai, p10/p50/p90, tầm vận động) được tính
+    một lượt NumPy. Cột không có số đo nào để trống thay vì ghi 0.
+    Returns one row in SUMMARY_COLUMNS order.
+    """
+    samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(FINGERS) + 1)
+    if not len(samples):
+        samples = np.full((1, len(FINGERS) + 1), np.nan)
+    counts = np.count_nonzero(~np.isnan(samples), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)      # cột toàn NaN -> NaN, xử lý bên dưới
+        mean = np.nanmean(samples, axis=0)
+        mx = np.nanmax(samples, axis=0)
+        mn = np.nanmin(samples, axis=0)
+        var = np.nanvar(samples, axis=0)
+        pct = np.nanpercentile(samples, (10, 50, 90), axis=0)
+
+    def cell(values, k):
+        return round(float(values[k]), 1) if counts[k] else None
+
+    row = [datetime.now().isoformat(), player, round_no, int(counts[:len(FINGERS)].max(initial=0))]
+    for k in range(len(FINGERS) + 1):
+        row += [cell(mean, k), cell(mx, k), cell(mn, k)]
+    for k in range(len(FINGERS) + 1):
+        row += [cell(var, k), cell(pct[0], k), cell(pct[1], k), cell(pct[2], k)]
+        if k < len(FINGERS):
+            row.append(round(float(mx[k] - mn[k]), 1) if counts[k] else None)
+    row.append(series_file)
+    return row
+
+
+def build_event_rows(player, round_no, events):
+    """simulation.MoleEvent list -> rows in EVENT_COLUMNS order."""
+    ts = datetime.now().isoformat()
+
+    def r(value, nd):
+        return None if value is None else round(value, nd)
+
+    return [[ts, player, round_no, ev.mole, ev.pos[0], ev.pos[1], round(ev.spawn_ms, 1), ev.up_ms,
+             r(ev.onset, 4), r(ev.hit_capture, 4), r(ev.reaction_ms, 1), ev.outcome]
+            for ev in events]
+
+
+class RoundStats:
+    """
+    Số đo góc ngón + clench speed của một người chơi trong một lượt, giữ trong
+    ring buffer NumPy cấp phát sẵn (duration_s x capture_hz dòng, dư 25%).
+    Khi đầy, số đo cũ nhất bị ghi đè.
+
+      - add(angles, clench_speed, t=None): thêm một số đo (mỗi frame camera một lần)
+      - summary_row(player, round_no, series_file=None): dòng tổng kết theo SUMMARY_COLUMNS
+      - series(): {"t", "angles" (n,5), "clench" (n,)} theo thứ tự thời gian, NaN = không có số đo
+    """
+
+    def __init__(self, duration_s=30.0, capture_hz=CAPTURE_HZ):
+        capacity = max(16, int(duration_s * capture_hz * 1.25))
+        self._samples = np.full((capacity, len(FINGERS) + 1), np.nan, dtype=np.float32)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        self._next = 0
+        self.count = 0
+
+    def add(self, angles, clench_speed, t=None):
+        if not angles and clench_speed is None:
+            return
+        row = self._samples[self._next]
+        if angles:
+            for k, f in enumerate(FINGERS):
+                row[k] = angles.get(f, 0.0)
+        else:
+            row[:len(FINGERS)] = np.nan
+        row[len(FINGERS)] = np.nan if clench_speed is None else clench_speed
+        self._times[self._next] = time.monotonic() if t is None else t
+        self._next = (self._next + 1) % len(self._samples)
+        self.count += 1
+
+    def _ordered(self, values):
+        n = len(self._samples)
+        if self.count <= n:
+            return values[:self.count]
+        return np.concatenate((values[self._next:], values[:self._next]))
+
+    def series(self):
+        samples = self._ordered(self._samples)
+        return {"t": self._ordered(self._times), "angles": samples[:, :len(FINGERS)],
+                "clench": samples[:, len(FINGERS)], "fingers": np.array(FINGERS)}
+
+    def summary_row(self, player, round_no, series_file=None):
+        return build_summary_row(player, round_no, self._ordered(self._samples), series_file)
+
+
+class TelemetryWriter:
+    """
+    Ghi telemetry từng frame vào các segment CSV append-only.
+
+      - begin_round(player, round_no) / end_round(): chỉ ghi khi đang có lượt chơi;
+        player là tên hoặc list tên (nhiều người chơi, theo player_id)
+      - record(angles, clench_speed, capture_time, slot=0): thread-safe, chỉ thêm vào
+        buffer; ghi xuống đĩa theo chunk chunk_rows dòng. slot = player_id
+      - append_summary(row): ghi một dòng tổng kết lượt vào summary.csv
+      - append_latency(rows): ghi độ trễ từng stage của một lượt vào latency.csv
+      - append_events(rows): ghi các lần chuột ngoi lên / bị đập của một lượt vào events.csv
+      - series_name(player, round_no, session_no, slot) / save_series(name, series):
+        chuỗi số đo thô của một lượt -> SERIES_DIR/<name>.npz (np.savez_compressed);
+        tên không bao giờ trùng (kể cả hai người chơi cùng tên xong lượt cùng giây)
+      - flush() / close()
+
+    Segment mới được mở khi segment hiện tại đủ segment_rows dòng. Nếu gán
+    flush_hook (vd. PersistenceWorker.request_flush), record()/end_round() chỉ
+    báo cho hook thay vì tự ghi file trên thread đang gọi.
+    """
+
+    def __init__(self, directory=TELEMETRY_DIR, chunk_rows=256, segment_rows=100000):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.segment_rows = segment_rows
+        os.makedirs(directory, exist_ok=True)
+        self.session = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.context = None              # (player, round_no) hoặc None khi không chơi
+        self.flush_hook = None
+        self._buffer = []
+        self._lock = threading.Lock()        # bảo vệ _buffer
+        self._io_lock = threading.Lock()     # một luồng ghi file tại một thời điểm
+        self._segment_index = 0
+        self._segment_file = None
+        self._segment_writer = None
+        self._segment_count = 0
+        self._series_names = set()           # tên .npz đã cấp (file có thể chưa được ghi)
+
+    def begin_round(self, player, round_no):
+        self.context = (player, round_no)
+
+    def end_round(self):
+        self.context = None
+        self._request_flush()
+
+    def _request_flush(self):
+        if self.flush_hook is not None:
+            self.flush_hook()
+        else:
+            self.flush()
+
+    def record(self, angles, clench_speed, capture_time, slot=0):
+        ctx = self.context
+        if ctx is None or not angles:
+            return
+        player = ctx[0]
+        if not isinstance(player, str):
+            if slot >= len(player):
+                return
+            player = player[slot]
+        row = (round(time.time(), 3), round(capture_time, 4), player, ctx[1],
+               round(angles.get("thumb", 0.0), 2), round(angles.get("index", 0.0), 2),
+               round(angles.get("middle", 0.0), 2), round(angles.get("ring", 0.0), 2),
+               round(angles.get("pinky", 0.0), 2), round(clench_speed or 0.0, 2))
+        with self._lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.chunk_rows
+        if full:
+            self._request_flush()
+
+    def flush(self):
+        """Append all buffered rows to the current segment."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        with self._io_lock:
+            while rows:
+                if self._segment_file is None or self._segment_count >= self.segment_rows:
+                    self._open_segment()
+                n = self.segment_rows - self._segment_count
+                chunk, rows = rows[:n], rows[n:]
+                self._segment_writer.writerows(chunk)
+                self._segment_count += len(chunk)
+            self._segment_file.flush()
+
+    def _open_segment(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment_index += 1
+        name = f"frames-{self.session}-{self._segment_index:04d}.csv"
+        self._segment_file = open(os.path.join(self.directory, name), "w", newline="", encoding="utf-8")
+        self._segment_writer = csv.writer(self._segment_file)
+        self._segment_writer.writerow(FRAME_COLUMNS)
+        self._segment_count = 0
+
+    def append_summary(self, row):
+        self._append_rows(SUMMARY_FILE, SUMMARY_COLUMNS, [row])
+
+    def append_latency(self, rows):
+        self._append_rows(LATENCY_FILE, LATENCY_COLUMNS, rows)
+
+    def append_events(self, rows):
+        self._append_rows(EVENTS_FILE, EVENT_COLUMNS, rows)
+
+    def series_name(self, player, round_no, session_no=None, slot=0):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(player))
+        session = "" if session_no is None else f"-s{session_no}"
+        base = f"{datetime.now():%Y%m%d-%H%M%S}{session}-{safe}-r{round_no}-p{slot}"
+        name, n = base + ".npz", 1
+        directory = os.path.join(self.directory, SERIES_DIR)
+        while name in self._series_names or os.path.exists(os.path.join(directory, name)):
+            n += 1
+            name = f"{base}-{n}.npz"
+        self._series_names.add(name)
+        return name
+
+    def save_series(self, name, series):
+        directory = os.path.join(self.directory, SERIES_DIR)
+        os.makedirs(directory, exist_ok=True)
+        np.savez_compressed(os.path.join(directory, name), **series)
+
+    def _append_rows(self, name, columns, rows):
+        path = os.path.join(self.directory, name)
+        with self._io_lock:
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="", encoding="utf-8") as fh:
+                w = csv.writer(fh)
+                if new_file:
+                    w.writerow(columns)
+                w.writerows(rows)
+
+    def close(self):
+        self.flush()
+        with self._io_lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+
+
+# --- EXPORT / MIGRATION ---
+def _frame_segments(directory):
+    return sorted(glob.glob(os.path.join(directory, "frames-*.csv")))
+
+
+def _read_csv_rows(path):
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        next(reader, None)              # header
+        for row in reader:
+            yield row
+
+
+def _num(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def migrate_legacy_xlsx(directory=TELEMETRY_DIR, angles_xlsx=ANGLES_XLSX, summary_xlsx=ANGLES_SUMMARY_XLSX):
+    """
+    One-time import of rows from the old load/save xlsx files so exports keep
+    the full history. Does nothing once the telemetry directory has data.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if _frame_segments(directory) or os.path.exists(os.path.join(directory, SUMMARY_FILE)):
+        return
+    from openpyxl import load_workbook
+
+    if os.path.exists(angles_xlsx):
+        wb = load_workbook(angles_xlsx, read_only=True)
+        with open(os.path.join(directory, LEGACY_FRAMES_FILE), "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(FRAME_COLUMNS)
+            # cột cũ: timestamp, thumb, index, middle, ring, pinky, clench_speed
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if not row or row[0] is None:
+                    continue
+                try:
+                    ts = datetime.fromisoformat(str(row[0])).timestamp()
+                except ValueError:
+                    continue
+                w.writerow([ts, "", "", ""] + list(row[1:7]))
+        wb.close()
+
+    if os.path.exists(summary_xlsx):
+        wb = load_workbook(summary_xlsx, read_only=True)
+        with open(os.path.join(directory, SUMMARY_FILE), "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(SUMMARY_COLUMNS)
+            for row in wb.active.iter_rows(min_row=2, values_only=True):
+                if row and row[0] is not None:
+                    w.writerow(row)
+        wb.close()
+
+
+def export_xlsx(directory=TELEMETRY_DIR, angles_xlsx=ANGLES_XLSX, summary_xlsx=ANGLES_SUMMARY_XLSX):
+    """Rebuild the therapist xlsx files from the telemetry log."""
+    from openpyxl import Workbook
+
+    migrate_legacy_xlsx(directory, angles_xlsx, summary_xlsx)
+
+    # --- per-frame angles (sheet mới khi vượt giới hạn dòng của Excel) ---
+    wb = Workbook(write_only=True)
+    header = ["timestamp", "player", "round"] + list(FINGERS) + ["clench_speed"]
+    ws, rows_in_sheet, sheets = None, XLSX_MAX_ROWS, 0
+    frames = 0
+    for path in _frame_segments(directory):
+        for row in _read_csv_rows(path):
+            if rows_in_sheet >= XLSX_MAX_ROWS:
+                sheets += 1
+                ws = wb.create_sheet("Angles" if sheets == 1 else f"Angles{sheets}")
+                ws.append(header)
+                rows_in_sheet = 0
+            ts = datetime.fromtimestamp(float(row[0])).isoformat()
+            rnd = int(row[3]) if row[3] else None
+            ws.append([ts, row[2] or None, rnd] + [_num(v) for v in row[4:10]])
+            rows_in_sheet += 1
+            frames += 1
+    if ws is None:
+        ws = wb.create_sheet("Angles")
+        ws.append(header)
+    wb.save(angles_xlsx)
+
+    # --- per-round summary ---
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Summary")
+    ws.append(SUMMARY_COLUMNS)
+    rounds = 0
+    summary_path = os.path.join(directory, SUMMARY_FILE)
+    if os.path.exists(summary_path):
+        for row in _read_csv_rows(summary_path):
+            ws.append(row[:2] + [_num(v) for v in row[2:]])
+            rounds += 1
+    wb.save(summary_xlsx)
+    return frames, rounds
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Telemetry tools")
+    parser.add_argument("command", choices=["export", "migrate"])
+    parser.add_argument("--dir", default=TELEMETRY_DIR)
+    parser.add_argument("--angles", default=ANGLES_XLSX)
+    parser.add_argument("--summary", default=ANGLES_SUMMARY_XLSX)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_legacy_xlsx(args.dir, args.angles, args.summary)
+    else:
+        n_frames, n_rounds = export_xlsx(args.dir, args.angles, args.summary)
+        print(f"Exported {n_frames} frames -> {args.angles}, {n_rounds} rounds -> {args.summary}")
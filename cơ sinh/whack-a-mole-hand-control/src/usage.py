@@ -0,0 +1,119 @@
+"""
+Đo CPU và điện năng theo trạng thái của app (menu, đang chơi, nghỉ...).
+
+CPU là thời gian CPU của cả process (mọi thread: game loop, nhận diện tay,
+ghi đĩa) chia cho thời gian thực, tính theo % một core. Điện năng đọc từ
+Intel RAPL (/sys/class/powercap, Linux) nếu đọc được, không thì để trống.
+
+    usage = UsageMeter()
+    usage.enter("menu", worker.mode)     # gọi mỗi vòng lặp, chỉ tốn công khi trạng thái đổi
+    ...
+    print(usage.report()); usage.save("telemetry/usage.csv")
+"""
+import csv
+import os
+import time
+
+RAPL_DIR = "/sys/class/powercap/intel-rapl:0"
+USAGE_COLUMNS = ["state", "wall_s", "cpu_s", "cpu_pct", "energy_j", "avg_w"]
+
+
+class RaplReader:
+    """Package energy counter (joules, wrap-around handled); available=False when not readable."""
+
+    def __init__(self, path=RAPL_DIR):
+        self.path = os.path.join(path, "energy_uj")
+        try:
+            with open(os.path.join(path, "max_energy_range_uj")) as fh:
+                self.max_uj = int(fh.read())
+            self._last = self._read()
+            self.available = True
+        except (OSError, ValueError):
+            self.available = False
+        self.total_j = 0.0
+
+    def _read(self):
+        with open(self.path) as fh:
+            return int(fh.read())
+
+    def read(self):
+        if not self.available:
+            return None
+        try:
+            now = self._read()
+        except (OSError, ValueError):
+            return None
+        delta = now - self._last
+        if delta < 0:
+            delta += self.max_uj
+        self._last = now
+        self.total_j += delta / 1e6
+        return self.total_j
+
+
+class UsageMeter:
+    """
+    Cộng dồn thời gian thực / thời gian CPU / năng lượng cho từng trạng thái.
+
+      - enter(state, detail=None): chuyển sang trạng thái "state" hoặc "state (detail)"
+      - rows(): mỗi trạng thái một dòng theo USAGE_COLUMNS
+      - report(): bảng chữ để in ra
+      - save(path): ghi CSV (ghi đè)
+    """
+
+    def __init__(self, rapl=None):
+        self.rapl = RaplReader() if rapl is None else rapl
+        self.state = None
+        self._totals = {}
+        self._since = None
+
+    def _sample(self):
+        return time.monotonic(), time.process_time(), self.rapl.read()
+
+    def enter(self, state, detail=None):
+        key = state if detail is None else f"{state} ({detail})"
+        if key == self.state:
+            return
+        now = self._sample()
+        self._close(now)
+        self.state, self._since = key, now
+
+    def _close(self, now):
+        if self.state is None:
+            return
+        (w0, c0, e0), (w1, c1, e1) = self._since, now
+        tot = self._totals.setdefault(self.state, [0.0, 0.0, None])
+        tot[0] += w1 - w0
+        tot[1] += c1 - c0
+        if e0 is not None and e1 is not None:
+            tot[2] = (tot[2] or 0.0) + (e1 - e0)
+
+    def rows(self):
+        if self.state is not None:
+            # cộng cả khoảng đang dở của trạng thái hiện tại
+            now = self._sample()
+            self._close(now)
+            self._since = now
+        out = []
+        for state, (wall, cpu, energy) in self._totals.items():
+            out.append([state, round(wall, 2), round(cpu, 2),
+                        round(100.0 * cpu / wall, 1) if wall > 0 else 0.0,
+                        None if energy is None else round(energy, 1),
+                        None if energy is None or wall <= 0 else round(energy / wall, 2)])
+        return out
+
+    def report(self):
+        lines = [f"{'state':<24} {'time s':>8} {'cpu s':>8} {'cpu %':>6} {'J':>8} {'W':>6}"]
+        for state, wall, cpu, pct, energy, watts in self.rows():
+            lines.append(f"{state:<24} {wall:8.1f} {cpu:8.1f} {pct:6.1f} "
+                         f"{'-' if energy is None else f'{energy:.0f}':>8} {'-' if watts is None else f'{watts:.1f}':>6}")
+        if not self.rapl.available:
+            lines.append("(power: RAPL energy counter not readable on this machine)")
+        return "\n".join(lines)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(USAGE_COLUMNS)
+            w.writerows(self.rows())
@@ -1,20 +1,8 @@
 def load_image(file_name, size=None):
-    import os
-    import pygame
+    # ảnh được nạp / co giãn qua assets.AssetManager (cache, đổi sang định dạng màn hình)
+    from assets import load_image as _load_image
 
-    path = os.path.join('assets', file_name)
-    try:
-        image = pygame.image.load(path).convert_alpha()
-        if size:
-            return pygame.transform.scale(image, size)
-        return image
-    except pygame.error as e:
-        print(f"Cannot load image: {path}. Error: {e}")
-        print(f"Please ensure you have created the 'assets' folder and the file '{file_name}'!")
-        placeholder_size = size if size else (100, 100)
-        placeholder = pygame.Surface(placeholder_size)
-        placeholder.fill((0, 150, 0))
-        return placeholder
+    return _load_image(file_name, size)
 
 def get_game_settings():
     return {